@@ -10,29 +10,38 @@ from app.core.azul.adapter import bga_state_to_azul_zero_obs
 from app.models.azul.azul import AzulMove, Color
 
 class AIAzulDeepMCTS(AIBase):
-    def __init__(self, model_path: str, device: str = None, mcts_iters: int = 1, cpuct: float = 0, temperature: float = 0.0, single_player_mode=True):
+    def __init__(self, model_path: str, device: str = None, mcts_iters: int = 1, cpuct: float = 0, temperature: float = 0.0, single_player_mode=True, num_workers: int = 0, max_nodes: int = 0, inference_batch_size: int = 0, ponder_simulations: int = 0, solver_tiles: int = 0, chance_outcomes: int = 0):
         if device is None:
             import torch
             device = 'cuda' if torch.cuda.is_available() else 'cpu'
             # MPS is not supported in Docker usually, but if running locally on Mac without docker it might be.
             # However, for safety in this environment (Docker), let's prefer CPU if not CUDA.
         
-        self.player = DeepMCTSPlayer(model_path, device=device, mcts_iters=mcts_iters, cpuct=cpuct, temperature=temperature, single_player_mode=single_player_mode)
+        self.player = DeepMCTSPlayer(model_path, device=device, mcts_iters=mcts_iters, cpuct=cpuct, temperature=temperature, single_player_mode=single_player_mode, num_workers=num_workers, max_nodes=max_nodes, inference_batch_size=inference_batch_size, ponder_simulations=ponder_simulations, solver_tiles=solver_tiles, chance_outcomes=chance_outcomes)
         print(f"AIAzulDeepMCTS loaded model from {model_path} on {device}")
 
-    def select_move(self, state: Any) -> AzulMove:
+    def select_move(self, state: Any, game_id=None) -> AzulMove:
         """
         Convierte el estado del juego al formato esperado por el modelo
         y devuelve una AzulMove.
+        With a game_id the search tree is reused across the moves of that game,
+        and against human players it keeps searching while they think (pondering).
         """
         # Convert BGA state to AzulZero observation
         obs, _ = bga_state_to_azul_zero_obs(state)
         
         # DeepMCTSPlayer.predict expects a dict and returns a tuple (source, color, dest)
-        action = self.player.predict(obs)
+        ponder = any(j.type not in ("ai", "azul_deep_mcts") for j in state.jugadores.values())
+        action = self.player.predict(obs, game_id=game_id, last_move=state.last_move, ponder=ponder)
         
         return self._action_to_move(action, state)
 
+    def end_game(self, game_id):
+        """
+        Frees the search trees kept for a game.
+        """
+        self.player.end_game(game_id)
+
     def _action_to_move(self, action: tuple, state) -> AzulMove:
         source_idx, color, dest = action
         
@@ -65,8 +74,17 @@ else:
     print(f"Using external model path from env: {model_path}")
 
 # Check if model exists before registering to avoid crash if missing
+# AI turns of different games run in threads; > 0 batches their network calls together
+inference_batch_size = int(os.getenv("AZUL_INFERENCE_BATCH", "32"))
+# > 0 keeps searching (up to that many simulations) while a human opponent thinks
+ponder_simulations = int(os.getenv("AZUL_PONDER_SIMULATIONS", "0"))
+# With at most this many tiles left in a round the exact round solver picks the move (0 = always search)
+solver_tiles = int(os.getenv("AZUL_SOLVER_TILES", "10"))
+# Refills of the factories searched at each round boundary (0 = one random refill per move)
+chance_outcomes = int(os.getenv("AZUL_CHANCE_OUTCOMES", "8"))
+
 if os.path.exists(model_path):
-    register_ai("azul_deep_mcts", AIAzulDeepMCTS(model_path))
-    register_ai("Experimental", AIAzulDeepMCTS(model_path))
+    register_ai("azul_deep_mcts", AIAzulDeepMCTS(model_path, inference_batch_size=inference_batch_size, ponder_simulations=ponder_simulations, solver_tiles=solver_tiles, chance_outcomes=chance_outcomes))
+    register_ai("Experimental", AIAzulDeepMCTS(model_path, inference_batch_size=inference_batch_size, ponder_simulations=ponder_simulations, solver_tiles=solver_tiles, chance_outcomes=chance_outcomes))
 else:
     print(f"Warning: Model not found at {model_path}. AIAzulDeepMCTS not registered.")
\ No newline at end of file
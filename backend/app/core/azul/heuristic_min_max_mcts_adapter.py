@@ -13,8 +13,10 @@ from app.models.azul.azul import AzulMove, Color
 import numpy as np
 
 class HeuristicMinMaxMctsAdapter(AIBase):
-    def __init__(self, strategy='minmax', simulations=50, depth=2):
-        self.player = HeuristicMinMaxMCTSPlayer(strategy=strategy, simulations=simulations, depth=depth)
+    def __init__(self, strategy='minmax', simulations=50, depth=2, time_limit=None, beam_width=0, solver_tiles=0):
+        self.player = HeuristicMinMaxMCTSPlayer(strategy=strategy, simulations=simulations, depth=depth,
+                                                time_limit=time_limit, beam_width=beam_width,
+                                                solver_tiles=solver_tiles)
 
     def select_move(self, state) -> AzulMove:
         # Convert BGA state to Obs
@@ -51,9 +53,12 @@ class HeuristicMinMaxMctsAdapter(AIBase):
 
 # Register configurations
 # 1. MinMax (depth 2)
-# 1. MinMax
+# 1. MinMax. The high tier looks 6 plies ahead through the 4 best moves of each
+# position (beam), in about the time of a full depth 4 search, and stops deepening after 2 seconds;
+# with 10 tiles or less left in the round it plays the exact round solver move
 register_ai("MinMax_low", HeuristicMinMaxMctsAdapter(strategy='minmax', depth=2))
-register_ai("MinMax_high", HeuristicMinMaxMctsAdapter(strategy='minmax', depth=4))
+register_ai("MinMax_high", HeuristicMinMaxMctsAdapter(strategy='minmax', depth=6, beam_width=4, time_limit=2.0,
+                                                      solver_tiles=10))
 
 # 2. MCTS Low (50 simulations)
 register_ai("MCTS_low", HeuristicMinMaxMctsAdapter(strategy='mcts', simulations=50))
@@ -64,4 +69,5 @@ register_ai("MCTS_high", HeuristicMinMaxMctsAdapter(strategy='mcts', simulations
 
 # 4. Localized Aliases
 register_ai("Medio", HeuristicMinMaxMctsAdapter(strategy='minmax', depth=2))
-register_ai("Difícil", HeuristicMinMaxMctsAdapter(strategy='minmax', depth=4))
+register_ai("Difícil", HeuristicMinMaxMctsAdapter(strategy='minmax', depth=6, beam_width=4, time_limit=2.0,
+                                                  solver_tiles=10))
@@ -0,0 +1,203 @@
+# src/azul/encoding.py
+
+import numpy as np
+from functools import lru_cache
+
+from .scoring import line_table, line_counts, line_counts_batch, FIELD_MASK, COLS_SHIFT, COLORS_SHIFT
+
+_C = np.arange(5)
+
+# PATTERN_PLANES[line_color, line_count] -> (color, col) one-hot plane of a pattern line
+PATTERN_PLANES = ((_C[None, None, :, None] == _C[:, None, None, None])
+                  & (_C[None, None, None, :] < np.arange(6)[None, :, None, None])).astype(np.float32)
+# WALL_ROW_PLANES[row, row_bits] -> (color, col) one-hot plane of a wall row
+WALL_ROW_PLANES = np.zeros((5, 32, 5, 5), dtype=np.float32)
+for _row in range(5):
+    for _bits in range(32):
+        for _col in range(5):
+            if _bits >> _col & 1:
+                WALL_ROW_PLANES[_row, _bits, (_col - _row) % 5, _col] = 1.0
+# ROUND_ONE_HOT[min(round_count, 8)]: 0 = R1 ... 7 = R8+ (row 0 is for round 0, all zeros)
+ROUND_ONE_HOT = np.vstack([np.zeros((1, 8)), np.eye(8)]).astype(np.float32)
+COMPLETED_LINES = np.array(line_table([0, 0, 0, 0, 0, 1]), dtype=np.float32)
+_COMPLETED = COMPLETED_LINES.astype(int).tolist()
+_SHIFTS = 5 * np.arange(5, dtype=np.int64)
+
+
+def observation_size(layout) -> int:
+    """
+    Length of the flat encoded observation for a given StateLayout.
+    """
+    C, N, P, F = layout.C, layout.N, layout.P, layout.F
+    spatial = 2 * P * 5 * 5 * 5
+    factories = (N + 1) * C
+    global_size = 2 * C + 1 + 8 + P * F + P + 3 * P + C
+    return spatial + factories + global_size
+
+
+def encode_batch(state: np.ndarray, walls: np.ndarray, scores: np.ndarray, current: np.ndarray,
+                 round_count: np.ndarray, token: np.ndarray, layout, out: np.ndarray = None) -> np.ndarray:
+    """
+    Encode B packed Azul states at once (same layout as AzulEnv.encode_observation).
+
+    state:       (B, layout.size) uint8 packed buffers
+    walls:       (B, P) int64 wall masks
+    scores:      (B, P) scores
+    current:     (B,) player to move (players are rotated so it comes first)
+    round_count: (B,) round number
+    token:       (B,) first player token still in the center
+    out:         optional (B, obs_size) float32 buffer to write into
+    """
+    L = layout
+    B = state.shape[0]
+    C, N, P, F = L.C, L.N, L.P, L.F
+    if out is None:
+        out = np.empty((B, observation_size(L)), dtype=np.float32)
+
+    # Canonicalize: rotate players so current_player is at index 0
+    rot = (np.asarray(current)[:, None] + np.arange(P)) % P  # (B, P)
+    rows = np.arange(B)[:, None]
+    rot_walls = np.asarray(walls, dtype=np.int64)[rows, rot]
+
+    # Spatial: pattern planes then wall planes, (color, row, col) per player
+    size = P * 125
+    line_colors = state[:, L.line_color:L.line_count].reshape(B, P, 5)[rows, rot]
+    line_counts = state[:, L.line_count:L.floor].reshape(B, P, 5)[rows, rot]
+    planes = PATTERN_PLANES[line_colors, line_counts]  # (B, P, row, color, col)
+    out[:, :size] = planes.transpose(0, 1, 3, 2, 4).reshape(B, size)
+    planes = WALL_ROW_PLANES[_C, rot_walls[..., None] >> _SHIFTS & 31]
+    out[:, size:2 * size] = planes.transpose(0, 1, 3, 2, 4).reshape(B, size)
+    o = 2 * size
+
+    # Factories + center (contiguous in the packed state)
+    size = (N + 1) * C
+    out[:, o:o + size] = state[:, L.factories:L.tiles_end]
+    o += size
+
+    # Global: bag, discard, first player token, round one-hot
+    out[:, o:o + 2 * C] = state[:, L.bag:L.discard + C]
+    o += 2 * C
+    out[:, o] = token
+    o += 1
+    out[:, o:o + 8] = ROUND_ONE_HOT[np.minimum(round_count, 8)]
+    o += 8
+
+    # floor lines (-1 empty, 5 = first player token), scores, bonuses
+    floors = state[:, L.floor:L.floor_count].reshape(B, P, F)[rows, rot]
+    np.subtract(floors.reshape(B, P * F), 1, out=out[:, o:o + P * F], dtype=np.float32)
+    o += P * F
+    out[:, o:o + P] = np.asarray(scores)[rows, rot]
+    o += P
+    counts = line_counts_batch(rot_walls)  # completed rows, columns, colors per player
+    completed = COMPLETED_LINES[np.stack([counts & FIELD_MASK, counts >> COLS_SHIFT & FIELD_MASK,
+                                          counts >> COLORS_SHIFT], axis=-1)]
+    out[:, o:o + 3 * P] = completed.reshape(B, 3 * P)
+    o += 3 * P
+
+    # Remaining tiles
+    tiles = state[:, L.factories:L.tiles_end].reshape(B, N + 1, C).sum(axis=1, dtype=np.int64)
+    out[:, o:o + C] = tiles + state[:, L.bag:L.bag + C] + state[:, L.discard:L.discard + C]
+    return out
+
+
+@lru_cache(maxsize=None)
+def _plane_indices(num_players: int) -> tuple:
+    # Flat positions of the one-hot spatial cells, per rotated player slot:
+    # pattern[slot][row][color][count] and wall[slot][row][row_bits]
+    pattern = [[[[[slot * 125 + color * 25 + row * 5 + col for col in range(count)]
+                  for count in range(6)] for color in range(5)] for row in range(5)]
+               for slot in range(num_players)]
+    base = num_players * 125
+    wall = [[[[base + slot * 125 + ((col - row) % 5) * 25 + row * 5 + col for col in range(5) if bits >> col & 1]
+              for bits in range(32)] for row in range(5)]
+            for slot in range(num_players)]
+    return pattern, wall
+
+
+def encode_env(env, out: np.ndarray = None) -> np.ndarray:
+    """
+    Encode a single AzulEnv straight from its packed state into a float32
+    vector (or into `out`, e.g. one row of a batch matrix).
+    Same layout as encode_batch, tuned for one state at a time.
+    """
+    L = env._layout
+    C, N, P, F = L.C, L.N, L.P, L.F
+    s = env._state
+    if out is None:
+        out = np.zeros(observation_size(L), dtype=np.float32)
+    else:
+        out.fill(0.0)
+    cp = env.current_player
+    players = [(cp + slot) % P for slot in range(P)]
+
+    # Spatial: collect every hot cell and set them in one go
+    pattern, wall = _plane_indices(P)
+    line_colors = s[L.line_color:L.line_count].tolist()
+    line_counts_ = s[L.line_count:L.floor].tolist()
+    hot = []
+    for slot, p in enumerate(players):
+        pattern_slot = pattern[slot]
+        wall_slot = wall[slot]
+        mask = env.wall_masks[p]
+        for row in range(5):
+            n = line_counts_[p * 5 + row]
+            if n:
+                hot += pattern_slot[row][line_colors[p * 5 + row]][n]
+            bits = mask >> 5 * row & 31
+            if bits:
+                hot += wall_slot[row][bits]
+    if hot:
+        out[hot] = 1.0
+    o = 2 * P * 125
+
+    # Factories + center, bag, discard, token, round one-hot
+    size = (N + 1) * C
+    out[o:o + size] = s[L.factories:L.tiles_end]
+    o += size
+    out[o:o + 2 * C] = s[L.bag:L.discard + C]
+    o += 2 * C
+    out[o] = env.first_player_token
+    o += 1
+    r = min(env.round_count, 8)
+    if r > 0:
+        out[o + r - 1] = 1.0
+    o += 8
+
+    # Floors (-1 empty, 5 = first player token), scores, completed lines
+    start = o
+    for p in players:
+        out[o:o + F] = s[L.floor + p * F:L.floor + (p + 1) * F]
+        o += F
+    out[start:o] -= 1.0
+    out[o:o + P] = [env.scores[p] for p in players]
+    o += P
+    completed = []
+    for p in players:
+        counts = line_counts(env.wall_masks[p])
+        completed += (_COMPLETED[counts & FIELD_MASK], _COMPLETED[counts >> COLS_SHIFT & FIELD_MASK],
+                      _COMPLETED[counts >> COLORS_SHIFT])
+    out[o:o + 3 * P] = completed
+    o += 3 * P
+
+    # Remaining tiles
+    out[o:o + C] = s[L.factories:L.tiles_end].reshape(N + 1, C).sum(axis=0)
+    out[o:o + C] += s[L.bag:L.bag + C]
+    out[o:o + C] += s[L.discard:L.discard + C]
+    return out
+
+
+def encode_envs(envs: list, out: np.ndarray = None) -> np.ndarray:
+    """
+    Encode a list of AzulEnv (same number of players and factories) into a
+    (len(envs), obs_size) float32 matrix, e.g. to evaluate many leaves at once.
+    """
+    return encode_batch(
+        np.stack([env._state for env in envs]),
+        np.array([env.wall_masks for env in envs], dtype=np.int64),
+        np.array([env.scores for env in envs]),
+        np.array([env.current_player for env in envs]),
+        np.array([env.round_count for env in envs]),
+        np.array([env.first_player_token for env in envs]),
+        envs[0]._layout,
+        out=out,
+    )
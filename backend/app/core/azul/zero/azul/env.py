@@ -2,47 +2,114 @@
 
 import gymnasium as gym
 from gymnasium import spaces
+from gymnasium.utils import seeding
 import numpy as np
+from functools import lru_cache
 from typing import Tuple
 
 from azul.utils import print_floor, print_wall
-from .rules import validate_origin, place_on_pattern_line, transfer_to_wall, calculate_floor_penalization, calculate_final_bonus, Color
-import random  # Añade esto al principio del archivo
+from .rules import Color, WALL_COLUMN, ROW_MASKS, FLOOR_PENALTIES, wall_to_mask, mask_to_wall, draw_factory_tiles
+from .scoring import place_tile, final_bonus
+from .encoding import encode_env
 import copy  # Add this import at the top of the file if not present
 
+# Floor slots are stored as tile + 1 so that 0 means "empty"
+FLOOR_EMPTY = 0
+FIRST_PLAYER_TILE = 5
+# Accepted colors of an empty pattern line given the bits of its wall row: EMPTY_LINE_ACCEPTS[row][row_bits]
+EMPTY_LINE_ACCEPTS = [
+    [[0 if bits >> WALL_COLUMN[row][color] & 1 else 1 for color in range(5)] for bits in range(32)]
+    for row in range(5)
+]
+# Accepted colors of a pattern line that already holds `color`
+HELD_LINE_ACCEPTS = [[1 if c == color else 0 for c in range(5)] for color in range(5)]
+# Fixed seed so that state hashes agree across processes and runs
+ZOBRIST_SEED = 0x5EED_A2B1
+
+
+class StateLayout:
+    """
+    Offsets of every field inside the packed uint8 state buffer of AzulEnv.
+
+    [bag (C) | discard (C) | factories (N*C) | center (C) |
+     line colors (P*5) | line counts (P*5) | floor slots (P*F) | floor counts (P) |
+     accepted destinations (P*C*6)]
+
+    Also holds the flat action index -> (source, color, dest) table and the
+    Zobrist keys of the state hash (see AzulEnv.state_hash).
+    """
+    def __init__(self, num_players: int, factories_count: int, colors: int = 5, floor_size: int = 7):
+        C, N, P = colors, factories_count, num_players
+        self.C = C
+        self.N = N
+        self.P = P
+        self.F = floor_size
+        self.bag = 0
+        self.discard = C
+        self.factories = 2 * C
+        self.center = self.factories + N * C
+        self.tiles_end = self.center + C  # factories + center are contiguous
+        self.line_color = self.tiles_end
+        self.line_count = self.line_color + P * 5
+        self.floor = self.line_count + P * 5
+        self.floor_count = self.floor + P * floor_size
+        # accept[player, color, dest] = 1 if dest (pattern line 0-4, floor 5) can take color
+        self.accept = self.floor_count + P
+        self.size = self.accept + P * C * 6
+        self.actions = [(src, color, dest) for src in range(N + 1) for color in range(C) for dest in range(6)]
+        self.action_size = len(self.actions)
+
+        # Zobrist keys. Every byte before the accept block (which is derived from
+        # lines and walls) gets one key per value: zobrist[pos << 8 | value].
+        rng = np.random.default_rng(ZOBRIST_SEED)
+
+        def keys(*shape):
+            return rng.integers(0, 1 << 63, size=shape, dtype=np.int64)
+
+        self.zobrist_table = keys(self.accept, 256)
+        self.zobrist_rows = np.arange(self.accept)
+        self.zobrist = self.zobrist_table.reshape(-1).tolist()
+        self.zobrist_walls = keys(P, 5, 32).tolist()        # [player][row][row_bits]
+        self.zobrist_scores = keys(P, 1024).tolist()        # [player][score & 1023]
+        self.zobrist_player = keys(P).tolist()              # player to move
+        self.zobrist_next_round = keys(P + 1).tolist()      # [first_player_next_round + 1]
+        self.zobrist_round = keys(64).tolist()              # [round_count & 63]
+        self.zobrist_token = int(keys(1)[0])                # first player token in the center
+
+
+@lru_cache(maxsize=None)
+def get_layout(num_players: int, factories_count: int) -> StateLayout:
+    return StateLayout(num_players, factories_count)
+
+
 class AzulEnv(gym.Env):
+    """
+    Azul environment with a packed state.
+
+    Tile counts, pattern lines (color, count) and floor lines live in a single
+    uint8 buffer (`_state`), walls are 25-bit masks and scores plain ints, so
+    clone() is one buffer copy. `bag`, `discard`, `factories` and `center` are
+    views into the buffer; `players` is a read-only dict view used by _get_obs.
+    """
     metadata = {'render.modes': ['human']}
 
     def __init__(self, num_players: int = 2, factories_count: int = 5, seed: int = None, max_rounds: int = 1000):
         super().__init__()
-        if seed is not None:
-            np.random.seed(seed)
-            random.seed(seed)
+        # Own random stream for the tile bag (the global RNGs are left alone)
+        self._np_random, self._np_random_seed = seeding.np_random(seed)
         self.num_players = num_players
         self.C: int = len(Color)
         self.N: int = factories_count
         self.max_rounds: int = max_rounds
         self.L_floor: int = 7
-        self.L_floor: int = 7
+        self._layout: StateLayout = get_layout(num_players, factories_count)
 
         # Game state
-        self.bag: np.ndarray = np.full(self.C, 20, dtype=int)
-        self.discard: np.ndarray = np.zeros(self.C, dtype=int)
-        self.factories: np.ndarray = np.zeros((self.N, self.C), dtype=int)
-        self.center: np.ndarray = np.zeros(self.C, dtype=int)
+        self._state: np.ndarray = np.zeros(self._layout.size, dtype=np.uint8)
+        self.wall_masks = [0] * self.num_players
+        self.scores = [0] * self.num_players
         self.first_player_token: bool = False
         self.first_player_next_round: int = -1 # -1 means not yet taken
-
-        # Players state
-        self.players = [
-            {
-                'pattern_lines': [np.full(i+1, -1, dtype=int) for i in range(5)],
-                'wall': np.full((5, 5), -1, dtype=int),
-                'floor_line': np.full(self.L_floor, -1, dtype=int),
-                'score': 0
-            }
-            for _ in range(self.num_players)
-        ]
         self.current_player: int = 0
         self.round_count: int = 1
 
@@ -53,7 +120,7 @@ class AzulEnv(gym.Env):
             spaces.Discrete(6)
         ))
         # Flattened action representation size
-        self.action_size = (self.N + 1) * self.C * 6
+        self.action_size = self._layout.action_size
 
         # Define observation space
         self.observation_space = spaces.Dict({
@@ -71,9 +138,128 @@ class AzulEnv(gym.Env):
 
         # Initialize game
         self.round_accumulated_score = [0] * self.num_players
+        self._undo = []  # push()/pop() history
+        self._hash = 0  # Zobrist hash of the state, set by reset()
         self.reset(initial=True) # Ensure initial reset sets everything
         self.done = False
 
+    # --- Views over the packed state ---
+
+    @property
+    def bag(self) -> np.ndarray:
+        L = self._layout
+        return self._state[L.bag:L.bag + L.C]
+
+    @bag.setter
+    def bag(self, value):
+        L = self._layout
+        self._state[L.bag:L.bag + L.C] = value
+
+    @property
+    def discard(self) -> np.ndarray:
+        L = self._layout
+        return self._state[L.discard:L.discard + L.C]
+
+    @discard.setter
+    def discard(self, value):
+        L = self._layout
+        self._state[L.discard:L.discard + L.C] = value
+
+    @property
+    def factories(self) -> np.ndarray:
+        L = self._layout
+        return self._state[L.factories:L.center].reshape(L.N, L.C)
+
+    @factories.setter
+    def factories(self, value):
+        L = self._layout
+        self._state[L.factories:L.center] = np.asarray(value).reshape(-1)
+
+    @property
+    def center(self) -> np.ndarray:
+        L = self._layout
+        return self._state[L.center:L.tiles_end]
+
+    @center.setter
+    def center(self, value):
+        L = self._layout
+        self._state[L.center:L.tiles_end] = value
+
+    @property
+    def players(self) -> list:
+        """
+        Read-only snapshot of the players in the classic dict layout.
+        Writing into it does not modify the environment (use load_obs).
+        """
+        return [self._player_view(i) for i in range(self.num_players)]
+
+    def _player_view(self, i: int) -> dict:
+        L = self._layout
+        s = self._state
+        pattern_lines = []
+        for row in range(5):
+            line = np.full(row + 1, -1, dtype=int)
+            count = s[L.line_count + i * 5 + row]
+            if count:
+                line[:count] = s[L.line_color + i * 5 + row]
+            pattern_lines.append(line)
+        base = L.floor + i * L.F
+        floor_line = s[base:base + L.F].astype(int) - 1
+        return {
+            'pattern_lines': pattern_lines,
+            'wall': mask_to_wall(self.wall_masks[i]),
+            'floor_line': floor_line,
+            'score': self.scores[i]
+        }
+
+    def load_obs(self, obs: dict):
+        """
+        Overwrite the board state with the contents of an observation dict.
+        """
+        L = self._layout
+        s = self._state
+        self._undo = []
+        self.bag = np.asarray(obs['bag'])
+        self.discard = np.asarray(obs['discard'])
+        self.factories = np.asarray(obs['factories'])
+        self.center = np.asarray(obs['center'])
+        self.first_player_token = bool(obs['first_player_token'])
+        self.current_player = int(obs['current_player'])
+        self.round_count = int(obs.get('round_count', self.round_count))
+        for i, p_obs in enumerate(obs['players']):
+            for row, line in enumerate(p_obs['pattern_lines']):
+                line = np.asarray(line)
+                filled = line[line != -1]
+                s[L.line_count + i * 5 + row] = len(filled)
+                s[L.line_color + i * 5 + row] = filled[0] if len(filled) else 0
+            floor = np.asarray(p_obs['floor_line'])
+            base = L.floor + i * L.F
+            s[base:base + L.F] = floor + 1
+            s[L.floor_count + i] = int((floor != -1).sum())
+            self.wall_masks[i] = wall_to_mask(p_obs['wall'])
+            self.scores[i] = int(p_obs['score'])
+        self._refresh_all_accepts()
+        self._hash = self._compute_hash()
+
+    def _refresh_accepts(self, player: int, row: int):
+        """
+        Recompute which colors pattern line `row` of `player` can take.
+        """
+        L = self._layout
+        s = self._state
+        pos = L.accept + player * L.C * 6 + row
+        if s[L.line_count + player * 5 + row]:
+            s[pos:pos + L.C * 6:6] = HELD_LINE_ACCEPTS[s[L.line_color + player * 5 + row]]
+        else:
+            s[pos:pos + L.C * 6:6] = EMPTY_LINE_ACCEPTS[row][self.wall_masks[player] >> 5 * row & 31]
+
+    def _refresh_all_accepts(self):
+        L = self._layout
+        self._state[L.accept + 5:L.size:6] = 1  # the floor takes everything
+        for player in range(self.num_players):
+            for row in range(5):
+                self._refresh_accepts(player, row)
+
     def get_winner(self):
         """
         Returns the index of the player with the highest score in array.
@@ -81,30 +267,32 @@ class AzulEnv(gym.Env):
         """
         winners = []
         if self.done:
-            scores = [p['score'] for p in self.players]
+            scores = self.scores
             max_score = max(scores)
             winners = [i for i, score in enumerate(scores) if score == max_score]
         return winners
 
-    def reset(self, initial: bool = False):
+    def reset(self, initial: bool = False, seed: int = None):
+        if seed is not None:
+            self._np_random, self._np_random_seed = seeding.np_random(seed)
+        L = self._layout
+        s = self._state
         # Reset bag and discard
-        self.bag[:] = 20
-        self.discard[:] = 0
+        s[L.bag:L.bag + L.C] = 20
+        s[L.discard:L.discard + L.C] = 0
         
         # Reset accumulated score logic
         self.round_accumulated_score = [0] * self.num_players
 
         # Reset player states
-        for p in self.players:
-            p['pattern_lines'] = [np.full(i+1, -1, dtype=int) for i in range(5)]
-            if initial:  # ✅ solo al principio del todo
-                p['wall'] = np.full((5, 5), -1, dtype=int)
-                p['score'] = 0
-            p['floor_line'] = np.full(self.L_floor, -1, dtype=int)
+        s[L.line_color:L.size] = 0
+        if initial:  # ✅ solo al principio del todo
+            self.wall_masks = [0] * self.num_players
+            self.scores = [0] * self.num_players
+        self._refresh_all_accepts()
 
         # Clear factories and center before refill
-        self.factories[:] = 0
-        self.center[:] = 0
+        s[L.factories:L.tiles_end] = 0
 
         # Fill factories and center
         self.first_player_token = True
@@ -113,223 +301,384 @@ class AzulEnv(gym.Env):
         self.round_count = 1
         self.done = False  # Reset done flag
         self._refill_factories()
+        self._hash = self._compute_hash()
 
         return self._get_obs()
 
+    def state_hash(self) -> int:
+        """
+        64-bit Zobrist hash of the game state: tiles, pattern lines, floors, walls,
+        scores, player to move, first player token and round. It is updated
+        incrementally by step()/fast_step()/push() and restored by pop(), so
+        reading it costs nothing (e.g. to key a transposition table).
+        """
+        return self._hash
+
+    def _compute_hash(self) -> int:
+        # Full recomputation of the hash, used after resets, loads and round ends
+        L = self._layout
+        h = int(np.bitwise_xor.reduce(L.zobrist_table[L.zobrist_rows, self._state[:L.accept]]))
+        for p in range(self.num_players):
+            mask = self.wall_masks[p]
+            walls = L.zobrist_walls[p]
+            for row in range(5):
+                h ^= walls[row][mask >> 5 * row & 31]
+            h ^= L.zobrist_scores[p][self.scores[p] & 1023]
+        h ^= L.zobrist_player[self.current_player]
+        h ^= L.zobrist_next_round[self.first_player_next_round + 1]
+        h ^= L.zobrist_round[self.round_count & 63]
+        if self.first_player_token:
+            h ^= L.zobrist_token
+        return h
+
+    def _set(self, pos: int, value: int):
+        # Write one byte of the hashed part of the state, keeping the hash in sync
+        z = self._layout.zobrist
+        s = self._state
+        self._hash ^= z[pos << 8 | s.item(pos)] ^ z[pos << 8 | value]
+        s[pos] = value
+
+    def _add_to_floor(self, player: int, tile: int, n: int) -> int:
+        """
+        Put `n` tiles of `tile` on the player's floor; tiles that do not fit go to discard.
+        Returns the number of tiles sent to discard.
+        """
+        L = self._layout
+        s = self._state
+        fc = int(s[L.floor_count + player])
+        placed = min(L.F - fc, n)
+        if placed > 0:
+            base = L.floor + player * L.F + fc
+            for pos in range(base, base + placed):
+                self._set(pos, tile + 1)
+            self._set(L.floor_count + player, fc + placed)
+        if n > placed:
+            # Fix Bug 4: Overflow goes to discard if floor is full
+            self._set(L.discard + tile, int(s[L.discard + tile]) + n - placed)
+        return n - placed
+
     def step(self, action: Tuple[int, int, int], is_sim: bool = False):
-        if len(self.get_valid_actions()) == 0:
+        # No tiles left in factories or center means no valid action (floor is always legal)
+        if self._is_round_over():
             raise RuntimeError("No valid actions available. Possible deadlock.")
+        cp = self.current_player
+        opponent = (cp + 1) % self.num_players
+        before_score = self.scores[cp]
+        opponent_score_before = self.scores[opponent]
+
+        round_over = self._apply(action)
+
+        done = False
+        reward = 0
+        if round_over:
+            done = self.done
+            if done:
+                 # Reward = Delta Self - Delta Oppt (Full difference)
+                 delta_self = self.scores[cp] - before_score
+                 delta_opp = self.scores[opponent] - opponent_score_before
+                 reward = delta_self - delta_opp
+        obs = self._get_obs()
+        info = {'p0_score': self.scores[cp], 'p1_score': self.scores[opponent], 'round': self.round_count}
+        return obs, reward, done, info
+
+    def fast_step(self, action: Tuple[int, int, int], refill: bool = True) -> bool:
+        """
+        Trusted step for search code: applies a legal action without
+        revalidating it and without building an observation.
+        Returns True if the game is over.
+        With refill=False a move that closes the round leaves the factories of
+        the next round empty until refill_factories() draws them.
+        """
+        self._apply(action, refill=refill)
+        return self.done
+
+    def push(self, action: Tuple[int, int, int], refill: bool = True):
+        """
+        Trusted make-move: applies a legal action and records an undo entry so
+        that pop() restores the previous state. Lets searches walk a single env
+        instead of cloning one per edge.
+        With refill=False a move that closes the round scores it but leaves the
+        factories of the next round empty, for searches that stop at the end of
+        the round (the state is only meant to be evaluated and popped).
+        """
+        self._undo.append(self._apply(action, record=True, refill=refill))
+
+    def pop(self):
+        """
+        Undo the last action applied with push().
+        """
+        (source_idx, color, count, factory_before, token_taken, prev_next_round,
+         dest, line_count, line_color, floor_count, replaced, discarded,
+         delta, player, snapshot, prev_hash) = self._undo.pop()
+        if snapshot is not None:
+            # The move closed the round: go back to the state right before _end_round
+            self._restore(snapshot)
+        L = self._layout
+        s = self._state
+        C = L.C
+
+        self.current_player = player
+        self.scores[player] -= delta
+        self.round_accumulated_score[player] -= delta
+
+        # Pattern line
+        if dest < 5:
+            s[L.line_count + player * 5 + dest] = line_count
+            s[L.line_color + player * 5 + dest] = line_color
+            self._refresh_accepts(player, dest)
+
+        # Floor slots and overflow sent to discard
+        base = L.floor + player * L.F
+        s[base + floor_count:base + int(s[L.floor_count + player])] = FLOOR_EMPTY
+        if replaced:
+            s[base + L.F - 1] = replaced
+        s[L.floor_count + player] = floor_count
+        s[L.discard + color] -= discarded
+
+        # Source
+        if source_idx < self.N:
+            fb = L.factories + source_idx * C
+            for c in range(C):
+                if c != color:
+                    s[L.center + c] -= factory_before[c]
+            s[fb:fb + C] = factory_before
+        else:
+            s[L.center + color] = count
+            if token_taken:
+                self.first_player_token = True
+        self.first_player_next_round = prev_next_round
+        self._hash = prev_hash
+
+    def _snapshot(self) -> tuple:
+        return (self._state.copy(), self.wall_masks[:], self.scores[:], self.round_accumulated_score[:],
+                self.first_player_token, self.first_player_next_round, self.current_player,
+                self.round_count, self.done, self._hash)
+
+    def _restore(self, snapshot: tuple):
+        (state, walls, scores, acc, token, next_round, current, round_count, done, hash_) = snapshot
+        self._state[:] = state
+        self.wall_masks = walls
+        self.scores = scores
+        self.round_accumulated_score = acc
+        self.first_player_token = token
+        self.first_player_next_round = next_round
+        self.current_player = current
+        self.round_count = round_count
+        self.done = done
+        self._hash = hash_
+
+    def _apply(self, action: Tuple[int, int, int], record: bool = False, refill: bool = True):
+        """
+        Core of step(): takes the tiles, places them, updates the speculative
+        score and resolves the end of round.
+        With record=True returns the undo entry used by pop(), otherwise
+        whether the round ended.
+        """
         source_idx, color, dest = action
-        # Direct reference to player dict to ensure modifications persist
-        p = self.players[self.current_player]
-        
-        before_score = p['score']
+        L = self._layout
+        s = self._state
+        cp = self.current_player
         
         # Helper to calculate current penalty BEFORE applying move
-        current_penalty = calculate_floor_penalization(p['floor_line'])
+        floor_count = int(s[L.floor_count + cp])
+        current_penalty = FLOOR_PENALTIES[floor_count]
+        prev_next_round = self.first_player_next_round
+        prev_hash = self._hash
+        factory_before = None
+        token_taken = False
+        replaced = FLOOR_EMPTY
 
         # Handle source removal
         if source_idx < self.N:
             # factory
-            count = int(self.factories[source_idx, color])
-            if self.factories[source_idx].sum() == 0 or count == 0:
+            base = L.factories + source_idx * L.C
+            factory = s[base:base + L.C]
+            count = int(factory[color])
+            if count == 0:
                 raise ValueError(f"Invalid action: factory {source_idx} has no tiles of color {color}")
+            factory_before = factory.tolist()
+            z = L.zobrist
+            h = self._hash
+            for c, n in enumerate(factory_before):
+                if n:
+                    pos = base + c
+                    h ^= z[pos << 8 | n] ^ z[pos << 8]
+                    if c != color:
+                        pos = L.center + c
+                        v = int(s[pos])
+                        h ^= z[pos << 8 | v] ^ z[pos << 8 | v + n]
+            self._hash = h
             # move other colors to center
-            other_colors = self.factories[source_idx].copy()
-            other_colors[color] = 0
-            self.center += other_colors
-            # Ensure global state is mutated, avoid shallow copy issues
-            for c in range(self.C):
-                self.factories[source_idx, c] = 0
+            factory[color] = 0
+            s[L.center:L.tiles_end] += factory
+            factory[:] = 0
         elif source_idx == self.N:
             # center
-            count = int(self.center[color])
-            if self.center.sum() == 0 or count == 0:
+            count = int(s[L.center + color])
+            if count == 0:
                 raise ValueError(f"Invalid action: center has no tiles of color {color}")
-            self.center[color] = 0
+            self._set(L.center + color, 0)
             if self.first_player_token:
                 # penalty token handling
-                fl = p['floor_line']
-                # Find first empty slot (-1)
-                idxs = np.where(fl == -1)[0]
-                if idxs.size > 0:
-                    fl[idxs[0]] = 5 # Representing the -1 penalty token
+                if floor_count < L.F:
+                    self._set(L.floor + cp * L.F + floor_count, FIRST_PLAYER_TILE + 1) # Representing the -1 penalty token
+                    self._set(L.floor_count + cp, floor_count + 1)
                 else:
                     # Fix Bug 5: If floor is full, it replaces the last tile
                     # This ensures the player holds the token AND pays the max penalty
-                    fl[-1] = 5
+                    replaced = int(s[L.floor + cp * L.F + L.F - 1])
+                    self._set(L.floor + cp * L.F + L.F - 1, FIRST_PLAYER_TILE + 1)
                 
                 self.first_player_token = False
-                self.first_player_next_round = self.current_player
+                self.first_player_next_round = cp
+                self._hash ^= (L.zobrist_token ^ L.zobrist_next_round[prev_next_round + 1]
+                               ^ L.zobrist_next_round[cp + 1])
+                token_taken = True
+        else:
+            raise ValueError(f"Invalid action: unknown source {source_idx}")
 
         # Place tiles
         speculative_points = 0
+        line_count = line_color = 0
         
         if dest < 5:
-            # Check if line was already full (shouldn't be, valid_actions prevents it)
-            # But we check if it BECOMES full
-            was_full = all(slot != -1 for slot in p['pattern_lines'][dest])
-            
-            new_line, overflow = place_on_pattern_line(p['pattern_lines'][dest], color, count)
-            p['pattern_lines'][dest] = new_line
-            # Explicitly write back to main data structure in case of view/copy issues
-            self.players[self.current_player]['pattern_lines'][dest] = new_line
-            
-            # Speculative Wall Points & Bonuses
-            is_full = all(slot != -1 for slot in new_line)
-            if is_full and not was_full:
-                # Calculate what points we WOULD get
-                # We use a clone of the wall to not affect game state
-                temp_wall = p['wall'].copy()
-                
-                # 1. Placement Points
-                points = transfer_to_wall(temp_wall, new_line.tolist(), dest)
-                speculative_points += points
-                
-                # 2. Speculative Bonuses (Row/Col/Color)
-                # Calculate bonus BEFORE this placement (should be based on real wall)
-                current_bonus = calculate_final_bonus(p['wall'])
-                # Calculate bonus AFTER this placement (on temp wall)
-                new_bonus = calculate_final_bonus(temp_wall)
-                bonus_delta = new_bonus - current_bonus
-                
-                speculative_points += bonus_delta
+            count_pos = L.line_count + cp * 5 + dest
+            color_pos = L.line_color + cp * 5 + dest
+            line_count = int(s[count_pos])
+            line_color = int(s[color_pos])
+            capacity = dest + 1
+            if line_count > 0 and line_color != color:
+                # Line holds a different color: everything overflows
+                overflow = count
+            else:
+                placeable = min(capacity - line_count, count)
+                self._set(count_pos, line_count + placeable)
+                self._set(color_pos, color)
+                overflow = count - placeable
+                if line_count == 0:
+                    # The line now only takes this color
+                    pos = L.accept + cp * L.C * 6 + dest
+                    s[pos:pos + L.C * 6:6] = HELD_LINE_ACCEPTS[color]
+
+                # Speculative Wall Points & Bonuses
+                if line_count + placeable == capacity and line_count < capacity:
+                    wall = self.wall_masks[cp]
+                    # 1. Placement Points
+                    temp_wall, points = place_tile(wall, dest, color)
+                    speculative_points += points
+                    # 2. Speculative Bonuses (Row/Col/Color)
+                    speculative_points += final_bonus(temp_wall) - final_bonus(wall)
             
             # overflow to floor
-            fl = p['floor_line']
-            for _ in range(overflow):
-                idxs = np.where(fl == -1)[0]
-                if idxs.size > 0:
-                    fl[idxs[0]] = color
-                else:
-                    # Fix Bug 4: Overflow goes to discard if floor is full
-                    self.discard[color] += 1
+            discarded = self._add_to_floor(cp, color, overflow) if overflow else 0
         else:
             # all to floor
-            fl = p['floor_line']
-            for _ in range(count):
-                idxs = np.where(fl == -1)[0]
-                if idxs.size > 0:
-                    fl[idxs[0]] = color
-                else:
-                    # Fix Bug 4: Overflow goes to discard if floor is full
-                    self.discard[color] += 1
+            discarded = self._add_to_floor(cp, color, count)
 
         # Calculate new penalty
-        new_penalty = calculate_floor_penalization(p['floor_line'])
+        new_penalty = FLOOR_PENALTIES[s[L.floor_count + cp]]
         penalty_delta = new_penalty - current_penalty
         
         # Apply speculative updates
         total_delta = penalty_delta + speculative_points
-        p['score'] += total_delta
-        self.round_accumulated_score[self.current_player] += total_delta
+        if total_delta:
+            zs = L.zobrist_scores[cp]
+            self._hash ^= zs[self.scores[cp] & 1023] ^ zs[(self.scores[cp] + total_delta) & 1023]
+        self.scores[cp] += total_delta
+        self.round_accumulated_score[cp] += total_delta
 
         # Check round end
-        done = False
-        reward = 0
-        opponent = (self.current_player + 1) % self.num_players
-        opponent_score_before = self.players[opponent]['score']
-        if self._is_round_over():
-            done = self._end_round()
-            self.done = done
-            if done:
-                 # Reward = Delta Self - Delta Oppt (Full difference)
-                 delta_self = p['score'] - before_score
-                 delta_opp = self.players[opponent]['score'] - opponent_score_before
-                 reward = delta_self - delta_opp
+        snapshot = None
+        round_over = self._is_round_over()
+        if round_over:
+            if record:
+                snapshot = self._snapshot()
+            self.done = self._end_round(refill)
         else:
             # Next player turn
-            self.current_player = opponent
-        obs = self._get_obs()
-        info = {'p0_score': p['score'], 'p1_score': self.players[opponent]['score'], 'round': self.round_count}
-        return obs, reward, done, info
+            self.current_player = (cp + 1) % self.num_players
+            self._hash ^= L.zobrist_player[cp] ^ L.zobrist_player[self.current_player]
 
-    def _refill_factories(self):
-        # Empty center
+        if not record:
+            return round_over
+        return (source_idx, color, count, factory_before, token_taken, prev_next_round,
+                dest, line_count, line_color, floor_count, replaced, discarded,
+                total_delta, cp, snapshot, prev_hash)
+
+    def _refill_factories(self, rng: np.random.Generator = None):
+        # Empty center, then one multivariate hypergeometric draw of 4 tiles per factory
         self.center[:] = 0
-        # Fill each factory with 4 tiles
-        for i in range(self.N):
-            tiles = []
-            for _ in range(4):
-                # Refill bag from discard if bag is empty and discard has tiles
-                if self.bag.sum() == 0 and self.discard.sum() > 0:
-                    self.bag += self.discard
-                    self.discard[:] = 0
-                total = self.bag.sum()
-                if total == 0:
-                    # No tiles left anywhere, stop filling
-                    break
-                    
-                probs = self.bag / total
-                # choose a tile
-                tile = np.random.choice(self.C, p=probs)
-                tiles.append(tile)
-                # decrement bag
-                self.bag[tile] -= 1
-            
-            # place tiles into factory
-            for t in tiles:
-                self.factories[i, t] += 1
+        draw_factory_tiles(self.bag, self.discard, self.factories, rng if rng is not None else self.np_random)
+
+    def refill_factories(self, rng: np.random.Generator = None):
+        """
+        Draw the factories of a round closed with refill=False (see fast_step),
+        from `rng` instead of the env's random stream if given, e.g. to replay
+        the same refill on several copies of the state.
+        """
+        self._refill_factories(rng)
+        self._hash = self._compute_hash()
 
     def _is_round_over(self) -> bool:
-        if any(self.factories[i].sum() > 0 for i in range(self.N)):
-            return False
-        if self.center.sum() > 0:
-            return False
-        return True
+        L = self._layout
+        return not self._state[L.factories:L.tiles_end].any()
 
-    def _end_round(self) -> bool:
+    def has_full_wall_row(self) -> bool:
+        """
+        True if any player completed a wall row (game end condition).
+        """
+        return any(wall & m == m for wall in self.wall_masks for m in ROW_MASKS)
+
+    def _end_round(self, refill: bool = True) -> bool:
+        L = self._layout
+        s = self._state
         # 1. Revert Speculative Scoring
-        for i, p in enumerate(self.players):
-            p['score'] -= self.round_accumulated_score[i]
+        for i in range(self.num_players):
+            self.scores[i] -= self.round_accumulated_score[i]
         
         # Reset accumulator for safety (though next round resets it too, good practice)
         self.round_accumulated_score = [0] * self.num_players
 
         # Score placement and penalties
-        for p in self.players:
+        for i in range(self.num_players):
             # pattern lines -> wall
-            for row_idx, line in enumerate(p['pattern_lines']):
-                if -1 not in line:
-                    color = int(line[0])
-                    pts = transfer_to_wall(p['wall'], line, row_idx)
-                    p['score'] += pts
+            for row_idx in range(5):
+                count_pos = L.line_count + i * 5 + row_idx
+                if s[count_pos] == row_idx + 1:
+                    color = int(s[L.line_color + i * 5 + row_idx])
+                    self.wall_masks[i], pts = place_tile(self.wall_masks[i], row_idx, color)
+                    self.scores[i] += pts
                     # discard leftover tiles
-                    leftover = len(line) - 1
-                    self.discard[color] += leftover
-                    p['pattern_lines'][row_idx][:] = -1
+                    s[L.discard + color] += row_idx
+                    s[count_pos] = 0
+                    s[L.line_color + i * 5 + row_idx] = 0
+                    self._refresh_accepts(i, row_idx)
                     
             # floor line penalties
-            pen = calculate_floor_penalization(p['floor_line'])
-            p['score'] += pen
-            for tile in p['floor_line']:
-                if tile >= 0 and tile < 5: # 0-4 are colors
-                    self.discard[int(tile)] += 1
-                # tile 5 is the first player token, doesn't go to discard
-            
-
-            
-            p['floor_line'][:] = -1
-            
+            fc = int(s[L.floor_count + i])
+            self.scores[i] += FLOOR_PENALTIES[fc]
+            base = L.floor + i * L.F
+            for code in s[base:base + fc].tolist():
+                if code <= 5: # 1-5 are colors
+                    s[L.discard + code - 1] += 1
+                # code 6 is the first player token, doesn't go to discard
+            s[base:base + L.F] = FLOOR_EMPTY
+            s[L.floor_count + i] = 0
 
-        # Check game end (any full wall row) OR max rounds reached
         # Check game end (any full wall row)
-        game_over = any(all(cell != -1 for cell in row) for p in self.players for row in p['wall'])
+        game_over = self.has_full_wall_row()
         
         # NEW: Track termination reason
-        if game_over:
-            self.termination_reason = "normal_end"
-        else:
-            self.termination_reason = "normal_end"
+        self.termination_reason = "normal_end"
 
         if game_over:
             # Apply final bonuses to each player
-            for p in self.players:
-                bonus = calculate_final_bonus(p['wall'])
-                p['score'] += bonus
+            for i in range(self.num_players):
+                self.scores[i] += final_bonus(self.wall_masks[i])
         else:
             self.first_player_token = True
-            self._refill_factories()
+            if refill:
+                self._refill_factories()
             
             # Determine next starting player
             if self.first_player_next_round != -1:
@@ -344,31 +693,28 @@ class AzulEnv(gym.Env):
             self.first_player_next_round = -1 # Reset for next round
 
         self.round_count += 1
+        # Walls, scores and factories all changed: rehash from scratch
+        self._hash = self._compute_hash()
         return game_over
 
     def _get_obs(self):
+        players = self.players
+        for p in players:
+            p['pattern_lines_padded'] = [np.pad(pl, (0, 5 - len(pl)), constant_values=-1) for pl in p['pattern_lines']]
         return {
-            'bag': self.bag.copy(),
-            'discard': self.discard.copy(),
-            'factories': self.factories.copy(),
-            'center': self.center.copy(),
+            'bag': self.bag.astype(int),
+            'discard': self.discard.astype(int),
+            'factories': self.factories.astype(int),
+            'center': self.center.astype(int),
             'first_player_token': self.first_player_token,
-            'players': [
-                {
-                    'pattern_lines': [np.array(line, dtype=int) for line in p['pattern_lines']],
-                    'pattern_lines_padded': [np.pad(pl.copy(), (0, 5 - len(pl)), constant_values=-1) for pl in p['pattern_lines']],
-                    'wall': p['wall'].copy(),
-                    'floor_line': p['floor_line'].copy(),
-                    'score': p['score']
-                } for p in self.players
-            ],
+            'players': players,
             'current_player': self.current_player,
             'round_count': self.round_count
         }
 
-    def encode_observation(self, obs: dict) -> np.ndarray:
+    def encode_observation(self, obs: dict, out: np.ndarray = None) -> np.ndarray:
         """
-        Encode the observation dict into a flat numpy array.
+        Encode the observation dict into a flat float32 array.
         Layout: [Spatial (20 channels * 5 * 5) | Factories | Global]
         
         Spatial Channels (20):
@@ -378,104 +724,23 @@ class AzulEnv(gym.Env):
         
         Global features:
         - bag (5), discard (5), first_player_token (1)
+        - round_count (8, one-hot)
         - floor_lines (num_players * 7), scores (num_players)
-        - round_count (1, normalized)
         - bonuses per player: completed_rows, completed_cols, completed_colors (3 * num_players)
         - remaining_tiles (5)
+
+        Search code that already holds the env should call encode_state() instead.
         """
-        # parts: bag, discard, factories, center
-        # Spatial parts: pattern lines and walls
-        spatial_parts = []
-        # Canonicalize: Rotate players so current_player is at index 0
-        current_player = obs['current_player']
-        num_players = len(obs['players'])
-        rotated_players = [obs['players'][(current_player + i) % num_players] for i in range(num_players)]
-
-        # One-Hot Encoding for Spatial Features
-        # Pattern Lines: 5 colors -> 5 planes per player
-        for p in rotated_players:
-            # Create 5 planes for pattern lines
-            # Each plane (5x5) corresponds to a color 0..4
-            pattern_planes = np.zeros((5, 5, 5), dtype=int)
-            
-            for row_idx, line in enumerate(p['pattern_lines']):
-                # line is a numpy array of tile indices (or -1)
-                for col_idx, tile in enumerate(line):
-                    if tile != -1:
-                        # Mark the cell (row_idx, col_idx) in specific color plane
-                        pattern_planes[tile, row_idx, col_idx] = 1
-            
-            spatial_parts.append(pattern_planes.flatten())
-
-        # Wall: 5 colors -> 5 planes per player
-        for p in rotated_players:
-            wall_planes = np.zeros((5, 5, 5), dtype=int)
-            wall = p['wall']
-            for r in range(5):
-                for c in range(5):
-                    tile = wall[r, c]
-                    if tile != -1:
-                        wall_planes[tile, r, c] = 1
-            
-            spatial_parts.append(wall_planes.flatten())
-            
-        # Factories parts: factories (N*5), center (5)
-        factories_parts = [
-            obs['factories'].flatten(),
-            obs['center']
-        ]
-        
-        # Global parts: bag, discard, first_player, floor_lines, scores
-        
-        # One-Hot Round Count (8 positions: 0=R1 ... 7=R8+)
-        r_idx = min(obs['round_count'] - 1, 7)
-        round_one_hot = np.zeros(8, dtype=np.float32)
-        if r_idx >= 0:
-            round_one_hot[r_idx] = 1.0
-
-        global_parts = [
-            obs['bag'],
-            obs['discard'],
-            np.array([int(obs['first_player_token'])], dtype=int),
-            round_one_hot
-        ]
-        
-        # floor_lines (rotated)
-        floors = np.stack([p['floor_line'] for p in rotated_players])
-        global_parts.append(floors.flatten())
-        # scores (rotated)
-        scores = np.array([p['score'] for p in rotated_players], dtype=int)
-        global_parts.append(scores)
-        
-        # Bonuses (completed rows, columns, colors per player)
-        for p in rotated_players:
-            wall = p['wall']
-            # Completed rows
-            completed_rows = sum(1 for row in wall if all(cell != -1 for cell in row))
-            # Completed columns
-            completed_cols = sum(1 for col_idx in range(5) if all(wall[row_idx][col_idx] != -1 for row_idx in range(5)))
-            # Completed colors
-            color_counts = np.zeros(5, dtype=int)
-            for row in wall:
-                for cell in row:
-                    if cell != -1:
-                        color_counts[cell] += 1
-            completed_colors = sum(1 for count in color_counts if count == 5)
-            
-            global_parts.append(np.array([completed_rows, completed_cols, completed_colors], dtype=int))
-        
-        # Remaining tiles
-        visible_factories = obs['factories'].sum(axis=0) 
-        visible_center = obs['center']
-        remaining = obs['bag'] + obs['discard'] + visible_factories + visible_center
-        global_parts.append(remaining)
-        
-        # Concatenate
-        spatial_flat = np.concatenate(spatial_parts)
-        factories_flat = np.concatenate(factories_parts)
-        global_flat = np.concatenate(global_parts)
-        
-        return np.concatenate([spatial_flat, factories_flat, global_flat])
+        scratch = self.clone()
+        scratch.load_obs(obs)
+        return encode_env(scratch, out)
+
+    def encode_state(self, out: np.ndarray = None) -> np.ndarray:
+        """
+        encode_observation() of the current state, read straight from the packed
+        buffer. `out` may be a preallocated float32 row (e.g. of a batch matrix).
+        """
+        return encode_env(self, out)
 
     def action_to_index(self, action: Tuple[int, int, int]) -> int:
         """
@@ -484,12 +749,13 @@ class AzulEnv(gym.Env):
         source_idx, color, dest = action
         return source_idx * (self.C * 6) + color * 6 + dest
 
-    def clone(self) -> 'AzulEnv':
-        # Optimized clone without deepcopy for speed
+    def clone(self, fork_rng: bool = False) -> 'AzulEnv':
+        """
+        Copy of the game. The whole board lives in one buffer: a single copy plus a few scalars.
+        By default the clone shares this env's random stream; with fork_rng=True it gets
+        an independent child stream (spawned deterministically from this one).
+        """
         new = AzulEnv.__new__(AzulEnv)
-        gym.Env.__init__(new)
-        
-        # Copy scalars
         new.num_players = self.num_players
         new.C = self.C
         new.N = self.N
@@ -498,6 +764,9 @@ class AzulEnv(gym.Env):
         new.action_space = self.action_space
         new.observation_space = self.observation_space
         new.action_size = self.action_size
+        new._layout = self._layout
+        new._np_random = self.np_random.spawn(1)[0] if fork_rng else self.np_random
+        new._np_random_seed = self._np_random_seed
 
         new.round_count = self.round_count
         new.done = self.done
@@ -506,35 +775,19 @@ class AzulEnv(gym.Env):
         new.current_player = self.current_player
         new.termination_reason = getattr(self, 'termination_reason', 'normal_end')
         new.round_accumulated_score = self.round_accumulated_score[:]
-        
-        # Copy numpy arrays (fast)
-        new.bag = self.bag.copy()
-        new.discard = self.discard.copy()
-        new.factories = self.factories.copy()
-        new.center = self.center.copy()
-        
-        # Manually copy players list of dicts
-        # This is much faster than deepcopying the whole list
-        new.players = []
-        for p in self.players:
-            new_p = {
-                'pattern_lines': [line.copy() for line in p['pattern_lines']],
-                'wall': p['wall'].copy(),
-                'floor_line': p['floor_line'].copy(),
-                'score': p['score']
-            }
-            new.players.append(new_p)
+        new._undo = []
+        new._hash = self._hash
 
+        new._state = self._state.copy()
+        new.wall_masks = self.wall_masks[:]
+        new.scores = self.scores[:]
         return new
 
     def index_to_action(self, index: int) -> Tuple[int, int, int]:
         """
         Convert a flat index into an action tuple (source_idx, color, dest).
         """
-        dest = index % 6
-        color = (index // 6) % self.C
-        source_idx = index // (6 * self.C)
-        return (source_idx, color, dest)
+        return self._layout.actions[index]
 
     def render(self, mode='human'):
         print(f"Player to move: {self.current_player}")
@@ -553,61 +806,31 @@ class AzulEnv(gym.Env):
         """
         Returns a list of valid actions (source_idx, color, dest).
         An action is valid if the source has at least one tile of the chosen color,
-        passes validate_origin, and no conflict with wall rules.
-        """
-        valid_actions = []
-        for source_idx in range(self.N + 1):  # factories and center
-            source = self.factories[source_idx] if source_idx < self.N else self.center
-            origin = ("factory", source_idx) if source_idx < self.N else ("center", None)
-            for color in range(self.C):
-                if source[color] == 0:
-                    continue
-                if not validate_origin(self.factories, self.center, origin, color):
-                    continue
-                for dest in range(6):
-                    if dest < 5:
-                        wall_row = self.players[self.current_player]['wall'][dest]
-                        if color in wall_row:
-                            continue  # ya está ese color en la fila del muro
-                        
-                        # Fix Bug 3: Check if pattern line has a different color
-                        pattern_line = self.players[self.current_player]['pattern_lines'][dest]
-                        # If line is not empty (has -1s but first element is not -1)
-                        # In this implementation, we fill from left? No, we fill indices.
-                        # But place_on_pattern_line checks `any(slot != -1 and slot != color ...)`
-                        # Here we just need to check if there is ANY slot with a different color.
-                        # Since a line can only hold ONE color (plus empty slots), we can just check the first non-empty slot?
-                        # Or just check if any slot is != -1 and != color.
-                        if any(slot != -1 and slot != color for slot in pattern_line):
-                            continue
-
-                    valid_actions.append((source_idx, color, dest))
-        return valid_actions
+        and no conflict with wall rules.
+        """
+        actions = self._layout.actions
+        return [actions[i] for i in np.flatnonzero(self._legal_actions()).tolist()]
     
     def get_action_mask(self) -> np.ndarray:
         """
         Returns a binary mask of valid actions (1=legal, 0=illegal).
         """
-        mask = np.zeros(self.action_size, dtype=np.float32)
-        valid_actions = self.get_valid_actions()
-        for action in valid_actions:
-            idx = self.action_to_index(action)
-            mask[idx] = 1.0
-        return mask
+        return self._legal_actions().astype(np.float32)
+
+    def _legal_actions(self) -> np.ndarray:
+        # min(tiles of (source, color), accept[color, dest]) is 1 exactly for legal
+        # actions, already flattened in action index order
+        L = self._layout
+        s = self._state
+        base = L.accept + self.current_player * L.C * 6
+        tiles = s[L.factories:L.tiles_end].reshape(L.N + 1, L.C, 1)
+        return np.minimum(tiles, s[base:base + L.C * 6].reshape(L.C, 6)).reshape(-1)
 
     def get_debug_wall_value(self, player_idx:int) -> int:
         """
-        Recorre el muro del jugador sumando 1 si la celda es distinta de -1 y 0 en caso contrario.
-        Devuelve el valor total.
+        Devuelve el número de losetas colocadas en el muro del jugador.
         """
-
-        wall = self.players[player_idx]['wall']
-        total = 0
-        for row in wall:
-            for cell in row:
-                if cell != -1:
-                    total += 1
-        return total
+        return bin(self.wall_masks[player_idx]).count("1")
     
     def get_final_scores(self):
-        return [p['score'] for p in self.players]
+        return list(self.scores)
@@ -0,0 +1,189 @@
+# src/azul/round_solver.py
+"""
+Exact solver for the end of a round.
+
+Within a round Azul is deterministic: chance only comes in when the factories
+are refilled for the next one. Once few tiles are left on the table the rest
+of the round is a small game tree, so instead of sampling it the solver
+searches it completely (alpha-beta on a single env with push/pop, memoized on
+the state hash, as transpositions are the rule: the same tiles taken in a
+different order give the same position) down to the end of the round.
+
+The leaves are valued with the real end of round scoring (what _end_round
+leaves in env.scores, the final bonuses included if the game ends) plus, when
+the game goes on, a wall potential: the end of game bonuses already earned and
+the lines close to completion, and the tiles left in the pattern lines.
+"""
+
+from azul.rules import FLOOR_PENALTIES
+from azul.scoring import final_bonus, line_table, lines_value, place_tile
+
+# Wall potential: completed lines count their bonus (+2 row, +7 column, +10 color), lines close to completion part of it
+ROW_POTENTIAL = line_table([0, 0, 0, 0, 1, 2])
+COL_POTENTIAL = line_table([0, 0, 0, 1, 3, 7])
+COLOR_POTENTIAL = line_table([0, 0, 0, 1, 4, 10])
+# Points credited for a pattern line carried to the next round, times its filled fraction
+PARTIAL_LINE_POINTS = 1.0
+
+_EXACT, _LOWER, _UPPER = 0, 1, 2
+
+
+def remaining_tiles(env) -> int:
+    """
+    Tiles still on the factories and the center.
+    """
+    L = env._layout
+    return int(env._state[L.factories:L.tiles_end].sum())
+
+
+def static_move_delta(env, action) -> float:
+    """
+    Cheap estimate of what a legal move is worth to the player making it,
+    read from the state without playing it: wall points (and end of game
+    bonuses) of the pattern line it completes, floor penalty of the tiles it drops (overflow and first
+    player token), and a fraction of a point for filling part of a line.
+    """
+    source_idx, color, dest = action
+    L = env._layout
+    s = env._state
+    cp = env.current_player
+    if source_idx < L.N:
+        count = int(s[L.factories + source_idx * L.C + color])
+        token = 0
+    else:
+        count = int(s[L.center + color])
+        token = 1 if env.first_player_token else 0
+
+    value = 0.0
+    overflow = count
+    if dest < 5:
+        capacity = dest + 1
+        free = capacity - int(s[L.line_count + cp * 5 + dest])
+        if free > 0:
+            placed = min(free, count)
+            overflow = count - placed
+            if placed == free:
+                wall = env.wall_masks[cp]
+                new_wall, points = place_tile(wall, dest, color)
+                value += points + final_bonus(new_wall) - final_bonus(wall)
+            else:
+                value += placed / capacity
+    floor_count = int(s[L.floor_count + cp])
+    dropped = min(floor_count + overflow + token, len(FLOOR_PENALTIES) - 1)
+    return value + FLOOR_PENALTIES[dropped] - FLOOR_PENALTIES[floor_count]
+
+
+def position_value(env, player: int) -> float:
+    """
+    Points of `player` at the start of a round (or the end of the game), plus
+    the wall potential if the game goes on.
+    """
+    score = env.scores[player]
+    if env.done:
+        return float(score)
+    L = env._layout
+    s = env._state
+    partial = 0.0
+    for row in range(5):
+        count = int(s[L.line_count + player * 5 + row])
+        if count:
+            partial += count / (row + 1)
+    return score + lines_value(env.wall_masks[player], ROW_POTENTIAL, COL_POTENTIAL, COLOR_POTENTIAL) \
+        + PARTIAL_LINE_POINTS * partial
+
+
+class _SolverBudget(Exception):
+    pass
+
+
+class RoundSolver:
+    """
+    Solves the rest of the round once at most `max_tiles` tiles are left.
+    The value of a position is the root player's position_value() minus the
+    best of its opponents'; the root player maximizes it, the others minimize
+    it (exact for two players). A search that visits more than `max_nodes`
+    positions gives up, so a caller can always fall back on its own search.
+    A solver runs one search at a time: players build one per move.
+    """
+    def __init__(self, max_tiles: int = 10, max_nodes: int = 20000):
+        self.max_tiles = max_tiles
+        self.max_nodes = max_nodes
+        self.nodes = 0  # positions searched by the last solve()
+        self._table = {}
+
+    def applies(self, env) -> bool:
+        return self.max_tiles > 0 and not env.done and remaining_tiles(env) <= self.max_tiles
+
+    def solve(self, env):
+        """
+        (best action, value) for the player to move, or None if the position
+        is not late enough in the round or the search runs out of budget.
+        env is not modified.
+        """
+        if not self.applies(env):
+            return None
+        env = env.clone()
+        root_player = env.current_player
+        self.nodes = 0
+        self._table = {}
+        try:
+            value = self._search(env, -float('inf'), float('inf'), root_player)
+        except _SolverBudget:
+            return None
+        finally:
+            table, self._table = self._table, {}
+        return table[env.state_hash()][2], value
+
+    def _leaf_value(self, env, root_player: int) -> float:
+        own = position_value(env, root_player)
+        return own - max(position_value(env, p) for p in range(env.num_players) if p != root_player)
+
+    def _search(self, env, alpha: float, beta: float, root_player: int) -> float:
+        self.nodes += 1
+        if self.nodes > self.max_nodes:
+            raise _SolverBudget()
+
+        key = env.state_hash()
+        entry = self._table.get(key)
+        first = None
+        if entry is not None:
+            value, bound, first = entry
+            if bound == _EXACT or (bound == _LOWER and value >= beta) or (bound == _UPPER and value <= alpha):
+                return value
+
+        maximizing = env.current_player == root_player
+        round_count = env.round_count
+        alpha_orig, beta_orig = alpha, beta
+        # The move that was best (or cut off) here before first, then the most promising for the mover
+        actions = sorted(env.get_valid_actions(),
+                         key=lambda action: (action != first, -static_move_delta(env, action)))
+
+        best = -float('inf') if maximizing else float('inf')
+        best_action = None
+        for action in actions:
+            # The round end is scored but the next round is not drawn: the leaves do not depend on it
+            env.push(action, refill=False)
+            if env.round_count != round_count or env.done:
+                value = self._leaf_value(env, root_player)
+            else:
+                value = self._search(env, alpha, beta, root_player)
+            env.pop()
+            if maximizing:
+                if value > best:
+                    best, best_action = value, action
+                alpha = max(alpha, value)
+            else:
+                if value < best:
+                    best, best_action = value, action
+                beta = min(beta, value)
+            if alpha >= beta:
+                break
+
+        if best <= alpha_orig:
+            bound = _UPPER
+        elif best >= beta_orig:
+            bound = _LOWER
+        else:
+            bound = _EXACT
+        self._table[key] = (best, bound, best_action)
+        return best
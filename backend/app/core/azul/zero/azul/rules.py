@@ -4,6 +4,8 @@ from enum import IntEnum
 from typing import List, Tuple
 import numpy as np
 
+from .scoring import final_bonus, place_tile, placement_points
+
 class Color(IntEnum):
     BLUE = 0
     YELLOW = 1
@@ -11,6 +13,15 @@ class Color(IntEnum):
     BLACK = 3
     RED = 4
 
+# Column of each color on each wall row: WALL_COLUMN[row][color]
+WALL_COLUMN = [[(color + row) % 5 for color in range(5)] for row in range(5)]
+# Bit masks for a full wall row / column (bit index = row * 5 + col)
+ROW_MASKS = [0b11111 << (5 * r) for r in range(5)]
+COL_MASKS = [sum(1 << (5 * r + c) for r in range(5)) for c in range(5)]
+COLOR_MASKS = [sum(1 << (5 * r + WALL_COLUMN[r][color]) for r in range(5)) for color in range(5)]
+# Cumulative floor penalty indexed by the number of occupied floor slots
+FLOOR_PENALTIES = [0, -1, -2, -4, -6, -8, -11, -14]
+
 def validate_origin(factories: List[List[int]], center: List[int], source: Tuple[str, int], color: Color) -> bool:
     """
     Checks that there is at least one tile of the chosen color
@@ -47,48 +58,10 @@ def transfer_to_wall(wall: List[List[int]], pattern_line: List[int], row: int) -
     Transfers the completed tile from the pattern line to the wall
     at the correct position and returns the points gained.
     """
-    # Determine column for this color on the wall pattern
     color = pattern_line[0]  # all slots are same color when complete
-    # Mapping of each row's color pattern
-    row_patterns = [
-        [Color.BLUE, Color.YELLOW, Color.ORANGE, Color.BLACK, Color.RED],
-        [Color.RED, Color.BLUE, Color.YELLOW, Color.ORANGE, Color.BLACK],
-        [Color.BLACK, Color.RED, Color.BLUE, Color.YELLOW, Color.ORANGE],
-        [Color.ORANGE, Color.BLACK, Color.RED, Color.BLUE, Color.YELLOW],
-        [Color.YELLOW, Color.ORANGE, Color.BLACK, Color.RED, Color.BLUE],
-    ]
-    col = row_patterns[row].index(color)
+    col = WALL_COLUMN[row][color]
     wall[row][col] = color
-
-    # Count contiguous tiles horizontally
-    score = 1
-    # left
-    c = col - 1
-    while c >= 0 and wall[row][c] != -1:
-        score += 1
-        c -= 1
-    # right
-    c = col + 1
-    while c < 5 and wall[row][c] != -1:
-        score += 1
-        c += 1
-
-    # Count contiguous tiles vertically
-    v_count = 0
-    # up
-    r = row - 1
-    while r >= 0 and wall[r][col] != -1:
-        v_count += 1
-        r -= 1
-    # down
-    r = row + 1
-    while r < 5 and wall[r][col] != -1:
-        v_count += 1
-        r += 1
-
-    if v_count > 0:
-        score += v_count + 1
-    return score
+    return placement_points(wall_to_mask(wall), row, col)
 
 def calculate_floor_penalization(floor_line: List[int]) -> int:
     """
@@ -112,18 +85,74 @@ def calculate_final_bonus(wall: List[List[int]]) -> int:
     +7 points for each complete column,
     +10 points for each complete set of one color.
     """
-    bonus = 0
-    # Complete rows
-    for row in wall:
-        if all(cell != -1 for cell in row):
-            bonus += 2
-    # Complete columns
-    for col in range(len(wall[0])):
-        if all(wall[row_idx][col] != -1 for row_idx in range(len(wall))):
-            bonus += 7
-    # Complete color sets
-    for color in Color:
-        count = sum(1 for row in wall for cell in row if cell == color)
-        if count == len(wall):
-            bonus += 10
-    return bonus
+    return final_bonus(wall_to_mask(wall))
+
+
+def wall_bit(row: int, color: int) -> int:
+    """
+    Bit of the wall mask where `color` goes on `row`.
+    """
+    return 1 << (5 * row + WALL_COLUMN[row][color])
+
+
+def place_on_wall_mask(wall_mask: int, row: int, color: int) -> Tuple[int, int]:
+    """
+    Bitmask version of transfer_to_wall.
+    Returns (new_wall_mask, points gained).
+    """
+    return place_tile(wall_mask, row, color)
+
+
+def calculate_final_bonus_mask(wall_mask: int) -> int:
+    """
+    Bitmask version of calculate_final_bonus.
+    """
+    return final_bonus(wall_mask)
+
+
+def wall_to_mask(wall) -> int:
+    """
+    Converts a 5x5 wall (-1 = empty) into a 25-bit mask.
+    """
+    mask = 0
+    for r in range(5):
+        for c in range(5):
+            if wall[r][c] != -1:
+                mask |= 1 << (5 * r + c)
+    return mask
+
+
+def mask_to_wall(wall_mask: int) -> np.ndarray:
+    """
+    Converts a 25-bit wall mask into a 5x5 array with tile colors (-1 = empty).
+    """
+    wall = np.full((5, 5), -1, dtype=int)
+    for r in range(5):
+        for c in range(5):
+            if wall_mask >> (5 * r + c) & 1:
+                wall[r, c] = (c - r) % 5
+    return wall
+
+
+def draw_factory_tiles(bag: np.ndarray, discard: np.ndarray, factories: np.ndarray,
+                       rng: np.random.Generator, tiles_per_factory: int = 4):
+    """
+    Fills each factory (in place) with `tiles_per_factory` tiles drawn from the bag
+    without replacement. When the bag runs out the discard pile is poured back in;
+    if both are empty the remaining factories stay short.
+    """
+    for i in range(len(factories)):
+        need = tiles_per_factory
+        if bag.sum() < need:
+            # Every tile left in the bag is drawn, then the discard refills it
+            need -= int(bag.sum())
+            factories[i] += bag
+            bag[:] = 0
+            bag += discard
+            discard[:] = 0
+            need = min(need, int(bag.sum()))
+            if need == 0:
+                continue
+        draw = rng.multivariate_hypergeometric(bag.astype(np.int64), need)
+        factories[i] += draw.astype(bag.dtype)
+        bag -= draw.astype(bag.dtype)
@@ -0,0 +1,166 @@
+# src/azul/scoring.py
+"""
+Wall scoring from lookup tables built once at import.
+
+A wall is a 25-bit mask (bit index = row * 5 + col, color at (row, col) is
+(col - row) % 5). Rows, columns and colors are summarised as "packed counts":
+the number of tiles of each of the 5 lines stored in 3 bits per line, so any
+per-line feature (completion bonus, near-completion heuristic...) is a single
+lookup in a table built with line_table().
+
+Only depends on numpy so it can be imported both by the azul_zero modules and
+by the server models.
+"""
+
+import numpy as np
+
+FIELD_BITS = 15                  # 5 lines * 3 bits
+FIELD_MASK = (1 << FIELD_BITS) - 1
+ROWS_SHIFT = 0
+COLS_SHIFT = FIELD_BITS
+COLORS_SHIFT = 2 * FIELD_BITS
+
+# Gather the 5 bits of a column (positions 0, 5, 10, 15, 20 after shifting) into bits 16..20
+_COLUMN_SPREAD = 0x108421
+_COLUMN_GATHER = 0x11111
+
+
+def _run_length(bits: int, pos: int) -> int:
+    # Length of the run of set bits through `pos` in a 5-bit line (0 if pos is not set)
+    if not bits >> pos & 1:
+        return 0
+    length = 1
+    p = pos - 1
+    while p >= 0 and bits >> p & 1:
+        length += 1
+        p -= 1
+    p = pos + 1
+    while p < 5 and bits >> p & 1:
+        length += 1
+        p += 1
+    return length
+
+
+# RUN[pos][line_bits]: contiguous tiles through pos in a row or column
+RUN = [[_run_length(bits, pos) for bits in range(32)] for pos in range(5)]
+
+# POINTS[h][v]: points of a placed tile with horizontal/vertical runs h and v (both include it)
+POINTS = [[(h + v if h > 1 and v > 1 else max(h, v)) for v in range(6)] for h in range(6)]
+
+# LINE_PACK[row][row_bits]: packed counts contributed by one wall row
+LINE_PACK = [
+    [
+        (bin(bits).count("1") << (ROWS_SHIFT + 3 * row))
+        + sum(1 << (COLS_SHIFT + 3 * col) for col in range(5) if bits >> col & 1)
+        + sum(1 << (COLORS_SHIFT + 3 * ((col - row) % 5)) for col in range(5) if bits >> col & 1)
+        for bits in range(32)
+    ]
+    for row in range(5)
+]
+
+_FIELD_COUNTS = (np.arange(1 << FIELD_BITS)[:, None] >> (3 * np.arange(5))) & 7
+
+
+def line_table(weights) -> list:
+    """
+    Table over a packed counts field: table[field] = sum(weights[count]) over its 5 lines.
+    `weights` is indexed by the number of tiles in the line (0..5).
+    """
+    w = np.zeros(8, dtype=np.int64)
+    w[:len(weights)] = weights
+    return w[_FIELD_COUNTS].sum(axis=1).tolist()
+
+
+# End of game bonuses: +2 per row, +7 per column, +10 per color
+ROW_BONUS = line_table([0, 0, 0, 0, 0, 2])
+COL_BONUS = line_table([0, 0, 0, 0, 0, 7])
+COLOR_BONUS = line_table([0, 0, 0, 0, 0, 10])
+
+
+def column_bits(wall_mask: int, col: int) -> int:
+    """
+    5-bit occupancy of a wall column (bit i = row i).
+    """
+    return ((wall_mask >> col) & _COLUMN_SPREAD) * _COLUMN_GATHER >> 16 & 31
+
+
+def line_counts(wall_mask: int) -> int:
+    """
+    Packed tile counts of the wall: rows, columns and colors fields (see FIELD_BITS).
+    """
+    p = LINE_PACK
+    return (p[0][wall_mask & 31] + p[1][wall_mask >> 5 & 31] + p[2][wall_mask >> 10 & 31]
+            + p[3][wall_mask >> 15 & 31] + p[4][wall_mask >> 20 & 31])
+
+
+def lines_value(wall_mask: int, row_table: list, col_table: list, color_table: list) -> int:
+    """
+    Sum of per-line features of the wall, one line_table() per kind of line.
+    """
+    counts = line_counts(wall_mask)
+    return (row_table[counts & FIELD_MASK] + col_table[counts >> COLS_SHIFT & FIELD_MASK]
+            + color_table[counts >> COLORS_SHIFT])
+
+
+def final_bonus(wall_mask: int) -> int:
+    """
+    End of game bonus of a wall (complete rows, columns and colors).
+    """
+    return lines_value(wall_mask, ROW_BONUS, COL_BONUS, COLOR_BONUS)
+
+
+def placement_points(wall_mask: int, row: int, col: int) -> int:
+    """
+    Points scored by a tile placed at (row, col); the mask may or may not contain it yet.
+    """
+    mask = wall_mask | 1 << (5 * row + col)
+    return POINTS[RUN[col][mask >> 5 * row & 31]][RUN[row][column_bits(mask, col)]]
+
+
+def place_tile(wall_mask: int, row: int, color: int) -> tuple:
+    """
+    Put a tile of `color` on `row`. Returns (new_wall_mask, points gained).
+    """
+    col = (color + row) % 5
+    mask = wall_mask | 1 << (5 * row + col)
+    return mask, POINTS[RUN[col][mask >> 5 * row & 31]][RUN[row][column_bits(mask, col)]]
+
+
+# numpy versions of the tables for batched code
+RUN_ARRAY = np.array(RUN, dtype=np.int64)
+POINTS_ARRAY = np.array(POINTS, dtype=np.int64)
+LINE_PACK_ARRAY = np.array(LINE_PACK, dtype=np.int64)
+FINAL_BONUS_ARRAY = np.stack([np.array(t, dtype=np.int64) for t in (ROW_BONUS, COL_BONUS, COLOR_BONUS)])
+
+
+def place_tiles_batch(wall_masks: np.ndarray, row, color: np.ndarray) -> tuple:
+    """
+    Batched place_tile for int64 arrays of walls (rows and colors broadcast).
+    """
+    row = np.asarray(row, dtype=np.int64)
+    col = (color + row) % 5
+    masks = wall_masks | (np.int64(1) << (5 * row + col))
+    col_bits = ((masks >> col) & _COLUMN_SPREAD) * _COLUMN_GATHER >> 16 & 31
+    h = RUN_ARRAY[col, masks >> (5 * row) & 31]
+    v = RUN_ARRAY[row, col_bits]
+    return masks, POINTS_ARRAY[h, v]
+
+
+def line_counts_batch(wall_masks: np.ndarray) -> np.ndarray:
+    """
+    Batched line_counts for an int64 array of walls.
+    """
+    counts = np.zeros_like(wall_masks)
+    for row in range(5):
+        counts += LINE_PACK_ARRAY[row, wall_masks >> (5 * row) & 31]
+    return counts
+
+
+def final_bonus_batch(wall_masks: np.ndarray) -> np.ndarray:
+    """
+    Batched final_bonus for an int64 array of walls.
+    """
+    counts = line_counts_batch(wall_masks)
+    return (FINAL_BONUS_ARRAY[0, counts & FIELD_MASK]
+            + FINAL_BONUS_ARRAY[1, counts >> COLS_SHIFT & FIELD_MASK]
+            + FINAL_BONUS_ARRAY[2, counts >> COLORS_SHIFT])
@@ -0,0 +1,337 @@
+# src/azul/vector_env.py
+
+import numpy as np
+from gymnasium import spaces
+from gymnasium.utils import seeding
+from gymnasium.vector import AutoresetMode, VectorEnv
+from gymnasium.vector.utils import batch_space
+
+from .env import AzulEnv, get_layout, FIRST_PLAYER_TILE
+from .encoding import encode_batch, observation_size
+from .rules import FLOOR_PENALTIES, ROW_MASKS, draw_factory_tiles
+from .scoring import place_tiles_batch, final_bonus_batch
+
+_FLOOR_PENALTIES = np.array(FLOOR_PENALTIES, dtype=np.int64)
+_ROW_MASKS = np.array(ROW_MASKS, dtype=np.int64)
+
+
+def _bit(walls: np.ndarray, pos) -> np.ndarray:
+    return (walls >> pos) & 1 == 1
+
+
+class VectorAzulEnv(VectorEnv):
+    """
+    B Azul games advanced in lockstep.
+
+    Every game uses the packed layout of AzulEnv, stacked on a leading batch
+    axis: `_state` is (B, layout.size) uint8, walls are (B, P) int64 masks and
+    the scalars (scores, current player, round, token...) are (B,) arrays.
+    Actions are flat indices (source * C * 6 + color * 6 + dest) and
+    observations are the encoded vectors of AzulEnv.encode_observation.
+
+    Finished games are reset on the following step (NEXT_STEP autoreset):
+    the action sent for them is ignored and the new initial observation is returned.
+    """
+    metadata = {'autoreset_mode': AutoresetMode.NEXT_STEP}
+
+    def __init__(self, num_envs: int, num_players: int = 2, factories_count: int = 5, seed: int = None):
+        self.num_envs = num_envs
+        self.num_players = num_players
+        self.N = factories_count
+        self._layout = get_layout(num_players, factories_count)
+        self.C = self._layout.C
+        self.action_size = (self.N + 1) * self.C * 6
+        self.obs_size = observation_size(self._layout)
+
+        self.single_action_space = spaces.Discrete(self.action_size)
+        self.single_observation_space = spaces.Box(
+            low=-1000, high=1000, shape=(self.obs_size,), dtype=np.float32
+        )
+        self.action_space = batch_space(self.single_action_space, num_envs)
+        self.observation_space = batch_space(self.single_observation_space, num_envs)
+        self._np_random, self._np_random_seed = seeding.np_random(seed)
+
+        B, P = num_envs, num_players
+        self._state = np.zeros((B, self._layout.size), dtype=np.uint8)
+        self.wall_masks = np.zeros((B, P), dtype=np.int64)
+        self.scores = np.zeros((B, P), dtype=np.int64)
+        self.round_accumulated_score = np.zeros((B, P), dtype=np.int64)
+        self.first_player_token = np.ones(B, dtype=bool)
+        self.first_player_next_round = np.full(B, -1, dtype=np.int64)
+        self.current_player = np.zeros(B, dtype=np.int64)
+        self.round_count = np.ones(B, dtype=np.int64)
+        self.done = np.zeros(B, dtype=bool)
+        self._autoreset = np.zeros(B, dtype=bool)
+        self._reset_envs(np.arange(B))
+
+    # --- gymnasium vector API ---
+
+    def reset(self, *, seed: int = None, options: dict = None):
+        if seed is not None:
+            self._np_random, self._np_random_seed = seeding.np_random(seed)
+        self._reset_envs(np.arange(self.num_envs))
+        self._autoreset[:] = False
+        return self.encode_observation(), {}
+
+    def step(self, actions):
+        """
+        Apply one flat action per game.
+        Returns (obs, rewards, terminations, truncations, infos); the reward is
+        only non-zero on the final move and is the score difference from the
+        point of view of the player who moved, as in AzulEnv.step.
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        B = self.num_envs
+        rewards = np.zeros(B, dtype=np.float32)
+        terminations = np.zeros(B, dtype=bool)
+
+        restart = np.flatnonzero(self._autoreset)
+        if restart.size:
+            self._reset_envs(restart)
+        active = np.flatnonzero(~self._autoreset)
+        if active.size:
+            rewards[active], terminations[active] = self._step_envs(active, actions[active])
+
+        self._autoreset = terminations.copy()
+        infos = {'scores': self.scores.copy(), 'round': self.round_count.copy()}
+        return self.encode_observation(), rewards, terminations, np.zeros(B, dtype=bool), infos
+
+    # --- Batched game logic ---
+
+    def _reset_envs(self, ids: np.ndarray):
+        L = self._layout
+        self._state[ids] = 0
+        self._state[ids, L.bag:L.bag + L.C] = 20
+        self._state[ids, L.accept:L.size] = 1
+        self.wall_masks[ids] = 0
+        self.scores[ids] = 0
+        self.round_accumulated_score[ids] = 0
+        self.first_player_token[ids] = True
+        self.first_player_next_round[ids] = -1
+        self.current_player[ids] = 0
+        self.round_count[ids] = 1
+        self.done[ids] = False
+        self._refill(ids)
+
+    def _refill(self, ids: np.ndarray):
+        L = self._layout
+        for i in ids:
+            row = self._state[i]
+            row[L.center:L.tiles_end] = 0
+            draw_factory_tiles(row[L.bag:L.bag + L.C], row[L.discard:L.discard + L.C],
+                               row[L.factories:L.center].reshape(L.N, L.C), self.np_random)
+
+    def _step_envs(self, ids: np.ndarray, actions: np.ndarray):
+        L = self._layout
+        C, N, P, F = L.C, L.N, L.P, L.F
+        s = self._state[ids]
+        k = np.arange(len(ids))
+        src = actions // (6 * C)
+        color = (actions // 6) % C
+        dest = actions % 6
+        cp = self.current_player[ids]
+        opponent = (cp + 1) % P
+        before_self = self.scores[ids, cp]
+        before_opp = self.scores[ids, opponent]
+
+        floor_count_pos = L.floor_count + cp
+        floor_base = L.floor + cp * F
+        current_penalty = _FLOOR_PENALTIES[s[k, floor_count_pos]]
+
+        # Take the tiles
+        if (src > N).any():
+            raise ValueError(f"Invalid action: unknown source in games {ids[src > N].tolist()}")
+        count = s[k, L.factories + src * C + color].astype(np.int64)
+        if (count == 0).any():
+            raise ValueError(f"Invalid action: empty source/color in games {ids[count == 0].tolist()}")
+
+        fac = np.flatnonzero(src < N)
+        if fac.size:
+            cols = L.factories + src[fac, None] * C + np.arange(C)
+            moved = s[fac[:, None], cols]
+            moved[np.arange(fac.size), color[fac]] = 0
+            s[fac[:, None], L.center + np.arange(C)] += moved
+            s[fac[:, None], cols] = 0
+        cen = np.flatnonzero(src == N)
+        if cen.size:
+            s[cen, L.center + color[cen]] = 0
+            taker = cen[self.first_player_token[ids[cen]]]
+            if taker.size:
+                fc = s[taker, floor_count_pos[taker]].astype(np.int64)
+                # Full floor: the token replaces the last tile (same as AzulEnv)
+                slot = np.minimum(fc, F - 1)
+                s[taker, floor_base[taker] + slot] = FIRST_PLAYER_TILE + 1
+                s[taker, floor_count_pos[taker]] = np.minimum(fc + 1, F)
+                self.first_player_token[ids[taker]] = False
+                self.first_player_next_round[ids[taker]] = cp[taker]
+
+        # Pattern lines (speculative wall points when a line gets completed)
+        overflow = count.copy()
+        speculative = np.zeros(len(ids), dtype=np.int64)
+        line = np.flatnonzero(dest < 5)
+        if line.size:
+            d = dest[line]
+            count_pos = L.line_count + cp[line] * 5 + d
+            color_pos = L.line_color + cp[line] * 5 + d
+            line_count = s[line, count_pos].astype(np.int64)
+            accepts = (line_count == 0) | (s[line, color_pos] == color[line])
+            line, d, count_pos, color_pos, line_count = (
+                line[accepts], d[accepts], count_pos[accepts], color_pos[accepts], line_count[accepts]
+            )
+            placeable = np.minimum(d + 1 - line_count, count[line])
+            s[line, count_pos] = line_count + placeable
+            s[line, color_pos] = color[line]
+            # Lines that were empty now only take this color
+            fresh = line_count == 0
+            accept_cols = L.accept + (cp[line] * C * 6 + d)[fresh, None] + 6 * np.arange(C)
+            s[line[fresh, None], accept_cols] = np.arange(C) == color[line][fresh, None]
+            overflow[line] = count[line] - placeable
+
+            completed = (line_count + placeable == d + 1) & (line_count < d + 1)
+            done_lines = line[completed]
+            if done_lines.size:
+                walls = self.wall_masks[ids[done_lines], cp[done_lines]]
+                new_walls, points = place_tiles_batch(walls, d[completed], color[done_lines])
+                speculative[done_lines] = points + final_bonus_batch(new_walls) - final_bonus_batch(walls)
+
+        # Overflow to the floor, what does not fit goes to discard
+        fc = s[k, floor_count_pos].astype(np.int64)
+        placed = np.minimum(F - fc, overflow)
+        for slot in range(F):
+            m = (slot >= fc) & (slot < fc + placed)
+            if m.any():
+                s[k[m], floor_base[m] + slot] = color[m] + 1
+        s[k, floor_count_pos] = fc + placed
+        s[k, L.discard + color] += (overflow - placed).astype(np.uint8)
+
+        delta = _FLOOR_PENALTIES[fc + placed] - current_penalty + speculative
+        self.scores[ids, cp] += delta
+        self.round_accumulated_score[ids, cp] += delta
+        self._state[ids] = s
+
+        # Next player or end of round
+        round_over = ~s[:, L.factories:L.tiles_end].any(axis=1)
+        self.current_player[ids[~round_over]] = opponent[~round_over]
+        if round_over.any():
+            self._end_round(ids[round_over])
+
+        done = self.done[ids]
+        rewards = np.where(
+            done,
+            (self.scores[ids, cp] - before_self) - (self.scores[ids, opponent] - before_opp),
+            0
+        )
+        return rewards, done
+
+    def _end_round(self, ids: np.ndarray):
+        L = self._layout
+        C, P, F = L.C, L.P, L.F
+        s = self._state[ids]
+        walls = self.wall_masks[ids]
+        # Revert speculative scoring
+        scores = self.scores[ids] - self.round_accumulated_score[ids]
+        self.round_accumulated_score[ids] = 0
+
+        for p in range(P):
+            # pattern lines -> wall
+            for row in range(5):
+                count_pos = L.line_count + p * 5 + row
+                full = np.flatnonzero(s[:, count_pos] == row + 1)
+                if not full.size:
+                    continue
+                color_pos = L.line_color + p * 5 + row
+                color = s[full, color_pos].astype(np.int64)
+                walls[full, p], points = place_tiles_batch(walls[full, p], row, color)
+                scores[full, p] += points
+                s[full, L.discard + color] += row
+                s[full, count_pos] = 0
+                s[full, color_pos] = 0
+                # Emptied line: takes every color not yet on its wall row
+                colors = np.arange(C)
+                s[full[:, None], L.accept + p * C * 6 + 6 * colors + row] = ~_bit(
+                    walls[full, p, None], 5 * row + (colors + row) % 5
+                )
+
+            # floor line penalties, tiles (not the token) go to discard
+            scores[:, p] += _FLOOR_PENALTIES[s[:, L.floor_count + p]]
+            floor = s[:, L.floor + p * F:L.floor + (p + 1) * F]
+            s[:, L.discard:L.discard + C] += (floor[:, :, None] == np.arange(1, C + 1)).sum(axis=1).astype(np.uint8)
+            floor[:] = 0
+            s[:, L.floor_count + p] = 0
+
+        game_over = ((walls[:, :, None] & _ROW_MASKS) == _ROW_MASKS).any(axis=(1, 2))
+        scores[game_over] += final_bonus_batch(walls[game_over])
+
+        self._state[ids] = s
+        self.wall_masks[ids] = walls
+        self.scores[ids] = scores
+        self.round_count[ids] += 1
+        self.done[ids[game_over]] = True
+
+        going_on = ids[~game_over]
+        if going_on.size:
+            self.first_player_token[going_on] = True
+            self._refill(going_on)
+            next_round = self.first_player_next_round[going_on]
+            taken = next_round != -1
+            self.current_player[going_on[taken]] = next_round[taken]
+            self.first_player_next_round[going_on] = -1
+
+    # --- Batched queries ---
+
+    def valid_action_mask(self) -> np.ndarray:
+        """
+        (B, action_size) binary mask of legal actions, same rules as
+        AzulEnv.get_valid_actions. Finished games have an all-zero mask.
+        """
+        L = self._layout
+        B, C, N, P = self.num_envs, self.C, self.N, self.num_players
+        tiles = self._state[:, L.factories:L.tiles_end].reshape(B, N + 1, C, 1)
+        accept = self._state[:, L.accept:L.size].reshape(B, P, C, 6)[np.arange(B), self.current_player]
+        mask = np.minimum(tiles, accept[:, None])
+        return mask.reshape(B, self.action_size).astype(np.float32)
+
+    def encode_observation(self, out: np.ndarray = None) -> np.ndarray:
+        """
+        (B, obs_size) float32 encoding of every game, same layout as
+        AzulEnv.encode_observation.
+        """
+        return encode_batch(self._state, self.wall_masks, self.scores, self.current_player,
+                            self.round_count, self.first_player_token, self._layout, out=out)
+
+    def get_env(self, i: int) -> AzulEnv:
+        """
+        Copy of game `i` as a standalone AzulEnv (e.g. to run MCTS on it).
+        """
+        env = AzulEnv(num_players=self.num_players, factories_count=self.N)
+        env._np_random = self.np_random.spawn(1)[0]
+        self.set_env_state(env, i)
+        return env
+
+    def set_env_state(self, env: AzulEnv, i: int):
+        env._state[:] = self._state[i]
+        env.wall_masks = [int(w) for w in self.wall_masks[i]]
+        env.scores = [int(x) for x in self.scores[i]]
+        env.round_accumulated_score = [int(x) for x in self.round_accumulated_score[i]]
+        env.first_player_token = bool(self.first_player_token[i])
+        env.first_player_next_round = int(self.first_player_next_round[i])
+        env.current_player = int(self.current_player[i])
+        env.round_count = int(self.round_count[i])
+        env.done = bool(self.done[i])
+        env._undo = []
+        env._hash = env._compute_hash()
+
+    def load_env(self, i: int, env: AzulEnv):
+        """
+        Overwrite game `i` with the state of a standalone AzulEnv.
+        """
+        self._state[i] = env._state
+        self.wall_masks[i] = env.wall_masks
+        self.scores[i] = env.scores
+        self.round_accumulated_score[i] = env.round_accumulated_score
+        self.first_player_token[i] = env.first_player_token
+        self.first_player_next_round[i] = env.first_player_next_round
+        self.current_player[i] = env.current_player
+        self.round_count[i] = env.round_count
+        self.done[i] = env.done
+        self._autoreset[i] = False
@@ -1,100 +1,302 @@
 # File: src/players/deep_mcts_player.py
 
+import math
+import time
+import random
+import threading
+import multiprocessing as mp
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
 import torch
 import numpy as np
 
-from net.azul_net import AzulNet
+from net.azul_net import AzulNet, load_azul_net
+from net.export import load_inference_model
+from net.inference_server import InferenceServer
+from net.prediction_cache import CachedModel, shared_cache, weights_fingerprint
 
-from azul.env import AzulEnv
+from azul.env import AzulEnv, FIRST_PLAYER_TILE
+from azul.round_solver import RoundSolver
 from mcts.mcts import MCTS
 
 from .base_player import BasePlayer
 
 class DeepMCTSPlayer(BasePlayer):
-    def __init__(self, model_path, device='cpu', mcts_iters=300, cpuct=1.0, temperature=0.0, single_player_mode=True):
+    def __init__(self, model_path, device='cpu', mcts_iters=300, cpuct=1.0, temperature=0.0, single_player_mode=True,
+                 transposition_size=0, batch_size=1, num_workers=0, worker_simulations=None, max_nodes=0,
+                 game_ttl=900.0, inference_batch_size=0, inference_wait=0.002, cache_entries=0, cache_bytes=0,
+                 ponder_simulations=0, ponder_seconds=60.0, solver_tiles=0, solver_nodes=10000, chance_outcomes=0):
+        """
+        num_workers > 1 enables root-parallel search: that many processes, each
+        with its own copy of the network, search the same root with different
+        seeds and their root visit counts are added up before picking the move.
+        worker_simulations is the per-worker budget (default: mcts_iters split
+        between the workers).
+        max_nodes caps the size of the search tree (0 = unlimited), see MCTS.
+        game_ttl: seconds after which an idle game's cached tree is dropped (see predict).
+        inference_batch_size > 0 sends the network calls through an InferenceServer,
+        so games searched at the same time from several threads share forward passes
+        (up to that many rows, waiting at most inference_wait seconds).
+        cache_entries / cache_bytes > 0 keep network outputs in a PredictionCache
+        shared by every player loaded from the same model file.
+        ponder_simulations > 0 lets predict(..., ponder=True) keep searching a game's
+        tree in the background after its move, up to that many simulations or
+        ponder_seconds, until the next move of that game is asked for.
+        solver_tiles > 0 plays the exact RoundSolver move instead of searching once
+        at most that many tiles are left in the round (if the solver finishes within
+        solver_nodes positions).
+        chance_outcomes > 0 searches the round boundaries through that many fixed
+        refills of the factories (see MCTS).
+        """
         super().__init__()
         self.device = torch.device(device)
         self.temperature = temperature
-        # Load checkpoint and extract model state
-        checkpoint = torch.load(model_path, map_location=self.device)
-        state_dict = checkpoint.get('model_state', checkpoint)
-        
-        # Infer network dimensions from checkpoint
-        in_channels = state_dict['conv_in.weight'].shape[1]
-        
-        # For Phase 2 architecture:
-        # policy_fc1.weight has shape [256, spatial_flat + factories_flat + global_size]
-        # value_fc1.weight has shape [256, spatial_flat + factories_flat + global_size]
-        # spatial_flat = 2 * 5 * 5 = 50 (policy conv outputs 2 channels)
-        # spatial_flat = 1 * 5 * 5 = 25 (value conv outputs 1 channel)
-        # factories_flat = (N + 1) * embed_dim, where N=5, we need to infer embed_dim
-        
-        # For now, use a simpler approach: initialize env to get correct sizes
+        self.num_workers = num_workers
+        self._pool = None
+        self.game_ttl = game_ttl
+        self.ponder_simulations = ponder_simulations
+        self.ponder_seconds = ponder_seconds
+        self.solver_tiles = solver_tiles
+        self.solver_nodes = solver_nodes
+        self._games = OrderedDict()  # (game_id, seat) -> _GameTree, least recently used first
+        self._games_lock = threading.Lock()
+        if num_workers > 1:
+            self._worker_kwargs = dict(
+                model_path=model_path, device=device,
+                mcts_iters=worker_simulations or math.ceil(mcts_iters / num_workers),
+                cpuct=cpuct, temperature=temperature, single_player_mode=single_player_mode,
+                transposition_size=transposition_size, batch_size=batch_size, max_nodes=max_nodes,
+                cache_entries=cache_entries, cache_bytes=cache_bytes, chance_outcomes=chance_outcomes,
+            )
         env = AzulEnv()
-        obs_flat = env.encode_observation(env.reset(initial=True))
-        total_obs_size = obs_flat.shape[0]
-        # Updated for 20-channel input
-        spatial_size = in_channels * 5 * 5
-        factories_size = (env.N + 1) * 5
-        global_size = total_obs_size - spatial_size - factories_size
-        action_size = env.action_size
-        
-        # Build and load network
-        self.net = AzulNet(
-            in_channels=in_channels,
-            global_size=global_size,
-            action_size=action_size,
-            factories_count=env.N
-        )
-        self.net.load_state_dict(state_dict)
-        self.net.to(self.device)
-        self.net.eval()
+        env.reset(initial=True)
+        if model_path.endswith('.ts'):
+            # CPU inference artifact built by net/export.py
+            self.net = load_inference_model(model_path, self.device)
+        else:
+            self.net = load_azul_net(model_path, self.device, env)
+        # Searches only run inference: skip the per call set-up of AzulNet.predict
+        session = self.net.session() if isinstance(self.net, AzulNet) else self.net
+        self.inference = InferenceServer(session, inference_batch_size, inference_wait) if inference_batch_size > 0 else None
+        self.cache = None
+        self._predictor = self.inference if self.inference is not None else session
+        if cache_entries > 0 or cache_bytes > 0:
+            self.cache = shared_cache(weights_fingerprint(model_path), cache_entries, cache_bytes)
+            self._predictor = CachedModel(self._predictor, self.cache)
         
         # Prepare prototype environment for MCTS
         self.prototype_env = env
         # Initialize MCTS searcher
-        self.mcts = MCTS(self.prototype_env,
-                         self.net,
-                         simulations=mcts_iters,
-                         cpuct=cpuct,
-                         single_player_mode=single_player_mode)
+        self._mcts_kwargs = dict(simulations=mcts_iters,
+                                 cpuct=cpuct,
+                                 single_player_mode=single_player_mode,
+                                 transposition_size=transposition_size,
+                                 batch_size=batch_size,
+                                 max_nodes=max_nodes,
+                                 chance_outcomes=chance_outcomes)
+        self.mcts = MCTS(self.prototype_env, self._model(), **self._mcts_kwargs)
+
+    def _model(self):
+        return self._predictor
+
+    def _searching(self):
+        # Lets the inference server know one more search may send requests
+        return self.inference.client() if self.inference is not None else nullcontext()
 
     def _obs_to_env(self, obs: dict):
         """
         Copy the observation dict into the prototype_env state.
         """
-        env = self.prototype_env
-        env.bag = obs['bag'].copy()
-        env.discard = obs['discard'].copy()
-        env.factories = obs['factories'].copy()
-        env.center = obs['center'].copy()
-        env.first_player_token = bool(obs['first_player_token'])
-        env.current_player = int(obs['current_player'])
-        env.round_count = int(obs.get('round_count', env.round_count))
-        for i, p_obs in enumerate(obs['players']):
-            env.players[i]['pattern_lines'] = [line.copy() for line in p_obs['pattern_lines']]
-            env.players[i]['wall'] = p_obs['wall'].copy()
-            env.players[i]['floor_line'] = p_obs['floor_line'].copy()
-            env.players[i]['score'] = int(p_obs['score'])
-
-    def predict(self, obs: dict):
+        self.prototype_env.load_obs(obs)
+
+    def predict(self, obs: dict, game_id=None, last_move: dict = None, ponder: bool = False):
         """
         Ejecuta MCTS en el estado dado y devuelve la acción seleccionada.
+
+        With a game_id the search tree is kept between the moves of that game:
+        last_move (AzulGameState.last_move) tells which opponent move led to obs.
+        ponder=True keeps searching that tree while the opponent thinks (see
+        ponder_simulations).
         """
+        if game_id is not None and self.num_workers <= 1:
+            return self._predict_in_game(obs, game_id, last_move, ponder)
+        if self.solver_tiles > 0:
+            self._obs_to_env(obs)
+            action = self._solve(self.prototype_env)
+            if action is not None:
+                return action
+        if self.num_workers > 1:
+            visits = self._parallel_visits(obs)
+            if not visits:
+                self._obs_to_env(obs)
+                return random.choice(self.prototype_env.get_valid_actions())
+            return MCTS.pick_by_visits(list(visits.items()), temperature=self.temperature)
+
         # Load current observation into the prototype environment
         self._obs_to_env(obs)
         # Run MCTS from this state
         # CRITICAL: We must reset the MCTS root to the new state because we are not using 'advance'
         # to track history. The BGA adapter gives us a fresh observation each time.
-        # So we treat each move as a fresh search problem.
-        self.mcts.root = self.mcts.Node(self.prototype_env.clone(), parent=None, prior=1.0)
-        
+        # So we treat each move as a fresh search problem (run() starts a new tree from it).
         self.mcts.run(self.prototype_env)
         # Select and return an action tuple
         # Use configured temperature
         action = self.mcts.select_action(temperature=self.temperature)
         return action
 
+    def _predict_in_game(self, obs: dict, game_id, last_move: dict, ponder: bool = False):
+        """
+        Search from the tree cached for this game and seat when the opponent's
+        move can be followed in it, then keep the subtree of our own move.
+        Only the missing simulations are run on a warm root.
+        Different games can be searched at the same time from several threads.
+        """
+        env = self.prototype_env.clone()
+        env.load_obs(obs)
+        key = (game_id, env.current_player)
+        with self._games_lock:
+            self._evict_idle()
+            entry = self._games.pop(key, None)
+        if entry is not None:
+            entry.stop_pondering(wait=True)
+        if entry is None or not self._follow(entry.mcts, env, last_move):
+            entry = _GameTree(MCTS(env, self._model(), **self._mcts_kwargs))
+        mcts = entry.mcts
+
+        action = self._solve(env)
+        if action is None:
+            mcts.simulations = max(1, self.mcts.simulations - mcts.root.visits)
+            with self._searching():
+                mcts.run()
+            action = mcts.select_action(temperature=self.temperature)
+
+        # Keep the tree unless our move ends the round (the refill is unknown)
+        after = env.clone()
+        if not after.fast_step(action) and after.round_count == env.round_count:
+            mcts.advance(action, after)
+            entry.last_used = time.monotonic()
+            with self._games_lock:
+                self._games[key] = entry
+            if ponder and self.ponder_simulations > 0:
+                entry.start_pondering(self._ponder, env.current_player)
+        return action
+
+    def _solve(self, env: AzulEnv):
+        """
+        Exact move for the end of the round (see solver_tiles), or None to search.
+        """
+        if self.solver_tiles <= 0:
+            return None
+        solved = RoundSolver(self.solver_tiles, self.solver_nodes).solve(env)
+        return solved[0] if solved is not None else None
+
+    def _ponder(self, entry: '_GameTree', seat: int):
+        """
+        Background search on the tree of a game while the opponent is to move,
+        a few simulations at a time so that a stop request is seen quickly.
+        """
+        mcts = entry.mcts
+        # The root is the opponent's turn; single player mode still plays for us
+        mcts.root_player = seat
+        deadline = time.monotonic() + self.ponder_seconds
+        chunk = max(8, mcts.batch_size)
+        with self._searching():
+            while (entry.pondered < self.ponder_simulations and not entry.stop.is_set()
+                   and time.monotonic() < deadline):
+                mcts.simulations = min(chunk, self.ponder_simulations - entry.pondered)
+                mcts.run()
+                entry.pondered += mcts.simulations
+
+    @staticmethod
+    def _follow(mcts: MCTS, env: AzulEnv, last_move: dict) -> bool:
+        """
+        Advance a cached tree through the opponent move that leads from its
+        root to `env`. The move is rebuilt from last_move (color and target
+        row, the source is not recorded): every matching legal move is played
+        and the resulting position compared with `env`.
+        """
+        before = mcts.root.env
+        if not last_move or last_move.get('round_at_move') != env.round_count:
+            return False
+        if before.round_count != env.round_count or (before.current_player + 1) % env.num_players != env.current_player:
+            # New round, or several moves happened since (more than two players)
+            return False
+        row = last_move['target_row_index']
+        dest = 5 if row == -1 else row
+        color = int(last_move['color'])
+        for action in before.get_valid_actions():
+            if action[1] != color or action[2] != dest:
+                continue
+            sim = before.clone()
+            sim.fast_step(action)
+            if _same_position(sim, env):
+                mcts.advance(action, env)
+                return True
+        return False
+
+    def end_game(self, game_id):
+        """
+        Drop the cached trees of a finished (or deleted) game.
+        """
+        with self._games_lock:
+            for key in [key for key in self._games if key[0] == game_id]:
+                self._games.pop(key).stop_pondering()
+
+    def _evict_idle(self):
+        deadline = time.monotonic() - self.game_ttl
+        while self._games:
+            key, entry = next(iter(self._games.items()))
+            if entry.last_used > deadline:
+                break
+            del self._games[key]
+            entry.stop_pondering()
+
+    def search_visits(self, obs: dict, seed: int = None) -> dict:
+        """
+        Fresh search from `obs`; returns the root visit counts by action.
+        `seed` fixes the randomness of the search (sampled replies, refills)
+        with generators of its own; the global random streams are left alone.
+        """
+        self._obs_to_env(obs)
+        streams = self.mcts.random, self.mcts.np_random
+        if seed is not None:
+            self.prototype_env.np_random = np.random.default_rng(seed)
+            self.mcts.random, self.mcts.np_random = random.Random(seed), np.random.default_rng(seed)
+        try:
+            self.mcts.run(self.prototype_env)
+        finally:
+            self.mcts.random, self.mcts.np_random = streams
+        return {action: child.visits for action, child in self.mcts.root.children.items()}
+
+    def _parallel_visits(self, obs: dict) -> Counter:
+        # Workers are started on first use and kept for the following moves
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.num_workers,
+                                             mp_context=mp.get_context('spawn'),
+                                             initializer=_init_worker,
+                                             initargs=(self._worker_kwargs,))
+        seeds = [random.getrandbits(32) for _ in range(self.num_workers)]
+        merged = Counter()
+        for visits in self._pool.map(_worker_search, [obs] * self.num_workers, seeds):
+            merged.update(visits)
+        return merged
+
+    def close(self):
+        """
+        Stop the root-parallel worker processes, pondering and the inference thread, if any.
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        with self._games_lock:
+            entries = list(self._games.values())
+        for entry in entries:
+            entry.stop_pondering(wait=True)
+        if self.inference is not None:
+            self.inference.stop()
+
     def visualize(self, obs: dict):
         """
         Returns visualization data for the current state.
@@ -105,7 +307,7 @@ class DeepMCTSPlayer(BasePlayer):
         env = self.prototype_env
         
         # Encode observation
-        obs_flat = env.encode_observation(env._get_obs())
+        obs_flat = env.encode_state()
         obs_batch = obs_flat[np.newaxis, :]
         
         # 1. Network Prediction (Raw)
@@ -114,11 +316,7 @@ class DeepMCTSPlayer(BasePlayer):
         value_pred = float(values[0])
         
         # 2. Network Prediction (Masked / Legal)
-        valid_actions = env.get_valid_actions()
-        action_mask = np.zeros(env.action_size, dtype=np.float32)
-        for action in valid_actions:
-            idx = env.action_to_index(action)
-            action_mask[idx] = 1.0
+        action_mask = env.get_action_mask()
         
         mask_batch = action_mask[np.newaxis, :]
         pi_logits_masked, _ = self.net.predict(obs_batch, action_mask=mask_batch)
@@ -214,4 +412,67 @@ class DeepMCTSPlayer(BasePlayer):
                 "global": glob_viz,
                 "global_labels": global_labels
             }
-        }
\ No newline at end of file
+        }
+
+
+class _GameTree:
+    """
+    Search tree kept between the moves of one seat of a game, and the thread
+    pondering on it if any.
+    """
+    __slots__ = ('mcts', 'last_used', 'stop', 'thread', 'pondered')
+
+    def __init__(self, mcts: MCTS):
+        self.mcts = mcts
+        self.last_used = time.monotonic()
+        self.stop = threading.Event()
+        self.thread = None
+        self.pondered = 0
+
+    def start_pondering(self, ponder, seat: int):
+        self.stop.clear()
+        self.pondered = 0
+        self.thread = threading.Thread(target=ponder, args=(self, seat), name='azul-ponder', daemon=True)
+        self.thread.start()
+
+    def stop_pondering(self, wait: bool = False):
+        self.stop.set()
+        if wait and self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+
+def _same_position(sim: AzulEnv, real: AzulEnv) -> bool:
+    """
+    True if a simulated env matches the one loaded from the game state. The
+    server only scores at the end of the round and does not put the first
+    player tile on the floor: scores are compared without the env's running
+    round score and floors by their colored tiles only.
+    """
+    L = sim._layout
+    if (sim.current_player != real.current_player or sim.first_player_token != real.first_player_token
+            or list(sim.wall_masks) != list(real.wall_masks)):
+        return False
+    if ([s - acc for s, acc in zip(sim.scores, sim.round_accumulated_score)]
+            != [s - acc for s, acc in zip(real.scores, real.round_accumulated_score)]):
+        return False
+    # bag, discard, factories, center and pattern lines
+    if not np.array_equal(sim._state[:L.floor], real._state[:L.floor]):
+        return False
+    floors = (sim._state[L.floor:L.floor_count].reshape(L.P, L.F), real._state[L.floor:L.floor_count].reshape(L.P, L.F))
+    tiles = [[sorted(t for t in row.tolist() if t and t != FIRST_PLAYER_TILE + 1) for row in f] for f in floors]
+    return tiles[0] == tiles[1]
+
+
+# Root-parallel workers: every process builds its own DeepMCTSPlayer (and network) once
+_worker_player = None
+
+
+def _init_worker(player_kwargs: dict):
+    global _worker_player
+    torch.set_num_threads(1)  # one core per worker
+    _worker_player = DeepMCTSPlayer(**player_kwargs)
+
+
+def _worker_search(obs: dict, seed: int) -> dict:
+    return _worker_player.search_visits(obs, seed)
@@ -1,7 +1,6 @@
 # src/players/heuristic_player.py
 import random
 import torch
-import numpy as np
 import copy
 from azul.rules import (
     validate_origin,
@@ -12,44 +11,47 @@ from azul.rules import (
     Color
 )
 from azul.env import AzulEnv
+from azul.scoring import line_table, lines_value
+from azul.round_solver import RoundSolver, static_move_delta
 import math
+import time
+
+# Heuristic wall bonuses indexed by tiles in the line (near-complete lines count
+# towards the end game bonus; complete rows get extra weight to encourage them)
+ROW_HEURISTIC = line_table([0, 0, 0, 0, 3, 2])
+COL_HEURISTIC = line_table([0, 0, 0, 2, 5, 7])
+COLOR_HEURISTIC = line_table([0, 0, 0, 2, 6, 10])
+
+# Transposition table bounds
+_EXACT, _LOWER, _UPPER = 0, 1, 2
+
+
+class _SearchTimeout(Exception):
+    pass
+
 
 class HeuristicMinMaxMCTSPlayer:
-    def __init__(self, strategy='minmax', simulations=50, depth=2):
+    def __init__(self, strategy='minmax', simulations=50, depth=2, time_limit=None, beam_width=0,
+                 solver_tiles=0, solver_nodes=10000):
         self.device = torch.device("cpu")
         self.strategy = strategy
         self.simulations = simulations
         self.depth = depth
+        self.time_limit = time_limit  # seconds per minmax move (None = always reach depth)
+        # minmax below the root only expands the beam_width best moves by static_move_delta (0 = all)
+        self.beam_width = beam_width
+        # with at most solver_tiles tiles left in the round its exact RoundSolver move is played
+        # (if found within solver_nodes positions), whatever the strategy
+        self.solver_tiles = solver_tiles
+        self.solver_nodes = solver_nodes
+        self.nodes = 0  # positions searched (minmax) or simulations (mcts) by the last predict
 
     def _reconstruct_env(self, obs):
         """
         Reconstructs a full AzulEnv from the observation dictionary.
         """
         env = AzulEnv(num_players=len(obs["players"]))
-        
-        # Restore scalars
-        env.current_player = int(obs["current_player"])
-        env.round_count = int(obs["round_count"])
-        env.first_player_token = bool(obs["first_player_token"])
-        
-        # Restore arrays
-        env.bag = np.array(obs["bag"], dtype=int)
-        env.discard = np.array(obs["discard"], dtype=int)
-        env.factories = np.array(obs["factories"], dtype=int)
-        env.center = np.array(obs["center"], dtype=int)
-        
-        # Restore players
-        for i, p_data in enumerate(obs["players"]):
-            env.players[i]['score'] = int(p_data['score'])
-            env.players[i]['wall'] = np.array(p_data['wall'], dtype=int)
-            env.players[i]['floor_line'] = np.array(p_data['floor_line'], dtype=int)
-            
-            # Pattern lines need careful handling (list of arrays)
-            # obs['players'][i]['pattern_lines'] is usually a list of arrays or list of lists
-            # The environment expects list of np.arrays of different sizes
-            pl_data = p_data['pattern_lines']
-            env.players[i]['pattern_lines'] = [np.array(line, dtype=int) for line in pl_data]
-            
+        env.load_obs(obs)
         return env
 
     def predict(self, obs):
@@ -57,10 +59,18 @@ class HeuristicMinMaxMCTSPlayer:
         env = self._reconstruct_env(obs)
         
         # 2. Search
+        self.nodes = 0
+        if self.solver_tiles > 0:
+            solver = RoundSolver(self.solver_tiles, self.solver_nodes)
+            solved = solver.solve(env)
+            self.nodes = solver.nodes
+            if solved is not None:
+                return env.action_to_index(solved[0])
         if self.strategy == 'minmax':
             best_action = self._minmax_search(env)
         elif self.strategy == 'mcts':
             best_action = self._mcts_search(env)
+            self.nodes = self.simulations
         else:
             raise ValueError(f"Unknown strategy: {self.strategy}")
             
@@ -70,72 +80,147 @@ class HeuristicMinMaxMCTSPlayer:
     # MinMax Implementation
     # ==========================
     def _minmax_search(self, env):
+        """
+        Iterative deepening alpha-beta: depth 1, 2, ... up to self.depth, or
+        until time_limit runs out (the move of the last finished depth is
+        played). A transposition table keyed by the state hash keeps the
+        bound and best move of every searched position; moves are tried
+        best move first, then by static_move_delta. With beam_width the
+        nodes below the root only search that many of their moves.
+        """
         valid_actions = env.get_valid_actions()
         if not valid_actions:
              return None
-             
-        best_val = float("-inf")
-        best_action = None
-        
-        # Root expansion
+
+        # Ties keep a random order
         random.shuffle(valid_actions)
-        
-        alpha = float("-inf")
-        beta = float("inf")
-        
+
         # Identify Root Player to ensure we maximize THEIR score relative to opponent
         root_player = env.current_player
-        
-        for action in valid_actions:
-            next_env = env.clone()
-            next_env.step(action)
-            
-            # Recursive call
-            # minimizing_player=False passed to next level means "Next level is Opponent" (Minimizing)
-            # We pass root_player to evaluate correctly at leaf
-            val = self._minmax(next_env, self.depth - 1, alpha, beta, False, root_player)
-            
-            if val > best_val:
-                best_val = val
-                best_action = action
-            
-            alpha = max(alpha, best_val)
-            
-        if best_action is None:
-             return valid_actions[0]
-             
+        self._table = {}
+        self._deadline = time.perf_counter() + self.time_limit if self.time_limit else None
+
+        # The whole search walks a single env with push()/pop()
+        actions = self._order_moves(env, valid_actions, None)
+        best_action = actions[0]
+        for depth in range(1, self.depth + 1):
+            try:
+                best_action = self._search_root(env, actions, depth, root_player)
+            except _SearchTimeout:
+                break
+            # Principal move first in the next iteration
+            actions.remove(best_action)
+            actions.insert(0, best_action)
+
         return env.action_to_index(best_action)
 
-    def _minmax(self, env, depth, alpha, beta, maximizing_player, root_player):
+    def _search_root(self, env, actions, depth, root_player):
+        alpha = float("-inf")
+        best_action = None
+        for i, action in enumerate(actions):
+            env.push(action)
+            val = self._search_child(env, depth - 1, alpha, float("inf"), root_player, True, i == 0)
+            env.pop()
+            if best_action is None or val > alpha:
+                alpha = val
+                best_action = action
+        self._table[env.state_hash()] = (depth, alpha, _EXACT, best_action)
+        return best_action
+
+    def _minmax(self, env, depth, alpha, beta, root_player):
+        """
+        Alpha-beta value of env for root_player. The player to move decides
+        whether the node maximizes: after a round ends the same player may
+        move twice in a row.
+        """
+        self.nodes += 1
+        if self._deadline is not None and not self.nodes & 255 and time.perf_counter() > self._deadline:
+            raise _SearchTimeout()
         if depth == 0 or env.done:
             return self._evaluate_state(env, root_player)
-        
+
+        key = env.state_hash()
+        entry = self._table.get(key)
+        table_move = None
+        if entry is not None:
+            entry_depth, value, bound, table_move = entry
+            if entry_depth >= depth:
+                if bound == _EXACT:
+                    return value
+                if bound == _LOWER:
+                    alpha = max(alpha, value)
+                else:
+                    beta = min(beta, value)
+                if alpha >= beta:
+                    return value
+
         valid_actions = env.get_valid_actions()
         if not valid_actions:
              return self._evaluate_state(env, root_player)
+        if depth > 1 or self.beam_width:
+            valid_actions = self._order_moves(env, valid_actions, table_move)
+            if self.beam_width:
+                del valid_actions[self.beam_width:]
+        elif table_move in valid_actions:
+            valid_actions.remove(table_move)
+            valid_actions.insert(0, table_move)
 
-        if maximizing_player:
-            max_eval = float("-inf")
-            for action in valid_actions:
-                next_env = env.clone()
-                next_env.step(action)
-                eval_val = self._minmax(next_env, depth - 1, alpha, beta, False, root_player)
-                max_eval = max(max_eval, eval_val)
+        alpha_start, beta_start = alpha, beta
+        maximizing_player = env.current_player == root_player
+        best_val = float("-inf") if maximizing_player else float("inf")
+        best_action = None
+        for i, action in enumerate(valid_actions):
+            env.push(action)
+            eval_val = self._search_child(env, depth - 1, alpha, beta, root_player, maximizing_player, i == 0)
+            env.pop()
+            if maximizing_player:
+                if eval_val > best_val:
+                    best_val, best_action = eval_val, action
                 alpha = max(alpha, eval_val)
-                if beta <= alpha:
-                    break
-            return max_eval
-        else:
-            min_eval = float("inf")
-            for action in valid_actions:
-                next_env = env.clone()
-                next_env.step(action)
-                eval_val = self._minmax(next_env, depth - 1, alpha, beta, True, root_player)
-                min_eval = min(min_eval, eval_val)
+            else:
+                if eval_val < best_val:
+                    best_val, best_action = eval_val, action
                 beta = min(beta, eval_val)
-                if beta <= alpha:
-                    break
-            return min_eval
+            if beta <= alpha:
+                break
+
+        if best_val <= alpha_start:
+            bound = _UPPER
+        elif best_val >= beta_start:
+            bound = _LOWER
+        else:
+            bound = _EXACT
+        self._table[key] = (depth, best_val, bound, best_action)
+        return best_val
+
+    def _search_child(self, env, depth, alpha, beta, root_player, maximizing_player, first):
+        """
+        Principal variation search: the first (best ordered) move gets the full
+        window, the others a null window that only proves them no better, and
+        are searched again in full when they are (evaluations are integers).
+        """
+        if first or beta - alpha <= 1:
+            return self._minmax(env, depth, alpha, beta, root_player)
+        if maximizing_player:
+            value = self._minmax(env, depth, alpha, alpha + 1, root_player)
+            if alpha < value < beta:
+                value = self._minmax(env, depth, value, beta, root_player)
+        else:
+            value = self._minmax(env, depth, beta - 1, beta, root_player)
+            if alpha < value < beta:
+                value = self._minmax(env, depth, alpha, value, root_player)
+        return value
+
+    def _order_moves(self, env, actions, first):
+        """
+        Moves sorted by static_move_delta, `first` (e.g. the best move found
+        before for this position) ahead of all.
+        """
+        ordered = sorted(actions, key=lambda action: -static_move_delta(env, action))
+        if first in actions:
+            ordered.remove(first)
+            ordered.insert(0, first)
+        return ordered
 
     # ==========================
     # MCTS Implementation
@@ -163,7 +248,7 @@ class HeuristicMinMaxMCTSPlayer:
             
             # 3. Simulation (Rollout)
             # Value for the player at this node (Negamax convention)
-            val = self._mcts_rollout(node.env.clone(), node.env.current_player)
+            val = self._mcts_rollout(node.env, node.env.current_player)
             
             # 4. Backpropagation
             node.backpropagate(val)
@@ -194,11 +279,13 @@ class HeuristicMinMaxMCTSPlayer:
         """
         Run a simulation until depth limit or game end.
         Returns value from perspective of root_player.
+        The env is left unchanged (moves are undone with pop()).
         """
         # We use a short rollout depth or just heuristic eval?
         # Full rollout until end is expensive. 
         # Let's do a limited depth rollout + heuristic eval at end.
         rollout_depth = 5
+        played = 0
         
         for _ in range(rollout_depth):
             if env.done:
@@ -210,9 +297,13 @@ class HeuristicMinMaxMCTSPlayer:
             # Heuristic is better but slower. Random is fast.
             # Let's use Random for diversity + Heuristic Eval at end.
             action = random.choice(valid_actions)
-            env.step(action)
+            env.push(action)
+            played += 1
             
-        return self._evaluate_state(env, perspective_player)
+        value = self._evaluate_state(env, perspective_player)
+        for _ in range(played):
+            env.pop()
+        return value
 
     def _evaluate_state(self, env, perspective_player=None):
         """
@@ -231,33 +322,11 @@ class HeuristicMinMaxMCTSPlayer:
         
         scores = env.get_final_scores()
         
-        # Heuristic bonuses
-        bonuses = [0, 0]
-        for i in range(2):
-            wall = env.players[i]['wall']
-            # Columns (7pts) - Adjusted to 7 in official rules but code said 5/2?
-            # Creating consistent bonus calc
-            for col in range(5):
-                 col_tiles = (wall[:, col] != -1).sum()
-                 if col_tiles == 4: bonuses[i] += 5 # Almost complete
-                 elif col_tiles == 3: bonuses[i] += 2
-                 elif col_tiles == 5: bonuses[i] += 7 # Complete
-                 
-            # Colors (10pts)
-            flat_wall = wall.flatten()
-            flat_wall = flat_wall[flat_wall != -1]
-            counts = np.bincount(flat_wall, minlength=5)
-            for c in counts:
-                 if c == 4: bonuses[i] += 6
-                 elif c == 3: bonuses[i] += 2
-                 elif c == 5: bonuses[i] += 10
-                 
-            # Rows (2pts) - Usually handled in score but good for heuristic to encourage completion
-            for r in range(5):
-                 row = wall[r]
-                 filled = (row != -1).sum()
-                 if filled == 4: bonuses[i] += 3
-                 if filled == 5: bonuses[i] += 2 # Algorithm already scores this, but extra weight helps
+        # Heuristic bonuses (columns, colors and rows close to completion)
+        bonuses = [
+            lines_value(env.wall_masks[i], ROW_HEURISTIC, COL_HEURISTIC, COLOR_HEURISTIC)
+            for i in range(2)
+        ]
         
         eval_p0 = scores[0] + bonuses[0]
         eval_p1 = scores[1] + bonuses[1]
@@ -286,7 +355,7 @@ class MCTSNode:
         valid_actions = self.env.get_valid_actions()
         for action in valid_actions:
             next_env = self.env.clone()
-            next_env.step(action)
+            next_env.fast_step(action)
             self.children[action] = MCTSNode(next_env, parent=self, action=action)
             
     def select_child(self):
@@ -6,11 +6,12 @@ import copy
 from azul.rules import (
     validate_origin,
     place_on_pattern_line,
-    transfer_to_wall,
     calculate_floor_penalization,
     calculate_final_bonus,
+    wall_to_mask,
     Color
 )
+from azul.scoring import place_tile, line_counts, COLS_SHIFT, COLORS_SHIFT
 
 class HeuristicPlayer:
     def __init__(self):
@@ -60,7 +61,7 @@ class HeuristicPlayer:
         """
         Simulates the action and returns:
         - immediate_score_delta: Points gained/lost this turn (including penalties)
-        - next_wall: The state of the wall after the move (for strategic checks)
+        - next_wall: The wall mask after the move (for strategic checks)
         - next_floor: The state of the floor after the move
         """
         factory, color, row = decode_action(flat_action)
@@ -69,7 +70,7 @@ class HeuristicPlayer:
         
         # Clone state to simulate
         pattern_lines = [np.array(pl) for pl in p_obs["pattern_lines"]]
-        wall = np.array(p_obs["wall"])
+        wall = wall_to_mask(p_obs["wall"])
         floor_line = np.array(p_obs["floor_line"])
         
         # 1. Determine tiles taken
@@ -103,16 +104,7 @@ class HeuristicPlayer:
             # Check if line is full
             if -1 not in new_line:
                 # Simulate moving to wall
-                # Note: rules.transfer_to_wall modifies wall in place and returns points
-                points = transfer_to_wall(wall.tolist(), new_line.tolist(), row)
-                 # Update numpy wall from list
-                # Actually transfer_to_wall modifies the list passed to it. 
-                # Our `wall` is numpy, so we need to be careful.
-                # Let's use a temp list wall.
-                temp_wall_list = wall.tolist()
-                points = transfer_to_wall(temp_wall_list, new_line.tolist(), row)
-                wall = np.array(temp_wall_list)
-                
+                wall, points = place_tile(wall, row, color)
                 speculative_points += points
                 pattern_lines[row][:] = -1 # Clear line (simplification for next state view)
 
@@ -158,15 +150,16 @@ class HeuristicPlayer:
              # We need to know which column this color corresponds to in this row
              # Standard Azul board: diagonal shift.
              col = (color + row) % 5
+             counts = line_counts(wall)
              # Count tiles in this column
-             col_tiles = (wall[:, col] != -1).sum()
+             col_tiles = counts >> (COLS_SHIFT + 3 * col) & 7
              if col_tiles == 4:
                  bonus += 5 # Massive bonus for completing a column (or being close)
              elif col_tiles == 3:
                  bonus += 2
              
              # 3. Encourage filling colors (10 points end game)
-             color_tiles = (wall == color).sum()
+             color_tiles = counts >> (COLORS_SHIFT + 3 * color) & 7
              if color_tiles == 4:
                  bonus += 6
              elif color_tiles == 3:
@@ -214,21 +207,13 @@ def is_row_fillable(row):
 
 def get_valid_actions_from_obs(obs):
     C = 5  # number of colors
-    N = len(obs["factories"])  # number of factories
-    valid_actions = []
     current_player = obs["current_player"]
-    wall = obs["players"][current_player]["wall"]
-
-    for source_idx in range(N + 1):
-        source = obs["factories"][source_idx] if source_idx < N else obs["center"]
-        for color in range(C):
-            if source[color] == 0:
-                continue
-            for dest in range(6):
-                if dest < 5:
-                    wall_row = wall[dest]
-                    if color in wall_row:
-                        continue
-                index = source_idx * (C * 6) + color * 6 + dest
-                valid_actions.append(index)
-    return torch.tensor(valid_actions)
+    wall = np.asarray(obs["players"][current_player]["wall"])
+    sources = np.vstack([obs["factories"], obs["center"]])  # factories then center
+
+    # dests[color, dest]: pattern line rows whose wall row already has the color are
+    # closed, the floor (dest 5) takes everything
+    dests = np.ones((C, 6), dtype=bool)
+    dests[:, :5] = ~(wall[:, :, None] == np.arange(C)).any(axis=1).T
+    mask = (sources[:, :, None] > 0) & dests
+    return torch.from_numpy(np.flatnonzero(mask.reshape(-1)))
@@ -4,196 +4,462 @@ import math
 import random
 import numpy as np
 import time
+from collections import OrderedDict
 from typing import Optional, Tuple, Dict, Any
 from azul.env import AzulEnv
+from azul.encoding import observation_size
+
+
+class TranspositionTable:
+    """
+    Bounded map from AzulEnv.state_hash() to search node ids, evicting the least
+    recently used entry when full. Evicted nodes stay in the tree, they just
+    stop being shared with new parents.
+    """
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._nodes = OrderedDict()
+        self.hits = 0
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def get(self, key: int):
+        node = self._nodes.get(key)
+        if node is not None:
+            self._nodes.move_to_end(key)
+            self.hits += 1
+        return node
+
+    def put(self, key: int, node):
+        self._nodes[key] = node
+        self._nodes.move_to_end(key)
+        if len(self._nodes) > self.max_size:
+            self._nodes.popitem(last=False)
+
+    def clear(self):
+        self._nodes.clear()
+        self.hits = 0
+
+
+class SearchTree:
+    """
+    Struct-of-arrays storage of the search graph.
+
+    Node arrays (indexed by node id): visits, value_sum, player to move, parent,
+    network value, chance flag and the node's slice of edges [edge_start, edge_start + edge_count)
+    (edge_count == 0 means not expanded yet).
+    Edge arrays (indexed by edge id): flat action index, prior and child node id
+    (-1 until the search first goes down that edge). The edges of a chance node
+    are its refill outcomes: edge_action holds the outcome number.
+    Buffers grow by doubling; the AzulEnv of each node is kept in `envs`.
+    """
+    NODE_FIELDS = (('visits', np.int32), ('value_sum', np.float64), ('player', np.int8),
+                   ('parent', np.int32), ('evaluation', np.float32), ('chance', np.bool_),
+                   ('edge_start', np.int32), ('edge_count', np.int32))
+    EDGE_FIELDS = (('edge_action', np.int16), ('edge_prior', np.float32), ('edge_child', np.int32))
+
+    def __init__(self, node_capacity: int = 1024, edge_capacity: int = 16384):
+        for name, dtype in self.NODE_FIELDS:
+            setattr(self, name, np.zeros(node_capacity, dtype=dtype))
+        for name, dtype in self.EDGE_FIELDS:
+            setattr(self, name, np.zeros(edge_capacity, dtype=dtype))
+        self.envs = []
+        self.num_nodes = 0
+        self.num_edges = 0
+
+    def _grow(self, fields: tuple, size: int):
+        for name, _ in fields:
+            old = getattr(self, name)
+            new = np.zeros(max(size, 2 * len(old)), dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def add_node(self, env: AzulEnv, parent: int = -1) -> int:
+        n = self.num_nodes
+        if n == len(self.visits):
+            self._grow(self.NODE_FIELDS, n + 1)
+        self.visits[n] = 0
+        self.value_sum[n] = 0.0
+        self.player[n] = env.current_player
+        self.parent[n] = parent
+        self.evaluation[n] = 0.0
+        self.chance[n] = False
+        self.edge_start[n] = 0
+        self.edge_count[n] = 0
+        self.envs.append(env)
+        self.num_nodes = n + 1
+        return n
+
+    def add_edges(self, node: int, actions: np.ndarray, priors: np.ndarray, children=-1):
+        start = self.num_edges
+        end = start + len(actions)
+        if end > len(self.edge_action):
+            self._grow(self.EDGE_FIELDS, end)
+        self.edge_action[start:end] = actions
+        self.edge_prior[start:end] = priors
+        self.edge_child[start:end] = children
+        self.edge_start[node] = start
+        self.edge_count[node] = end - start
+        self.num_edges = end
+
+    def edges(self, node: int) -> slice:
+        start = int(self.edge_start[node])
+        return slice(start, start + int(self.edge_count[node]))
+
+    def clear(self):
+        self.envs = []
+        self.num_nodes = 0
+        self.num_edges = 0
+
+    def compact(self, keep: np.ndarray) -> np.ndarray:
+        """
+        Drop every node not flagged in `keep` and pack the survivors (and their
+        edges) at the start of the buffers, in the same order. Edges to dropped
+        nodes go back to -1. Returns the old id -> new id map (-1 = dropped).
+        """
+        n = self.num_nodes
+        old_ids = np.flatnonzero(keep[:n])
+        k = len(old_ids)
+        new_id = np.full(n, -1, dtype=np.int32)
+        new_id[old_ids] = np.arange(k, dtype=np.int32)
+
+        # Edges of the surviving nodes, packed contiguously
+        starts = self.edge_start[old_ids]
+        counts = self.edge_count[old_ids]
+        new_starts = np.cumsum(counts) - counts
+        total = int(counts.sum())
+        idx = np.repeat(starts - new_starts, counts) + np.arange(total)
+        for name, _ in self.EDGE_FIELDS:
+            arr = getattr(self, name)
+            arr[:total] = arr[idx]
+        children = self.edge_child[:total]
+        children[:] = np.where(children >= 0, new_id[children], -1)
+
+        for name, _ in self.NODE_FIELDS:
+            arr = getattr(self, name)
+            arr[:k] = arr[old_ids]
+        parents = self.parent[:k]
+        parents[:] = np.where(parents >= 0, new_id[parents], -1)
+        self.edge_start[:k] = new_starts
+        self.edge_count[:k] = counts
+
+        self.envs = [self.envs[i] for i in old_ids.tolist()]
+        self.num_nodes = k
+        self.num_edges = total
+        return new_id
+
+    def nbytes(self) -> int:
+        """
+        Memory used by the node and edge buffers (the envs not included).
+        """
+        return sum(getattr(self, name).nbytes for name, _ in self.NODE_FIELDS + self.EDGE_FIELDS)
+
 
 class MCTS:
     class Node:
-        def __init__(self, env: AzulEnv, parent: Optional['MCTS.Node'], prior: float):
-            self.env = env  # Game state at this node
-            self.player = env.current_player # Store player who is about to move
-            self.parent = parent
-            self.prior = prior  # Prior probability from policy network (or uniform)
-            self.children: Dict[Tuple[int,int,int], MCTS.Node] = {}
-            self.visits = 0
-            self.value_sum = 0.0
+        """
+        Read-only view of one node of the search tree, for code that inspects the
+        tree from outside (players, evaluation scripts, tests).
+        """
+        __slots__ = ('tree', 'id')
+
+        def __init__(self, tree: SearchTree, node_id: int):
+            self.tree = tree
+            self.id = node_id
+
+        def __eq__(self, other) -> bool:
+            return isinstance(other, MCTS.Node) and other.tree is self.tree and other.id == self.id
+
+        def __hash__(self) -> int:
+            return hash((id(self.tree), self.id))
+
+        @property
+        def env(self) -> AzulEnv:
+            return self.tree.envs[self.id]  # Game state at this node
+
+        @property
+        def player(self) -> int:
+            return int(self.tree.player[self.id])  # player who is about to move
+
+        @property
+        def visits(self) -> int:
+            return int(self.tree.visits[self.id])
+
+        @property
+        def value_sum(self) -> float:
+            return float(self.tree.value_sum[self.id])
 
         @property
         def value(self) -> float:
             return self.value_sum / self.visits if self.visits > 0 else 0.0
 
-        def ucb_score(self, cpuct: float) -> float:
+        @property
+        def is_chance(self) -> bool:
+            return bool(self.tree.chance[self.id])  # round boundary, children are refill outcomes
+
+        @property
+        def parent(self) -> Optional['MCTS.Node']:
+            parent = int(self.tree.parent[self.id])
+            return MCTS.Node(self.tree, parent) if parent >= 0 else None
+
+        @property
+        def children(self) -> Dict[Tuple[int,int,int], 'MCTS.Node']:
             """
-            Upper Confidence bound for trees (PUCT).
+            Children created so far (`priors` lists every expanded action),
+            keyed by outcome number for a chance node.
             """
-            if self.parent is None:
-                return 0
-            # Exploration term
-            exploration = cpuct * self.prior * math.sqrt(self.parent.visits) / (1 + self.visits)
-            return self.value + exploration
+            t = self.tree
+            edges = t.edges(self.id)
+            actions = range(len(self.env._layout.actions)) if self.is_chance else self.env._layout.actions
+            return {actions[a]: MCTS.Node(t, c)
+                    for a, c in zip(t.edge_action[edges].tolist(), t.edge_child[edges].tolist()) if c >= 0}
 
-    def __init__(self, env: AzulEnv, model: Any, simulations: int = 100, cpuct: float = 1.0, single_player_mode: bool = True):
+        @property
+        def priors(self) -> Dict[Tuple[int,int,int], float]:
+            t = self.tree
+            edges = t.edges(self.id)
+            actions = range(len(self.env._layout.actions)) if self.is_chance else self.env._layout.actions
+            return {actions[a]: p for a, p in zip(t.edge_action[edges].tolist(), t.edge_prior[edges].tolist())}
+
+    def __init__(self, env: AzulEnv, model: Any, simulations: int = 100, cpuct: float = 1.0, single_player_mode: bool = True,
+                 transposition_size: int = 0, batch_size: int = 1, virtual_loss: float = 1.0,
+                 duplicate_leaves: str = 'reuse', max_nodes: int = 0, chance_outcomes: int = 0):
         """
         env: an AzulEnv instance to clone for rollouts.
         simulations: number of MCTS simulations per move.
         cpuct: exploration constant.
         single_player_mode: if True, backpropagates values without flipping signs (assumes general sum / cooperative environment logic or own-score concern only).
+        transposition_size: if > 0, positions reached through different move orders share
+            one node (statistics and network output), keeping at most this many entries.
+        batch_size: leaves evaluated per network call (1 = one leaf per simulation).
+        virtual_loss: value subtracted from a path while its leaf waits for evaluation.
+        duplicate_leaves: 'reuse' or 'discard', what to do when a batch selects the same leaf twice.
+        max_nodes: node budget of the tree (0 = unlimited). When it is exceeded the
+            least visited subtrees are dropped and their slots reused (see _recycle).
+        chance_outcomes: if > 0, a move that closes a round leads to a chance node
+            with that many refills of the factories, always the same ones for the
+            same position (seeded by its state hash), so every simulation through
+            the boundary shares their subtrees; the search takes the least visited
+            outcome each time. With 0 the child of such a move keeps the single
+            refill drawn when it was created.
+
+        The search draws its random choices (sampled replies, root noise) from
+        `self.random` and `self.np_random`, the global random and np.random streams
+        unless a caller replaces them with its own generators.
+
+        Children are created lazily: expansion only stores (action, prior) edges and a
+        child's env is cloned and stepped the first time the search goes down to it.
         """
-        self.root = MCTS.Node(env.clone(), parent=None, prior=1.0)
+        if duplicate_leaves not in ('reuse', 'discard'):
+            raise ValueError(f"Unknown duplicate_leaves policy: {duplicate_leaves}")
         self.model = model
         self.simulations = simulations
         self.cpuct = cpuct
         self.single_player_mode = single_player_mode
+        self.table = TranspositionTable(transposition_size) if transposition_size > 0 else None
+        self.batch_size = batch_size
+        self.virtual_loss = virtual_loss
+        self.duplicate_leaves = duplicate_leaves
+        self.max_nodes = max_nodes
+        self.chance_outcomes = chance_outcomes
+        self.random = random
+        self.np_random = np.random
+        self.tree = SearchTree()
+        self._pending = {}  # node id -> (policy logits, value) evaluated but not expanded yet
+        self._reset(env)
+
+    @property
+    def root(self) -> 'MCTS.Node':
+        return MCTS.Node(self.tree, self.root_id)
+
+    def _reset(self, env: AzulEnv):
+        # Drop the whole tree and start again from a copy of env
+        self.tree.clear()
+        self._pending.clear()
+        if self.table is not None:
+            self.table.clear()
+        self._set_root(self.tree.add_node(env.clone()))
+
+    def _set_root(self, node: int):
+        self.root_id = node
+        self.root_player = int(self.tree.player[node])
+        self.tree.parent[node] = -1
+
+    def _child(self, env: AzulEnv, parent: int) -> int:
+        """
+        Node id for the position in `env`, shared through the transposition table if enabled.
+        """
+        if self.table is None:
+            node = self.tree.add_node(env, parent)
+        else:
+            key = env.state_hash()
+            node = self.table.get(key)
+            if node is not None:
+                return node
+            node = self.tree.add_node(env, parent)
+            self.table.put(key, node)
+        if self.chance_outcomes and not env.done and env._is_round_over():
+            # Round boundary: the refill outcomes are known up front, uniformly likely
+            t = self.tree
+            t.chance[node] = True
+            t.add_edges(node, np.arange(self.chance_outcomes), np.full(self.chance_outcomes, 1.0 / self.chance_outcomes))
+        return node
+
+    def _edge_child(self, node: int, edge: int) -> int:
+        """
+        Child at the end of an edge, creating its env on first use.
+        """
+        t = self.tree
+        child = int(t.edge_child[edge])
+        if child < 0:
+            # clone environment efficiently
+            env = t.envs[node].clone()
+            if t.chance[node]:
+                # Outcome k of a round boundary: the same draw every time for this position
+                outcome = int(t.edge_action[edge])
+                env.refill_factories(np.random.default_rng((env.state_hash(), outcome)))
+            else:
+                # apply action (trusted: it comes from the action mask);
+                # with chance nodes the round end waits for an outcome to be drawn
+                env.fast_step(env._layout.actions[t.edge_action[edge]], refill=not self.chance_outcomes)
+            child = self._child(env, node)
+            t.edge_child[edge] = child
+        return child
+
+    def _chance_edge(self, node: int) -> int:
+        """
+        Outcome of a chance node to go down next: the least visited one, so the
+        outcomes are sampled in turn (the first ones on ties).
+        """
+        t = self.tree
+        edges = t.edges(node)
+        children = t.edge_child[edges]
+        visits = np.where(children >= 0, t.visits[children], 0)
+        return edges.start + int(np.argmin(visits))
+
+    def _recycle(self):
+        """
+        Bring the tree back under the node budget: keep the most visited nodes
+        (a parent has at least the visits of its children and a smaller id, so
+        they hang together around the root), drop the rest and compact the
+        buffers. Dropped children become unexplored edges again.
+        """
+        t = self.tree
+        n = t.num_nodes
+        keep = np.zeros(n, dtype=bool)
+        keep[np.lexsort((np.arange(n), -t.visits[:n]))[:max(1, self.max_nodes * 3 // 4)]] = True
+
+        # Only what is still reachable from the root survives
+        reached = np.zeros(n, dtype=bool)
+        reached[self.root_id] = True
+        stack = [self.root_id]
+        while stack:
+            children = t.edge_child[t.edges(stack.pop())]
+            children = children[children >= 0]
+            children = children[keep[children] & ~reached[children]]
+            reached[children] = True
+            stack.extend(children.tolist())
+
+        new_id = t.compact(reached)
+        self.root_id = int(new_id[self.root_id])
+        self._pending = {int(new_id[node]): p for node, p in self._pending.items() if new_id[node] >= 0}
+        if self.table is not None:
+            self.table._nodes = OrderedDict((key, int(new_id[node])) for key, node in self.table._nodes.items()
+                                            if new_id[node] >= 0)
 
-    def select(self) -> Tuple['MCTS.Node', list]:
+    def _predict(self, node: int, action_mask: np.ndarray) -> Tuple[np.ndarray, float]:
+        """
+        Network policy logits and value of a node (taken from a batched evaluation if there was one).
+        """
+        prediction = self._pending.pop(node, None)
+        if prediction is None:
+            obs_flat = self.tree.envs[node].encode_state()
+            pi_logits, values = self.model.predict(obs_flat[np.newaxis], action_mask[np.newaxis])
+            prediction = (pi_logits[0], float(values[0]))
+        return prediction
+
+    def _best_edge(self, node: int) -> int:
+        """
+        PUCT over all the children of a node at once; returns the edge id.
+        """
+        t = self.tree
+        edges = t.edges(node)
+        children = t.edge_child[edges]
+        created = children >= 0  # children not created yet count as unvisited
+        visits = np.where(created, t.visits[children], 0)
+        q = np.where(created, t.value_sum[children], 0.0) / np.maximum(visits, 1)
+        # Exploration term
+        u = q + self.cpuct * t.edge_prior[edges] * math.sqrt(t.visits[node]) / (1 + visits)
+        return edges.start + int(np.argmax(u))
+
+    def select(self) -> Tuple[int, list]:
         """
         Select a leaf node to expand.
-        Returns the leaf node and the path of nodes taken.
+        Returns the leaf node id and the path of node ids taken.
         """
-        node = self.root
+        t = self.tree
+        node = self.root_id
         path = [node]
         # Traverse until we find a leaf
-        # Traverse until we find a leaf
-        while node.children:
+        while t.edge_count[node]:
+            if t.chance[node]:
+                # Round boundary: next refill outcome
+                edge = self._chance_edge(node)
             # Check if Single Player Mode AND Opponent Turn
-            if self.single_player_mode and node.player != self.root.player:
+            elif self.single_player_mode and t.player[node] != self.root_player:
                 # Opponent Node -> Treated as Random Environment Transition
-                # Do NOT use UCB. Pick randomly based on priors (or uniform if no priors/visits)
-                # We simply follow the visit distribution if available, or uniform if not?
-                # Actually, environment nodes should just be sampled.
-                # Let's pick a random child.
-                # Since we don't store "Environment Children" differently, we just pick from keys.
-                action = random.choice(list(node.children.keys()))
-                node = node.children[action]
+                # Do NOT use UCB: environment nodes are just sampled, pick a random child.
+                edge = int(t.edge_start[node]) + self.random.randrange(int(t.edge_count[node]))
             else:
                 # Standard UCB (Agent Turn or Standard MCTS)
-                action, node = max(node.children.items(),
-                                   key=lambda item: item[1].ucb_score(self.cpuct))
+                edge = self._best_edge(node)
+            node = self._edge_child(node, edge)
             path.append(node)
         return node, path
 
-
-
-    def expand(self, node: 'MCTS.Node') -> float:
+    def expand(self, node: int) -> float:
         """
-        Expand the given leaf node by creating all children.
+        Expand the given leaf node by adding an edge per legal action
+        (children are created when the search first goes down to them).
         Use policy network with action mask to get priors.
         Returns the value of the node from the network perspective.
         """
+        t = self.tree
         # --- SINGLE PLAYER MODE: OPPONENT SKIP LOGIC ---
-        if self.single_player_mode and node.player != self.root.player:
+        if self.single_player_mode and t.player[node] != self.root_player:
              # We are expanding an Opponent Node (Environment Node).
-             # We do NOT generally want to evaluate this node with the network 
+             # We do NOT generally want to evaluate this node with the network
              # because the network predicts 'Opponent Score' (Value relative to current player).
              # We want 'Agent Score'.
              # Strategy:
-             # 1. Generate all children (Environment transitions).
+             # 1. Add the edges (Environment transitions).
              # 2. Pick ONE random child to simulate "Reaction".
-             # 3. Recursively expand THAT child (Agent Node).
+             # 3. Create and recursively expand THAT child (Agent Node).
              # 4. Return the value from that Agent Node.
-             # Note: This means we only add ONE path deep from an opponent leaf. 
-             # Future visits might expand siblings? No, `expand` is only called once per leaf.
-             # So we must create all children but only evaluate one?
-             # Yes.
-             
-             # 1. Generate children (Uniform priors for environment)
-            valid_actions = node.env.get_valid_actions()
-            if not valid_actions:
+             # Note: This means we only add ONE path deep from an opponent leaf.
+            random_child = self._opponent_reply(node)
+            if random_child is None:
                 return 0.0 # Terminal? Should be caught in run()
 
-            uniform_prior = 1.0 / len(valid_actions)
-            for action in valid_actions:
-                 new_env = node.env.clone()
-                 new_env.step(action, is_sim=True)
-                 node.children[action] = MCTS.Node(new_env, parent=node, prior=uniform_prior)
-            
-            # 2. Pick Child based on Opponent Model (Smart Opponent)
-            # We want to simulate a realistic opponent, not a random one.
-            # So we query the model for the opponent's policy.
-            
-            # Predict policy for opponent
-            obs = node.env._get_obs()
-            obs_flat = node.env.encode_observation(obs)
-            action_mask = np.zeros(node.env.action_size, dtype=np.float32)
-            for action in valid_actions:
-                idx = node.env.action_to_index(action)
-                action_mask[idx] = 1.0
-                
-            pi_logits, _ = self.model.predict(np.array([obs_flat]), np.array([action_mask]))
-            logits = pi_logits[0]
-            
-            # Compute probabilities
-            exp_logits = np.exp(logits - np.max(logits))
-            total = exp_logits.sum()
-            if total > 0:
-                priors = exp_logits / total
-            else:
-                priors = action_mask / action_mask.sum()
-                
-            # Filter for valid actions
-            valid_probs = []
-            for action in valid_actions:
-                idx = node.env.action_to_index(action)
-                valid_probs.append(priors[idx])
-                
-            valid_probs = np.array(valid_probs)
-            total_valid = valid_probs.sum()
-            if total_valid > 0:
-                valid_probs /= total_valid
-            else:
-                valid_probs = np.ones(len(valid_actions)) / len(valid_actions)
-                
-            # Sample action
-            try:
-                # Assuming valid_probs sums to 1 (renormalized)
-                chosen_idx = np.random.choice(len(valid_actions), p=valid_probs)
-                chosen_action = valid_actions[chosen_idx]
-            except ValueError:
-                chosen_action = random.choice(valid_actions)
-
-            random_child = node.children[chosen_action]
-            
             # 3. Recurse (Expand the Agent Node)
-            # Check if terminal
-            obs = random_child.env._get_obs()
-            done = random_child.env.done # env.step updates done
-            # Check implicit done (wall complete)
-            if not done: 
-                 done = any(all(cell != -1 for cell in row) for p in random_child.env.players for row in p['wall'])
-            
-            if done:
-                # Terminal state reached after opponent move
-                scores = random_child.env.get_final_scores()
-                # Value = Normalized Agent Score
-                agent_idx = self.root.player
-                agent_score = scores[agent_idx]
-                return np.clip(agent_score / 100.0, -1.0, 1.0)
-            else:
-                return self.expand(random_child) 
+            return self._reply_value(random_child)
 
         # --- STANDARD AGENT EXPANSION ---
-        obs = node.env._get_obs()
-        # generate valid actions
-        valid_actions = node.env.get_valid_actions()
-        if not valid_actions:
+        if t.edge_count[node]:
+            # Already expanded (shared node or duplicate leaf of a batch)
+            return float(t.evaluation[node])
+        # generate valid actions (1 for legal, 0 for illegal)
+        action_mask = t.envs[node].get_action_mask()
+        valid_idx = np.flatnonzero(action_mask)
+        if not valid_idx.size:
             # No valid actions. This should be handled by 'done' check in run(),
             # but as a safety net, we return 0 value (neutral)
             return 0.0
-        
-        # Compute policy logits from the network with action mask
-        obs_flat = node.env.encode_observation(obs)
-        
-        # Create action mask (1 for legal, 0 for illegal)
-        action_mask = np.zeros(node.env.action_size, dtype=np.float32)
-        for action in valid_actions:
-            idx = node.env.action_to_index(action)
-            action_mask[idx] = 1.0
-        
+
         # Pass mask to model - Single inference for Policy AND Value
-        pi_logits, values = self.model.predict(np.array([obs_flat]), np.array([action_mask]))
-        logits = pi_logits[0]
-        value = float(values[0])
-        
+        logits, value = self._predict(node, action_mask)
+
         # Compute priors with softmax (logits are already masked by network)
         exp_logits = np.exp(logits - np.max(logits))
         total = exp_logits.sum()
@@ -202,136 +468,266 @@ class MCTS:
         else:
             # Fallback to uniform over valid actions
             priors = action_mask / action_mask.sum()
-        
+
         # Extract priors for valid actions and renormalize
-        valid_priors = []
-        for action in valid_actions:
-            idx = node.env.action_to_index(action)
-            valid_priors.append(priors[idx])
-            
-        valid_priors = np.array(valid_priors)
+        valid_priors = priors[valid_idx]
         total_valid_prior = valid_priors.sum()
-        
+
         if total_valid_prior > 0:
             valid_priors /= total_valid_prior
         else:
             # Fallback if network predicts 0 prob for all valid moves
-            valid_priors = np.ones(len(valid_actions)) / len(valid_actions)
-        
-        for i, action in enumerate(valid_actions):
-            # clone environment efficiently
-            new_env = node.env.clone()
-            # apply action
-            new_env.step(action, is_sim=True)
-            node.children[action] = MCTS.Node(new_env, parent=node, prior=valid_priors[i])
-            
+            valid_priors = np.ones(len(valid_idx)) / len(valid_idx)
+
+        t.add_edges(node, valid_idx, valid_priors)
+        t.evaluation[node] = value
         return value
 
+    def _opponent_reply(self, node: int) -> Optional[int]:
+        """
+        Single player mode: expand an opponent node and create the child of the
+        reply picked by the opponent model. Returns None if there is no legal action.
+        """
+        t = self.tree
+        # 1. Add edges (Uniform priors for environment)
+        action_mask = t.envs[node].get_action_mask()
+        valid_idx = np.flatnonzero(action_mask)
+        if not valid_idx.size:
+            return None # Terminal? Should be caught in run()
+        if not t.edge_count[node]:
+            t.add_edges(node, valid_idx, np.full(len(valid_idx), 1.0 / len(valid_idx)))
+
+        # 2. Pick Child based on Opponent Model (Smart Opponent)
+        # We want to simulate a realistic opponent, not a random one.
+        # So we query the model for the opponent's policy.
+
+        # Predict policy for opponent
+        logits, _ = self._predict(node, action_mask)
+
+        # Compute probabilities
+        exp_logits = np.exp(logits - np.max(logits))
+        total = exp_logits.sum()
+        if total > 0:
+            priors = exp_logits / total
+        else:
+            priors = action_mask / action_mask.sum()
+
+        # Filter for valid actions
+        valid_probs = priors[valid_idx]
+        total_valid = valid_probs.sum()
+        if total_valid > 0:
+            valid_probs /= total_valid
+        else:
+            valid_probs = np.ones(len(valid_idx)) / len(valid_idx)
+
+        # Sample action
+        try:
+            # Assuming valid_probs sums to 1 (renormalized)
+            chosen_idx = self.np_random.choice(len(valid_idx), p=valid_probs)
+        except ValueError:
+            chosen_idx = self.random.randrange(len(valid_idx))
+
+        # Edges follow the valid action order
+        return self._edge_child(node, int(t.edge_start[node]) + int(chosen_idx))
+
+    def _reply_value(self, random_child: int) -> float:
+        """
+        Single player mode: value for the agent of the position after the opponent reply.
+        """
+        t = self.tree
+        if t.chance[random_child]:
+            # The reply closed the round: continue from one of the refills
+            return self._reply_value(self._edge_child(random_child, self._chance_edge(random_child)))
+        if self._is_terminal(random_child):
+            # Terminal state reached after opponent move
+            scores = t.envs[random_child].get_final_scores()
+            # Value = Normalized Agent Score
+            agent_score = scores[self.root_player]
+            return np.clip(agent_score / 100.0, -1.0, 1.0)
+        elif t.edge_count[random_child]:
+            # Shared node already expanded through another path (or a duplicate
+            # leaf of a batch): reply children are never backed up into, so
+            # without visits their network value is all there is
+            visits = t.visits[random_child]
+            return float(t.value_sum[random_child] / visits) if visits > 0 else float(t.evaluation[random_child])
+        else:
+            return self.expand(random_child)
+
     def backpropagate(self, path: list, value: float):
         """
         Propagate the simulation result back up the tree.
+        `value` is from the perspective of the player at the END of the path (leaf player).
         """
-        # value is from the perspective of the player at the leaf node (who just moved or terminal state)
-        # We need to propagate this up.
-        
-        # The value passed in is usually from the perspective of the player whose turn it is at the leaf state
-        # OR if terminal, it's the game result.
-        
-        # Let's standardize: 'value' is always from the perspective of the player at the END of the path (leaf.player).
-        
-        leaf_player = path[-1].player
-        
-        for node in reversed(path):
-            node.visits += 1
+        t = self.tree
+        nodes = np.array(path)
+        t.visits[nodes] += 1
+        if self.single_player_mode:
+            # Single Player / Optimization Mode:
+            # We assume 'value' is the absolute score/utility for the Agent (root player).
+            # All nodes maximize this value: we do NOT flip signs.
+            t.value_sum[nodes] += value
+        else:
+            # Standard Zero-Sum Mode:
             # If the node's player is the same as the leaf player, they want to MAXIMIZE this value.
             # If different, they want to MINIMIZE it (so we add negative value).
-            if self.single_player_mode:
-                # Single Player / Optimization Mode:
-                # We assume 'value' is the absolute score/utility for the Agent (root player).
-                # All nodes maximize this value (or we are optimistic/cooperative).
-                # We do NOT flip signs.
-                node.value_sum += value
-            else:
-                # Standard Zero-Sum Mode:
-                # If the node's player is the same as the leaf player, they want to MAXIMIZE this value.
-                # If different, they want to MINIMIZE it (so we add negative value).
-                if node.player == leaf_player:
-                    node.value_sum += value
-                else:
-                    node.value_sum -= value
+            t.value_sum[nodes] += np.where(t.player[nodes] == t.player[path[-1]], value, -value)
+
+    def _is_terminal(self, node: int) -> bool:
+        env = self.tree.envs[node]
+        return env.done or env.has_full_wall_row()
+
+    def _terminal_value(self, leaf: int) -> float:
+        """
+        Exact game value of a terminal leaf, in the convention of backpropagate().
+        """
+        scores = self.tree.envs[leaf].get_final_scores()
+        p0_score, p1_score = scores[0], scores[1]
+
+        if self.single_player_mode:
+            # Single Player / Optimization Mode:
+            # Value is the normalized score of the Agent (root player)
+            # regardless of who the leaf player is: backpropagate never flips
+            # signs in this mode, so we just pass the Agent's Score as 'value'.
+            agent_score = scores[self.root_player]
+            return np.clip(agent_score / 100.0, -1.0, 1.0)
+        # Standard Zero-Sum Logic:
+        leaf_player = self.tree.player[leaf]
+        if p0_score > p1_score:
+            return 1.0 if leaf_player == 0 else -1.0
+        elif p1_score > p0_score:
+            return 1.0 if leaf_player == 1 else -1.0
+        return 0.0
 
     def run(self, root_env: Optional[AzulEnv] = None):
         """
         Perform MCTS simulations starting from the root.
+        With batch_size > 1 the leaves are evaluated in batches (see _run_batched).
         """
         if root_env is not None:
-            self.root = MCTS.Node(root_env.clone(), parent=None, prior=1.0)
-        
-        # print(f"[DEBUG] MCTS Run: simulations={self.simulations}")
+            self._reset(root_env)
+
+        if self.batch_size > 1:
+            self._run_batched()
+            return
+
         for sim in range(self.simulations):
+            if self.max_nodes and self.tree.num_nodes > self.max_nodes:
+                self._recycle()
             leaf, path = self.select()
-            # Check if terminal state
-            obs = leaf.env._get_obs()
-            done = leaf.env.done or any(all(cell != -1 for cell in row) for p in leaf.env.players for row in p['wall'])
-            
-            if not done:
+            if not self._is_terminal(leaf):
                 # Non-terminal: expand and evaluate with network simultaneously
                 value = self.expand(leaf)
-                
-                # Network returns value for current player (leaf.player)
+
+                # Network returns value for current player (leaf player)
                 self.backpropagate(path, value)
             else:
                 # Terminal: compute exact game value
-                scores = leaf.env.get_final_scores()
-                p0_score, p1_score = scores[0], scores[1]
-                
-                # Check for max_rounds termination
-                termination_reason = getattr(leaf.env, 'termination_reason', 'normal_end')
-                
-                if self.single_player_mode:
-                     # Single Player / Optimization Mode:
-                     # Value is the normalized score of the Agent (root.player)
-                     # regardless of who the 'leaf.player' is (backpropagate will handle perspective)
-                     # Wait, backpropagate assumes 'value' is for 'leaf.player'?
-                     # Let's check backpropagate: 
-                     # "if node.player == leaf_player: node.value_sum += value"
-                     # So if we pass AgentScore, and leaf_player is Agent, it adds.
-                     # If leaf_player is Opponent, it subtracts? NO.
-                     # In single_player_mode backpropagate: "node.value_sum += value" (ALWAYS ADDS)
-                     # So we just need to pass the Agent's Score as 'value'.
-                     agent_idx = self.root.player
-                     agent_score = scores[agent_idx]
-                     value = np.clip(agent_score / 100.0, -1.0, 1.0)
+                self.backpropagate(path, self._terminal_value(leaf))
+
+    def _apply_virtual_loss(self, path: list, sign: int):
+        # sign=+1 marks the path as being evaluated (looks visited and losing), -1 undoes it
+        t = self.tree
+        nodes = np.array(path)
+        t.visits[nodes] += sign
+        t.value_sum[nodes] -= sign * self.virtual_loss
+
+    def _run_batched(self):
+        """
+        Simulations in batches of up to batch_size leaves: each selected path gets
+        a virtual loss so the next selections spread over other leaves, then every
+        pending position is encoded into one matrix and evaluated with a single
+        model.predict() call before expanding and backpropagating all of them.
+
+        Terminal leaves are backed up right away with their exact value. A leaf
+        selected twice in the same batch is handled by duplicate_leaves:
+        'reuse' backs up its (single) evaluation once per path, 'discard' closes
+        the batch there.
+        """
+        t = self.tree
+        done = 0
+        if not t.edge_count[self.root_id] and not self._is_terminal(self.root_id) and self.simulations > 0:
+            # A fresh root would fill the whole first batch with duplicates of itself
+            self.backpropagate([self.root_id], self.expand(self.root_id))
+            done = 1
+        while done < self.simulations:
+            if self.max_nodes and t.num_nodes > self.max_nodes:
+                # Between batches no path holds a virtual loss
+                self._recycle()
+            pending = []  # (leaf, path)
+            seen = set()
+            while len(pending) < self.batch_size and done + len(pending) < self.simulations:
+                leaf, path = self.select()
+                if self._is_terminal(leaf):
+                    self.backpropagate(path, self._terminal_value(leaf))
+                    done += 1
+                    continue
+                if leaf in seen and self.duplicate_leaves == 'discard':
+                    break
+                seen.add(leaf)
+                self._apply_virtual_loss(path, 1)
+                pending.append((leaf, path))
+            if not pending:
+                continue
+
+            # 1. One network call for every leaf
+            self._predict_batch([leaf for leaf, _ in pending])
+
+            # 2. Single player mode: opponent leaves need the model reply, then the
+            # agent position after it (a second batch)
+            replies = {}
+            if self.single_player_mode:
+                for leaf, _ in pending:
+                    if t.player[leaf] != self.root_player and leaf not in replies:
+                        replies[leaf] = self._opponent_reply(leaf)
+                self._predict_batch([child for child in replies.values()
+                                     if child is not None and not t.edge_count[child] and not self._is_terminal(child)])
+
+            # 3. Expand (predictions are waiting in _pending) and backpropagate
+            for leaf, path in pending:
+                self._apply_virtual_loss(path, -1)
+                if leaf in replies:
+                    child = replies[leaf]
+                    value = 0.0 if child is None else self._reply_value(child)
                 else:
-                    # Standard Zero-Sum Logic:
-                    if p0_score > p1_score:
-                        value = (1.0 if leaf.player == 0 else -1.0)
-                    elif p1_score > p0_score:
-                        value = (1.0 if leaf.player == 1 else -1.0)
-                    else:
-                        value = 0.0
-                
+                    value = self.expand(leaf)
                 self.backpropagate(path, value)
-        
+            done += len(pending)
+
+    def _predict_batch(self, nodes: list):
+        """
+        Evaluate the unexpanded nodes of the list with one model.predict() call.
+        """
+        t = self.tree
+        todo = [node for node in dict.fromkeys(nodes) if node not in self._pending and not t.edge_count[node]]
+        if not todo:
+            return
+        first = t.envs[todo[0]]
+        obs = np.empty((len(todo), observation_size(first._layout)), dtype=np.float32)
+        masks = np.empty((len(todo), first.action_size), dtype=np.float32)
+        for i, node in enumerate(todo):
+            t.envs[node].encode_state(out=obs[i])
+            masks[i] = t.envs[node].get_action_mask()
+        pi_logits, values = self.model.predict(obs, masks)
+        values = np.asarray(values).reshape(-1)
+        for i, node in enumerate(todo):
+            self._pending[node] = (pi_logits[i], float(values[i]))
 
     def add_root_noise(self, alpha: float = 0.3, epsilon: float = 0.25):
         """
         Add Dirichlet noise to the root node's priors to encourage exploration.
         P(s, a) = (1 - epsilon) * P(s, a) + epsilon * Dirichlet(alpha)
         """
-        if not self.root.children:
-            self.expand(self.root)
-            
-        children = self.root.children
-        if not children:
+        t = self.tree
+        if not t.edge_count[self.root_id]:
+            self.expand(self.root_id)
+
+        edges = t.edges(self.root_id)
+        count = edges.stop - edges.start
+        if not count:
             return
-            
-        actions = list(children.keys())
-        noise = np.random.dirichlet([alpha] * len(actions))
-        
-        for i, action in enumerate(actions):
-            node = children[action]
-            node.prior = (1 - epsilon) * node.prior + epsilon * noise[i]
+
+        noise = self.np_random.dirichlet([alpha] * count)
+        t.edge_prior[edges] = (1 - epsilon) * t.edge_prior[edges] + epsilon * noise
 
     def select_action(self, temperature: float = 1.0) -> Tuple[int, int, int]:
         """
@@ -339,24 +735,39 @@ class MCTS:
         - If temperature == 0: Greedy selection (max visits).
         - If temperature > 0: Sample proportional to visits^(1/temp).
         """
-        if not self.root.children:
+        t = self.tree
+        if not t.edge_count[self.root_id]:
             self.run()
-            
-        valid_actions = self.root.env.get_valid_actions()
+
+        valid_actions = t.envs[self.root_id].get_valid_actions()
+        edges = t.edges(self.root_id)
+        actions = t.envs[self.root_id]._layout.actions
         # Filter children that are valid actions (should be all, but safety check)
-        candidates = [(a, n) for a, n in self.root.children.items() if a in valid_actions]
-        
+        children = t.edge_child[edges]
+        visits = np.where(children >= 0, t.visits[children], 0)
+        candidates = [(actions[a], n) for a, n in zip(t.edge_action[edges].tolist(), visits.tolist())
+                      if actions[a] in valid_actions]
+
         if not candidates:
-            return random.choice(valid_actions)
-            
+            return self.random.choice(valid_actions)
+
+        return self.pick_by_visits(candidates, temperature)
+
+    @staticmethod
+    def pick_by_visits(candidates: list, temperature: float = 1.0) -> Tuple[int, int, int]:
+        """
+        Pick an action from (action, visit count) pairs, greedily if temperature == 0,
+        otherwise proportionally to visits^(1/temp). Shared by select_action and the
+        root-parallel search, which merges the counts of several trees.
+        """
         if temperature == 0:
             # Greedy selection
-            action, node = max(candidates, key=lambda item: item[1].visits)
+            action, _ = max(candidates, key=lambda item: item[1])
             return action
         else:
             # Stochastic selection
-            visits = np.array([n.visits for a, n in candidates], dtype=np.float64)
-            
+            visits = np.array([n for a, n in candidates], dtype=np.float64)
+
             # Raise to temperature power
             # Avoid overflow if temp is small (though here we expect temp=1.0)
             try:
@@ -366,23 +777,23 @@ class MCTS:
                 max_idx = np.argmax(visits)
                 visits = np.zeros_like(visits)
                 visits[max_idx] = 1.0
-            
+
             # Check for infinities
             if np.isinf(visits).any():
                 visits = np.where(np.isinf(visits), 1.0, 0.0)
-            
+
             visit_sum = visits.sum()
-            
+
             if visit_sum <= 0:
                 # Fallback to uniform if no visits (should not happen if sims > 0)
                 probs = np.ones_like(visits) / len(visits)
             else:
                 probs = visits / visit_sum
-            
+
             # Clip and re-normalize to ensure strict sum to 1.0 for np.random.choice
             probs = np.clip(probs, 1e-10, 1.0)
             probs /= probs.sum()
-            
+
             # Sample index
             try:
                 idx = np.random.choice(len(candidates), p=probs)
@@ -390,49 +801,49 @@ class MCTS:
                 # Last resort fallback
                 print(f"[MCTS] Warning: Probability error in select_action: {e}. Probs: {probs}", flush=True)
                 idx = np.argmax(probs)
-                
+
             return candidates[idx][0]
 
     def advance(self, action: Tuple[int, int, int], env: AzulEnv):
         """
         Advance the root to the child corresponding to the action taken.
         Reuses the subtree if the action was explored.
-        
+
         Args:
             action: The action that was taken (source_idx, color, dest)
             env: The new environment state after the action
         """
-        if action in self.root.children:
+        t = self.tree
+        edges = t.edges(self.root_id)
+        hits = np.flatnonzero(t.edge_action[edges] == env.action_to_index(action))
+        new_root = int(t.edge_child[edges.start + hits[0]]) if hits.size else -1
+        if new_root >= 0 and t.chance[new_root]:
+            # The real refill is not one of the sampled outcomes
+            new_root = -1
+        if new_root >= 0:
             # Reuse subtree: promote the child node to new root
-            new_root = self.root.children[action]
-            
-            # Detach from parent (critical for garbage collection of old tree)
-            new_root.parent = None
-            
+
             # CRITICAL: Update the root's env to match the actual game state
-            # The child's env was created during expand() with is_sim=True
+            # The child's env was created during expand() by simulation
             # We need to replace it with the real env to keep them synchronized
-            new_root.env = env.clone()
-            
-            # NEW: Validate that the cached children are still legal in the new environment.
+            t.envs[new_root] = env.clone()
+
+            # Validate that the cached children are still legal in the new environment.
             # This is necessary because stochastic events (like factory refill) might have happened differently
             # in the real game vs the simulation, rendering previously valid actions illegal.
-            real_valid_actions = set(env.get_valid_actions())
-            cached_actions = set(new_root.children.keys())
-            
-            if not cached_actions.issubset(real_valid_actions):
+            real_valid = env.get_action_mask()
+            cached = t.edge_action[t.edges(new_root)]
+
+            if not real_valid[cached].all():
                 # Stale tree detected (diverged environment). Reset this node to trigger re-expansion.
-                new_root.children = {}
-                new_root.visits = 0
-                new_root.value_sum = 0
-                new_root.prior = 1.0 # Reset prior? Or keep? Resetting is safer.
-            
-            # Set as new root
-            self.root = new_root
-            
-            # The subtree is preserved with all visit counts, values, and children!
+                t.edge_count[new_root] = 0
+                t.visits[new_root] = 0
+                t.value_sum[new_root] = 0
+
+            # Set as new root: the subtree is preserved with all visit counts, values, and children!
+            self._set_root(new_root)
         else:
-            # Fallback: action not in tree (shouldn't happen normally)
-            # This could occur if select_action() returned a fallback random action
+            # Fallback: action not in tree (never explored, or a fallback random
+            # action returned by select_action())
             # Create fresh root from the new state
-            self.root = MCTS.Node(env.clone(), parent=None, prior=1.0)
\ No newline at end of file
+            self._reset(env)
@@ -4,8 +4,10 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import numpy as np
+import threading
 
 from azul.env import AzulEnv
+from azul.vector_env import VectorAzulEnv
 from mcts.mcts import MCTS
 import copy
 
@@ -158,6 +160,7 @@ class AzulNet(nn.Module):
         Predict interface for MCTS:
         - obs_batch: numpy array of shape (batch, total_flat_size)
           Layout: [Spatial (C*5*5) | Factories ((N+1)*5) | Global (Rest)]
+          float32 input (as produced by the encoders) is used without a conversion copy
         - action_mask: optional numpy array of shape (batch, action_size) - binary mask (1=legal, 0=illegal)
         """
         self.eval()
@@ -192,12 +195,135 @@ class AzulNet(nn.Module):
         with torch.no_grad():
             pi_logits, values = self.forward(x_spatial, x_global, x_factories, action_mask_tensor)
         return pi_logits.cpu().numpy(), values.cpu().numpy()
+
+    def session(self) -> 'InferenceSession':
+        """
+        Inference-only front end for searches (see InferenceSession).
+        """
+        return InferenceSession(self)
+
+
+class InferenceSession:
+    """
+    predict() for a network that is only used for inference, e.g. by MCTS.
+    Unlike AzulNet.predict it puts the model in eval mode and looks up its
+    device once, runs under inference_mode and does not copy float32 input:
+    on CPU the numpy buffers are used in place (the three parts are views of
+    the observation rows) and the outputs are returned as views of the result
+    tensors. On another device the input goes through staging tensors kept
+    per batch size and per thread, so searches running in several threads
+    (games, pondering, an InferenceServer) can share one session.
+    """
+    MAX_STAGED_SIZES = 8
+
+    def __init__(self, net: AzulNet):
+        net.eval()
+        self.net = net
+        self.device = next(net.parameters()).device
+        self.on_cpu = self.device.type == 'cpu'
+        self.spatial_size = net.in_channels * 5 * 5
+        self.factories_end = self.spatial_size + (net.factories_count + 1) * 5
+        self._local = threading.local()  # .staging: (kind, shape) -> device tensor, for the calling thread
+
+    def predict(self, obs_batch: np.ndarray, action_mask: np.ndarray = None):
+        """
+        Same layout and outputs as AzulNet.predict.
+        """
+        batch = obs_batch.shape[0]
+        net = self.net
+        obs = self._tensor('obs', obs_batch)
+        x_spatial = obs[:, :self.spatial_size].view(batch, net.in_channels, 5, 5)
+        x_factories = obs[:, self.spatial_size:self.factories_end].view(batch, net.factories_count + 1, 5)
+        x_global = obs[:, self.factories_end:]
+        mask = None if action_mask is None else self._tensor('mask', action_mask)
+        return self._run(x_spatial, x_global, x_factories, mask)
+
+    def predict_split(self, spatial: np.ndarray, global_: np.ndarray, factories: np.ndarray,
+                      action_mask: np.ndarray = None):
+        """
+        Same as predict() with the observation already split into float32
+        arrays of shapes (B, in_channels, 5, 5), (B, global_size) and (B, N+1, 5).
+        """
+        mask = None if action_mask is None else self._tensor('mask', action_mask)
+        return self._run(self._tensor('spatial', spatial), self._tensor('global', global_),
+                         self._tensor('factories', factories), mask)
+
+    def _run(self, x_spatial, x_global, x_factories, mask):
+        with torch.inference_mode():
+            pi_logits, values = self.net(x_spatial, x_global, x_factories, mask)
+        if self.on_cpu:
+            return pi_logits.numpy(), values.numpy()
+        return pi_logits.cpu().numpy(), values.cpu().numpy()
+
+    def _tensor(self, kind: str, array: np.ndarray) -> torch.Tensor:
+        if array.dtype != np.float32:
+            array = array.astype(np.float32)
+        tensor = torch.from_numpy(array)
+        if self.on_cpu:
+            return tensor
+        staging = getattr(self._local, 'staging', None)
+        if staging is None:
+            staging = self._local.staging = {}
+        key = (kind, array.shape)
+        staged = staging.get(key)
+        if staged is None:
+            staged = torch.empty(array.shape, dtype=torch.float32, device=self.device)
+            if len(staging) < self.MAX_STAGED_SIZES * 4:
+                staging[key] = staged
+        return staged.copy_(tensor, non_blocking=True)
+
+
+def load_azul_net(model_path: str, device='cpu', env: AzulEnv = None) -> AzulNet:
+    """
+    Build an AzulNet from a training checkpoint, in eval mode on `device`.
+    `env` (a default AzulEnv if None) gives the observation and action sizes.
+    """
+    device = torch.device(device)
+    # Load checkpoint and extract model state
+    checkpoint = torch.load(model_path, map_location=device)
+    state_dict = checkpoint.get('model_state', checkpoint)
+
+    # Infer network dimensions from checkpoint
+    in_channels = state_dict['conv_in.weight'].shape[1]
+
+    # For Phase 2 architecture:
+    # policy_fc1.weight has shape [256, spatial_flat + factories_flat + global_size]
+    # value_fc1.weight has shape [256, spatial_flat + factories_flat + global_size]
+    # spatial_flat = 2 * 5 * 5 = 50 (policy conv outputs 2 channels)
+    # spatial_flat = 1 * 5 * 5 = 25 (value conv outputs 1 channel)
+    # factories_flat = (N + 1) * embed_dim, where N=5, we need to infer embed_dim
+
+    # For now, use a simpler approach: use an env to get correct sizes
+    if env is None:
+        env = AzulEnv()
+        env.reset(initial=True)
+    total_obs_size = env.encode_state().shape[0]
+    # Updated for 20-channel input
+    spatial_size = in_channels * 5 * 5
+    factories_size = (env.N + 1) * 5
+    global_size = total_obs_size - spatial_size - factories_size
+
+    # Build and load network
+    net = AzulNet(
+        in_channels=in_channels,
+        global_size=global_size,
+        action_size=env.action_size,
+        factories_count=env.N
+    )
+    net.load_state_dict(state_dict)
+    net.to(device)
+    net.eval()
+    return net
+
     
 def evaluate_against_previous(current_model, previous_model, env_args, simulations, cpuct, n_games):
     """
     Play n_games between current_model (player 0) and previous_model (player 1).
     Returns wins_current, wins_previous.
+    With simulations <= 0 the raw policies are compared, all games at once.
     """
+    if simulations <= 0:
+        return evaluate_policies_batched(current_model, previous_model, env_args, n_games)
     wins_current = 0
     wins_prev    = 0
     for _ in range(n_games):
@@ -225,4 +351,42 @@ def evaluate_against_previous(current_model, previous_model, env_args, simulatio
             wins_current += 1
         elif 1 in env.get_winner():
             wins_prev += 1
-    return wins_current, wins_prev
\ No newline at end of file
+    return wins_current, wins_prev
+
+
+def evaluate_policies_batched(current_model, previous_model, env_args, n_games):
+    """
+    Play n_games between the raw policies (argmax of the masked logits, no MCTS)
+    of current_model (player 0) and previous_model (other players) in lockstep
+    on a VectorAzulEnv: one predict call per model and move for all games.
+    Returns wins_current, wins_previous.
+    """
+    vec = VectorAzulEnv(
+        n_games,
+        num_players=env_args.get('num_players', 2),
+        factories_count=env_args.get('factories_count', 5),
+        seed=env_args.get('seed'),
+    )
+    final_scores = np.zeros((n_games, vec.num_players), dtype=np.int64)
+    finished = np.zeros(n_games, dtype=bool)
+    obs = vec.encode_observation()
+    while not finished.all():
+        mask = vec.valid_action_mask()
+        # Games already over get any legal action (they are autoreset and ignored)
+        actions = mask.argmax(axis=1)
+        to_move = vec.current_player == 0
+        for model, players in ((current_model, to_move), (previous_model, ~to_move)):
+            idx = np.flatnonzero(players & ~finished)
+            if idx.size:
+                pi_logits, _ = model.predict(obs[idx], mask[idx])
+                actions[idx] = pi_logits.argmax(axis=1)
+        obs, _, terminations, _, infos = vec.step(actions)
+        ended = terminations & ~finished
+        final_scores[ended] = infos['scores'][ended]
+        finished |= terminations
+
+    winners = final_scores == final_scores.max(axis=1, keepdims=True)
+    wins_current = int(winners[:, 0].sum())
+    wins_prev = int((~winners[:, 0] & winners[:, 1]).sum())
+    print(f"[azul-net] Batched policy games: {wins_current} - {wins_prev} ({n_games} games)")
+    return wins_current, wins_prev
@@ -0,0 +1,190 @@
+# src/net/export.py
+"""
+CPU inference artifact for AzulNet: BatchNorm folded into the convolutions,
+optional dynamic int8 quantization of the Linear layers, saved as TorchScript.
+
+    python -m net.export models/best.pt models/best.ts [--int8]
+
+(run from the zero/ directory). DeepMCTSPlayer loads a `.ts` model path with
+load_inference_model() in place of the training checkpoint.
+"""
+
+import argparse
+import copy
+import json
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from azul.env import AzulEnv
+from net.azul_net import AzulNet, load_azul_net
+
+CONFIG_FILE = 'config.json'
+# Linear layers quantized by --int8. The factory Transformer keeps float
+# weights: its fused attention path needs plain Linear modules.
+QUANTIZED_LAYERS = {'factory_embedding', 'fusion_fc1', 'fusion_fc2', 'policy_fc1', 'policy_fc', 'value_fc1', 'value_fc2'}
+
+
+def fuse_conv_bn(conv: nn.Conv2d, bn: nn.BatchNorm2d) -> nn.Conv2d:
+    """
+    Conv2d computing conv followed by bn (in eval mode) in one go.
+    """
+    fused = copy.deepcopy(conv)
+    scale = bn.weight / torch.sqrt(bn.running_var + bn.eps)
+    bias = conv.bias if conv.bias is not None else torch.zeros_like(bn.running_mean)
+    with torch.no_grad():
+        fused.weight.copy_(conv.weight * scale.reshape(-1, 1, 1, 1))
+        fused.bias = nn.Parameter((bias - bn.running_mean) * scale + bn.bias)
+    return fused
+
+
+def fold_batchnorm(net: AzulNet) -> AzulNet:
+    """
+    Copy of the network with every BatchNorm folded into the convolution
+    before it (the BatchNorm layers become identities).
+    """
+    net = copy.deepcopy(net).eval()
+    pairs = [(net, 'conv_in', 'bn_in'), (net, 'policy_conv', 'policy_bn'), (net, 'value_conv', 'value_bn')]
+    for block in net.res_blocks:
+        pairs += [(block, 'conv1', 'bn1'), (block, 'conv2', 'bn2')]
+    for module, conv, bn in pairs:
+        setattr(module, conv, fuse_conv_bn(getattr(module, conv), getattr(module, bn)))
+        setattr(module, bn, nn.Identity())
+    return net
+
+
+def export_inference_model(net: AzulNet, path: str, quantize: bool = False):
+    """
+    Fold the BatchNorms, optionally quantize the Linear layers (QUANTIZED_LAYERS)
+    to int8 with dynamic quantization and save a traced TorchScript module to `path`.
+    """
+    model = fold_batchnorm(net).cpu()
+    if quantize:
+        model = torch.ao.quantization.quantize_dynamic(model, QUANTIZED_LAYERS, dtype=torch.qint8)
+    batch = 4
+    example = (torch.zeros(batch, net.in_channels, 5, 5),
+               torch.zeros(batch, net.global_size),
+               torch.zeros(batch, net.factories_count + 1, 5),
+               torch.ones(batch, net.action_size))
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example, check_trace=False)
+    config = {
+        'in_channels': net.in_channels,
+        'global_size': net.global_size,
+        'action_size': net.action_size,
+        'factories_count': net.factories_count,
+        'quantized': quantize,
+    }
+    torch.jit.save(traced, path, _extra_files={CONFIG_FILE: json.dumps(config)})
+
+
+class InferenceModel:
+    """
+    Exported AzulNet with the same predict() interface (no training).
+    """
+    def __init__(self, module, config: dict, device='cpu'):
+        self.module = module
+        self.device = torch.device(device)
+        self.in_channels = config['in_channels']
+        self.global_size = config['global_size']
+        self.action_size = config['action_size']
+        self.factories_count = config['factories_count']
+        self.quantized = config['quantized']
+
+    def eval(self):
+        return self
+
+    def predict(self, obs_batch: np.ndarray, action_mask: np.ndarray = None):
+        """
+        Same layout and outputs as AzulNet.predict.
+        """
+        batch = obs_batch.shape[0]
+        spatial_size = self.in_channels * 5 * 5
+        factories_end = spatial_size + (self.factories_count + 1) * 5
+        obs = torch.from_numpy(obs_batch).float().to(self.device)
+        x_spatial = obs[:, :spatial_size].reshape(batch, self.in_channels, 5, 5)
+        x_factories = obs[:, spatial_size:factories_end].reshape(batch, self.factories_count + 1, 5)
+        x_global = obs[:, factories_end:]
+        if action_mask is None:
+            # The traced module always masks: all ones leaves the logits as they are
+            mask = torch.ones(batch, self.action_size, device=self.device)
+        else:
+            mask = torch.from_numpy(action_mask).float().to(self.device)
+        with torch.inference_mode():
+            pi_logits, values = self.module(x_spatial, x_global, x_factories, mask)
+        return pi_logits.cpu().numpy(), values.cpu().numpy()
+
+
+def load_inference_model(path: str, device='cpu') -> InferenceModel:
+    extra = {CONFIG_FILE: ''}
+    module = torch.jit.load(path, map_location=device, _extra_files=extra)
+    module.eval()
+    return InferenceModel(module, json.loads(extra[CONFIG_FILE]), device)
+
+
+def sample_positions(count: int, seed: int = 0):
+    """
+    Observations and action masks of positions from random games.
+    """
+    rng = np.random.default_rng(seed)
+    env = AzulEnv(seed=seed)
+    obs, masks = [], []
+    while len(obs) < count:
+        if env.done:
+            env.reset()
+        obs.append(env.encode_state())
+        mask = env.get_action_mask()
+        masks.append(mask)
+        env.step(env.index_to_action(int(rng.choice(np.flatnonzero(mask)))))
+    return np.stack(obs).astype(np.float32), np.stack(masks).astype(np.float32)
+
+
+def compare(net: AzulNet, exported: InferenceModel, batch_sizes=(1, 8, 32, 128), positions: int = 512,
+            repeats: int = 20) -> dict:
+    """
+    Latency of the float network and of the exported model per batch size,
+    and how well the exported outputs agree with the float ones.
+    """
+    obs, masks = sample_positions(max(positions, max(batch_sizes)))
+    report = {'latency_ms': {}}
+    for size in batch_sizes:
+        row = {}
+        for name, model in (('float', net), ('exported', exported)):
+            model.predict(obs[:size], masks[:size])  # warm up
+            start = time.perf_counter()
+            for _ in range(repeats):
+                model.predict(obs[:size], masks[:size])
+            row[name] = 1000.0 * (time.perf_counter() - start) / repeats
+        report['latency_ms'][size] = row
+
+    logits, values = net.predict(obs[:positions], masks[:positions])
+    logits_x, values_x = exported.predict(obs[:positions], masks[:positions])
+    legal = masks[:positions] > 0
+    report['policy_top1_agreement'] = float(np.mean(logits.argmax(axis=1) == logits_x.argmax(axis=1)))
+    report['max_legal_logit_error'] = float(np.abs(logits - logits_x)[legal].max())
+    report['value_mae'] = float(np.mean(np.abs(values - values_x)))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export AzulNet as a CPU inference artifact")
+    parser.add_argument('checkpoint', help="training checkpoint (e.g. models/best.pt)")
+    parser.add_argument('output', help="TorchScript artifact to write (e.g. models/best.ts)")
+    parser.add_argument('--int8', action='store_true', help="dynamic int8 quantization of the Linear layers")
+    args = parser.parse_args()
+
+    net = load_azul_net(args.checkpoint, 'cpu')
+    export_inference_model(net, args.output, quantize=args.int8)
+    report = compare(net, load_inference_model(args.output))
+    print(f"[export] wrote {args.output}")
+    print("[export] batch   float ms   exported ms   speedup")
+    for size, row in report['latency_ms'].items():
+        print(f"[export] {size:5d} {row['float']:10.3f} {row['exported']:13.3f} {row['float'] / row['exported']:9.2f}x")
+    print(f"[export] policy top-1 agreement {100 * report['policy_top1_agreement']:.1f}%, "
+          f"max legal logit error {report['max_legal_logit_error']:.4f}, value MAE {report['value_mae']:.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+# src/net/inference_server.py
+
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+
+class _Request:
+    __slots__ = ('obs', 'mask', 'queued', 'done', 'result', 'error')
+
+    def __init__(self, obs: np.ndarray, mask: np.ndarray):
+        self.obs = obs
+        self.mask = mask
+        self.queued = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class InferenceServer:
+    """
+    Batches the network calls of concurrent searches (e.g. the AI turns of
+    several games running in their own threads) into single forward passes.
+
+    It has the model interface, predict(obs_batch, action_mask), so it can be
+    handed to MCTS in place of the network. A background thread takes the
+    queued requests and runs them together once max_batch_size rows are
+    collected, every registered client is waiting, or max_wait seconds have
+    passed since the first one.
+
+    Searches register with `with server.client():` while they run, so a lone
+    search calls the model directly instead of waiting for requests that will
+    not come. Either way the model runs one call at a time.
+    """
+    def __init__(self, model, max_batch_size: int = 64, max_wait: float = 0.002):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._model_lock = threading.Lock()  # held by every model.predict call
+        self._clients = 0
+        self._thread = None
+        # Statistics
+        self.requests = 0
+        self.batches = 0
+        self.rows = 0
+        self.largest_batch = 0
+        self._latency_sum = 0.0
+        self.max_latency = 0.0
+
+    @contextmanager
+    def client(self):
+        with self._lock:
+            self._clients += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._clients -= 1
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._serve, name='azul-inference', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """
+        Serve what is queued and stop the background thread.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def predict(self, obs_batch: np.ndarray, action_mask: np.ndarray = None):
+        """
+        Same as AzulNet.predict, blocks until the batch holding this request is run.
+        """
+        request = _Request(obs_batch, action_mask)
+        with self._lock:
+            direct = self._clients <= 1
+        if direct:
+            # Nobody to share a batch with: skip the hand-off to the serving thread
+            # (waiting for a batch still running there, e.g. of a search that just ended)
+            with self._model_lock:
+                result = self.model.predict(obs_batch, action_mask)
+            self._record([request], len(obs_batch))
+            return result
+        if self._thread is None:
+            self.start()
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def stats(self) -> dict:
+        return {
+            'queue_depth': self._queue.qsize(),
+            'clients': self._clients,
+            'requests': self.requests,
+            'batches': self.batches,
+            'mean_batch_size': self.rows / self.batches if self.batches else 0.0,
+            'largest_batch': self.largest_batch,
+            'mean_latency_ms': 1000.0 * self._latency_sum / self.requests if self.requests else 0.0,
+            'max_latency_ms': 1000.0 * self.max_latency,
+        }
+
+    def _serve(self):
+        stopping = False
+        while not stopping:
+            request = self._queue.get()
+            if request is None:
+                break
+            batch = [request]
+            rows = len(request.obs)
+            deadline = request.queued + self.max_wait
+            while rows < self.max_batch_size and len(batch) < self._clients:
+                try:
+                    request = self._queue.get(timeout=max(deadline - time.perf_counter(), 0.0))
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                batch.append(request)
+                rows += len(request.obs)
+            self._run(batch, rows)
+
+    def _run(self, batch: list, rows: int):
+        obs = batch[0].obs if len(batch) == 1 else np.concatenate([r.obs for r in batch])
+        if all(r.mask is None for r in batch):
+            masks = None
+        elif len(batch) == 1:
+            masks = batch[0].mask
+        else:
+            # An unmasked request is the same as one with every action legal
+            width = next(r.mask for r in batch if r.mask is not None).shape[1]
+            masks = np.concatenate([r.mask if r.mask is not None else np.ones((len(r.obs), width), dtype=np.float32)
+                                    for r in batch])
+        try:
+            with self._model_lock:
+                logits, values = self.model.predict(obs, masks)
+        except Exception as e:
+            for r in batch:
+                r.error = e
+                r.done.set()
+            return
+
+        self._record(batch, rows)
+        start = 0
+        for r in batch:
+            end = start + len(r.obs)
+            r.result = (logits[start:end], values[start:end])
+            start = end
+            r.done.set()
+
+    def _record(self, batch: list, rows: int):
+        now = time.perf_counter()
+        with self._lock:
+            for r in batch:
+                latency = now - r.queued
+                self._latency_sum += latency
+                self.max_latency = max(self.max_latency, latency)
+            self.requests += len(batch)
+            self.batches += 1
+            self.rows += rows
+            self.largest_batch = max(self.largest_batch, rows)
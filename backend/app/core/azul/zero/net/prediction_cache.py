@@ -0,0 +1,124 @@
+# src/net/prediction_cache.py
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class PredictionCache:
+    """
+    Bounded LRU store of network outputs (policy logits, value) by position.
+
+    Keys are digests of the encoded observation (and action mask), so the
+    same position reached through another path, in another search or by
+    another player with the same weights is only evaluated once. The size is
+    limited in entries and/or bytes (0 = no limit on that measure).
+    """
+    def __init__(self, max_entries: int = 100000, max_bytes: int = 0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (logits, value)
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(obs: np.ndarray, mask: np.ndarray = None) -> bytes:
+        digest = hashlib.blake2b(obs.tobytes(), digest_size=16)
+        if mask is not None:
+            digest.update(mask.tobytes())
+        return digest.digest()
+
+    def get(self, key: bytes):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: bytes, logits: np.ndarray, value):
+        entry = (logits, value)
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = entry
+            self.nbytes += logits.nbytes + len(key)
+            while self._entries and ((self.max_entries and len(self._entries) > self.max_entries)
+                                     or (self.max_bytes and self.nbytes > self.max_bytes)):
+                old_key, (old_logits, _) = self._entries.popitem(last=False)
+                self.nbytes -= old_logits.nbytes + len(old_key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.nbytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+class CachedModel:
+    """
+    Model wrapper (predict(obs_batch, action_mask) interface) that answers
+    from a PredictionCache and sends only the missing rows to the model.
+    """
+    def __init__(self, model, cache: PredictionCache):
+        self.model = model
+        self.cache = cache
+
+    def predict(self, obs_batch: np.ndarray, action_mask: np.ndarray = None):
+        keys = [PredictionCache.key(obs_batch[i], None if action_mask is None else action_mask[i])
+                for i in range(len(obs_batch))]
+        entries = [self.cache.get(key) for key in keys]
+        missing = [i for i, entry in enumerate(entries) if entry is None]
+        if missing:
+            logits, values = self.model.predict(obs_batch[missing],
+                                                None if action_mask is None else action_mask[missing])
+            for row, i in enumerate(missing):
+                entries[i] = (logits[row].copy(), values[row])
+                self.cache.put(keys[i], *entries[i])
+        return np.stack([logits for logits, _ in entries]), np.array([value for _, value in entries], dtype=np.float32)
+
+
+# Caches shared by the players loaded from the same weights file
+_shared_caches = {}
+_shared_lock = threading.Lock()
+
+
+def weights_fingerprint(model_path: str) -> str:
+    """
+    Digest of a model file: players loaded from equal files can share a cache.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(model_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def shared_cache(fingerprint: str, max_entries: int = 100000, max_bytes: int = 0) -> PredictionCache:
+    """
+    The PredictionCache of the given weights, created on first use (the
+    limits of the first caller apply).
+    """
+    with _shared_lock:
+        cache = _shared_caches.get(fingerprint)
+        if cache is None:
+            cache = _shared_caches[fingerprint] = PredictionCache(max_entries, max_bytes)
+        return cache
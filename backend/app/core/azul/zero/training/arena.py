@@ -0,0 +1,285 @@
+# src/training/arena.py
+"""
+Round-robin arena for the Azul players of the zero package: seeded two-player
+matches on AzulEnv (no database or server involved) spread over a process
+pool, with per-move think time and search effort, final scores and Elo
+ratings with bootstrap confidence intervals.
+
+    python -m app.core.azul.zero.training.arena --players random,expert,minmax_d2,deep_mcts_100 --games 20
+
+(run from the backend/ directory). The summary table puts each player's
+rating next to its move latency, to pick AI levels that fit a response time.
+"""
+
+import argparse
+import importlib
+import itertools
+import json
+import math
+import multiprocessing as mp
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import torch
+
+# The players are modules of the zero package (relative imports) that also
+# import the top-level azul/mcts/net packages: make both importable.
+ZERO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.abspath(os.path.join(ZERO_DIR, '..', '..', '..', '..'))
+for path in (ZERO_DIR, BACKEND_DIR):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from azul.env import AzulEnv  # noqa: E402
+
+MODEL_PATH = os.path.join(ZERO_DIR, 'models', 'best.pt')
+
+# name -> (module of the zero package, class, constructor arguments)
+PLAYERS = {
+    'random': ('random_player', 'RandomPlayer', {}),
+    'random_plus': ('random_plus_player', 'RandomPlusPlayer', {}),
+    'expert': ('expert_player', 'ExpertPlayer', {}),
+    'lillo': ('lillo_expertillo', 'LilloExpertillo', {}),
+    'heuristic': ('heuristic_player', 'HeuristicPlayer', {}),
+    'maximilian': ('maximilian_times', 'MaximilianTimes',
+                   {'max_space': 1000, 'max_time_in_seconds': 0.5, 'num_crystals_factor': 1.0, 'ruin_factor': 1.0}),
+    'minmax_d2': ('heuristic_min_max_mcts_player', 'HeuristicMinMaxMCTSPlayer', {'strategy': 'minmax', 'depth': 2}),
+    'minmax_d4': ('heuristic_min_max_mcts_player', 'HeuristicMinMaxMCTSPlayer', {'strategy': 'minmax', 'depth': 4}),
+    'minmax_d6_beam4': ('heuristic_min_max_mcts_player', 'HeuristicMinMaxMCTSPlayer',
+                        {'strategy': 'minmax', 'depth': 6, 'beam_width': 4}),
+    'minmax_d6_beam4_solver': ('heuristic_min_max_mcts_player', 'HeuristicMinMaxMCTSPlayer',
+                               {'strategy': 'minmax', 'depth': 6, 'beam_width': 4, 'solver_tiles': 10}),
+    'mcts_50': ('heuristic_min_max_mcts_player', 'HeuristicMinMaxMCTSPlayer', {'strategy': 'mcts', 'simulations': 50}),
+    'mcts_300': ('heuristic_min_max_mcts_player', 'HeuristicMinMaxMCTSPlayer', {'strategy': 'mcts', 'simulations': 300}),
+    'deep_mcts_100': ('deep_mcts_player', 'DeepMCTSPlayer', {'model_path': MODEL_PATH, 'mcts_iters': 100}),
+    'deep_mcts_400': ('deep_mcts_player', 'DeepMCTSPlayer', {'model_path': MODEL_PATH, 'mcts_iters': 400}),
+}
+DEFAULT_PLAYERS = ['random', 'random_plus', 'expert', 'lillo', 'heuristic', 'maximilian',
+                   'minmax_d2', 'mcts_50', 'deep_mcts_100']
+
+
+def make_player(name: str):
+    module, cls, kwargs = PLAYERS[name]
+    return getattr(importlib.import_module('app.core.azul.zero.' + module), cls)(**kwargs)
+
+
+def search_effort(player):
+    """
+    Nodes or simulations spent by the last move of a player (None if it does not search).
+    """
+    mcts = getattr(player, 'mcts', None)
+    if mcts is not None:
+        return mcts.root.visits
+    return getattr(player, 'nodes', None)
+
+
+def play_match(players: list, names: list, seed: int) -> dict:
+    """
+    One game between players[0] (first to move) and players[1] from the
+    deal of `seed`. A move that raises or is illegal is replaced by a random
+    legal one and counted as a fault.
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    env = AzulEnv(num_players=2, seed=seed)
+    obs = env.reset(initial=True)
+    times = [[], []]
+    efforts = [[], []]
+    faults = [0, 0]
+    done = False
+    while not done:
+        seat = env.current_player
+        start = time.perf_counter()
+        try:
+            action = players[seat].predict(obs)
+        except Exception:
+            action = None
+        times[seat].append(time.perf_counter() - start)
+        effort = search_effort(players[seat])
+        if effort is not None:
+            efforts[seat].append(effort)
+
+        if action is not None and not isinstance(action, tuple):
+            action = env.index_to_action(int(action))
+        mask = env.get_action_mask()
+        if action is None or not mask[env.action_to_index(action)]:
+            faults[seat] += 1
+            action = env.index_to_action(int(random.choice(np.flatnonzero(mask))))
+        obs, _, done, _ = env.step(action)
+    return {
+        'players': names,
+        'seed': seed,
+        'scores': [int(score) for score in env.get_final_scores()],
+        'times': times,
+        'efforts': efforts,
+        'faults': faults,
+    }
+
+
+# Pool workers build each player once and keep it for their following games
+_worker_players = {}
+
+
+def _init_worker():
+    torch.set_num_threads(1)  # one core per worker
+
+
+def _play(names: list, seed: int) -> dict:
+    for name in names:
+        if name not in _worker_players:
+            _worker_players[name] = make_player(name)
+    return play_match([_worker_players[name] for name in names], names, seed)
+
+
+def schedule(names: list, games_per_pair: int, seed: int = 0) -> list:
+    """
+    Round-robin (seat order, seed) list: every deal is played twice with the
+    seats swapped, so no player gets the better tiles or the first move.
+    """
+    matches = []
+    for a, b in itertools.combinations(names, 2):
+        for k in range(games_per_pair):
+            deal = seed + k // 2
+            matches.append(([a, b] if k % 2 == 0 else [b, a], deal))
+    return matches
+
+
+def run_arena(names: list, games_per_pair: int = 10, workers: int = 1, seed: int = 0, verbose: bool = True) -> list:
+    """
+    Play the round-robin on `workers` processes and return the match records.
+    """
+    matches = schedule(names, games_per_pair, seed)
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context('spawn'),
+                             initializer=_init_worker) as pool:
+        futures = [pool.submit(_play, players, deal) for players, deal in matches]
+        for i, future in enumerate(futures):
+            result = future.result()
+            results.append(result)
+            if verbose:
+                (a, b), (sa, sb) = result['players'], result['scores']
+                print(f"[arena] {i + 1}/{len(matches)} {a} {sa} - {sb} {b} (seed {result['seed']})", flush=True)
+    return results
+
+
+def elo_ratings(names: list, results: list, prior_games: float = 1.0, iterations: int = 500) -> dict:
+    """
+    Maximum likelihood Bradley-Terry ratings on the Elo scale (mean 1500),
+    draws counting half a win. Each player gets prior_games draws against an
+    average opponent, so unbeaten or winless players stay finite.
+    """
+    index = {name: i for i, name in enumerate(names)}
+    n = len(names)
+    wins = np.full(n, 0.5 * prior_games)
+    games = np.zeros((n, n))
+    for result in results:
+        i, j = (index[name] for name in result['players'])
+        si, sj = result['scores']
+        wins[i] += 1.0 if si > sj else 0.5 if si == sj else 0.0
+        wins[j] += 1.0 if sj > si else 0.5 if si == sj else 0.0
+        games[i, j] += 1
+        games[j, i] += 1
+
+    # Minorization-maximization updates (Hunter, 2004), the prior as a player of strength 1
+    gamma = np.ones(n)
+    for _ in range(iterations):
+        denominator = (games / (gamma[:, None] + gamma[None, :])).sum(axis=1) + prior_games / (gamma + 1.0)
+        gamma = wins / denominator
+        gamma /= np.exp(np.mean(np.log(gamma)))
+    return {name: 1500.0 + 400.0 * math.log10(gamma[index[name]]) for name in names}
+
+
+def bootstrap_intervals(names: list, results: list, samples: int = 200, seed: int = 0) -> dict:
+    """
+    95% confidence interval of every rating, resampling the games with replacement.
+    """
+    rng = np.random.default_rng(seed)
+    draws = {name: [] for name in names}
+    for _ in range(samples):
+        picked = rng.integers(0, len(results), size=len(results))
+        for name, rating in elo_ratings(names, [results[i] for i in picked]).items():
+            draws[name].append(rating)
+    return {name: (float(np.percentile(values, 2.5)), float(np.percentile(values, 97.5)))
+            for name, values in draws.items()}
+
+
+def summarize(names: list, results: list, bootstrap: int = 200) -> list:
+    """
+    Per player rating (with its interval), results and cost per move, strongest first.
+    """
+    ratings = elo_ratings(names, results)
+    intervals = bootstrap_intervals(names, results, bootstrap) if bootstrap else {}
+    rows = []
+    for name in names:
+        times, efforts, scores, points, faults = [], [], [], 0.0, 0
+        for result in results:
+            if name not in result['players']:
+                continue
+            seat = result['players'].index(name)
+            own, other = result['scores'][seat], result['scores'][1 - seat]
+            times += result['times'][seat]
+            efforts += result['efforts'][seat]
+            scores.append(own)
+            points += 1.0 if own > other else 0.5 if own == other else 0.0
+            faults += result['faults'][seat]
+        ms = 1000.0 * np.array(times)
+        rows.append({
+            'player': name,
+            'elo': ratings[name],
+            'elo_low': intervals.get(name, (ratings[name],) * 2)[0],
+            'elo_high': intervals.get(name, (ratings[name],) * 2)[1],
+            'games': len(scores),
+            'points': points,
+            'mean_score': float(np.mean(scores)) if scores else 0.0,
+            'mean_ms': float(ms.mean()) if len(ms) else 0.0,
+            'p50_ms': float(np.percentile(ms, 50)) if len(ms) else 0.0,
+            'p95_ms': float(np.percentile(ms, 95)) if len(ms) else 0.0,
+            'max_ms': float(ms.max()) if len(ms) else 0.0,
+            'mean_effort': float(np.mean(efforts)) if efforts else None,
+            'faults': faults,
+        })
+    return sorted(rows, key=lambda row: -row['elo'])
+
+
+def format_table(rows: list) -> str:
+    lines = [f"{'player':<16}{'elo':>7}{'95% ci':>16}{'games':>7}{'points':>8}{'score':>7}"
+             f"{'ms/move':>9}{'p50':>8}{'p95':>8}{'max':>9}{'nodes/move':>12}{'faults':>8}"]
+    for row in rows:
+        effort = f"{row['mean_effort']:.0f}" if row['mean_effort'] is not None else '-'
+        lines.append(f"{row['player']:<16}{row['elo']:>7.0f}{row['elo_low']:>8.0f}..{row['elo_high']:<6.0f}"
+                     f"{row['games']:>7}{row['points']:>8.1f}{row['mean_score']:>7.1f}"
+                     f"{row['mean_ms']:>9.1f}{row['p50_ms']:>8.1f}{row['p95_ms']:>8.1f}{row['max_ms']:>9.1f}"
+                     f"{effort:>12}{row['faults']:>8}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Round-robin arena and Elo ratings of the Azul players")
+    parser.add_argument('--players', default=','.join(DEFAULT_PLAYERS),
+                        help=f"comma separated, from: {', '.join(PLAYERS)}")
+    parser.add_argument('--games', type=int, default=10, help="games per pair of players")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--bootstrap', type=int, default=200, help="resamples for the confidence intervals")
+    parser.add_argument('--output', help="write the match records and the table as JSON")
+    args = parser.parse_args()
+
+    names = args.players.split(',')
+    unknown = [name for name in names if name not in PLAYERS]
+    if unknown:
+        parser.error(f"unknown players: {', '.join(unknown)}")
+    results = run_arena(names, args.games, args.workers, args.seed)
+    rows = summarize(names, results, args.bootstrap)
+    print(format_table(rows))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'results': results, 'table': rows}, f)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+# src/training/replay_buffer.py
+"""
+On-disk replay buffer of AzulNet training examples.
+
+Examples are stored in shards: a directory per shard holding one fixed-width
+.npy file per field (obs and policy float32 rows, value float32, player
+uint8). Writers (e.g. the self-play workers) fill a shard in memory and
+publish it with a rename, so any number of them can append to the same
+buffer without locking and readers never see a partial shard. Readers
+memory-map the shards and copy only the rows of the minibatches they sample.
+"""
+
+import os
+import shutil
+import time
+
+import numpy as np
+
+FIELDS = {'obs': np.float32, 'policy': np.float32, 'value': np.float32, 'player': np.uint8}
+SHARD_PREFIX = 'shard-'
+
+
+class ReplayWriter:
+    """
+    Appends examples to the buffer at `root`, shard_size rows per shard.
+    """
+    def __init__(self, root: str, shard_size: int = 4096, name: str = None):
+        self.root = root
+        self.shard_size = shard_size
+        self.name = name or f'{os.getpid()}'
+        self._rows = {field: [] for field in FIELDS}
+        self._count = 0
+        self.shards_written = 0
+        os.makedirs(root, exist_ok=True)
+
+    def append(self, obs: np.ndarray, policy: np.ndarray, value: np.ndarray, player: np.ndarray):
+        """
+        Add a batch of examples (e.g. the positions of one game).
+        """
+        for field, rows in (('obs', obs), ('policy', policy), ('value', value), ('player', player)):
+            self._rows[field].append(np.asarray(rows, dtype=FIELDS[field]))
+        self._count += len(value)
+        while self._count >= self.shard_size:
+            self._write(self.shard_size)
+
+    def flush(self):
+        """
+        Publish the examples not written yet as a (smaller) shard.
+        """
+        if self._count:
+            self._write(self._count)
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _write(self, rows: int):
+        # Shard names sort by creation time, the order in which they age out
+        name = f'{SHARD_PREFIX}{time.time_ns():020d}-{self.name}-{self.shards_written:06d}'
+        tmp = os.path.join(self.root, '.' + name)
+        os.makedirs(tmp)
+        for field in FIELDS:
+            data = np.concatenate(self._rows[field])
+            np.save(os.path.join(tmp, field + '.npy'), data[:rows])
+            self._rows[field] = [data[rows:]]
+        os.rename(tmp, os.path.join(self.root, name))
+        self._count -= rows
+        self.shards_written += 1
+
+
+class ReplayBuffer:
+    """
+    Sampling view over the newest shards of the buffer at `root`, holding at
+    least `window` examples (0 = every shard). With prune=True the shards
+    that fall out of the window are deleted by refresh().
+    """
+    def __init__(self, root: str, window: int = 500000, prune: bool = True):
+        self.root = root
+        self.window = window
+        self.prune = prune
+        self._names = []
+        self._shards = []   # {field: memmap} per shard, oldest first
+        self._ends = np.zeros(0, dtype=np.int64)  # cumulative row counts
+        self.refresh()
+
+    def __len__(self) -> int:
+        return int(self._ends[-1]) if len(self._ends) else 0
+
+    @property
+    def num_shards(self) -> int:
+        return len(self._shards)
+
+    def refresh(self) -> int:
+        """
+        Pick up the shards published since the last call and drop the ones
+        out of the window. Returns the number of examples in the window.
+        """
+        names = sorted(name for name in os.listdir(self.root) if name.startswith(SHARD_PREFIX)) \
+            if os.path.isdir(self.root) else []
+        known = dict(zip(self._names, self._shards))
+        opened, shards = [], []
+        for name in names:
+            shard = known.get(name)
+            if shard is None:
+                try:
+                    shard = self._open(name)
+                except FileNotFoundError:
+                    continue  # pruned meanwhile by another reader
+            opened.append(name)
+            shards.append(shard)
+        names = opened
+        sizes = [len(shard['value']) for shard in shards]
+
+        # Keep the newest shards that fill the window
+        first, total = len(shards), 0
+        while first > 0 and (not self.window or total < self.window):
+            first -= 1
+            total += sizes[first]
+        if self.prune:
+            for name in names[:first]:
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+        self._names, self._shards = names[first:], shards[first:]
+        self._ends = np.cumsum(sizes[first:], dtype=np.int64)
+        return len(self)
+
+    def _open(self, name: str) -> dict:
+        path = os.path.join(self.root, name)
+        return {field: np.load(os.path.join(path, field + '.npy'), mmap_mode='r') for field in FIELDS}
+
+    def sample(self, batch_size: int, rng: np.random.Generator = None, out: dict = None) -> dict:
+        """
+        Uniform random minibatch of the examples in the window, as a dict of
+        arrays (obs, policy, value, player). Only the sampled rows are read;
+        passing the previous result as `out` reuses its arrays.
+        """
+        if not len(self):
+            raise ValueError("The replay buffer is empty")
+        rng = rng if rng is not None else np.random.default_rng()
+        rows = np.sort(rng.integers(0, len(self), size=batch_size))
+        if out is None:
+            first = self._shards[0]
+            out = {field: np.empty((batch_size,) + first[field].shape[1:], dtype=FIELDS[field]) for field in FIELDS}
+        shard_ids = np.searchsorted(self._ends, rows, side='right')
+        bounds = np.flatnonzero(np.diff(shard_ids)) + 1
+        for start, stop in zip(np.r_[0, bounds], np.r_[bounds, batch_size]):
+            shard = int(shard_ids[start])
+            local = rows[start:stop] - (self._ends[shard - 1] if shard else 0)
+            for field, data in self._shards[shard].items():
+                out[field][start:stop] = data[local]
+        return out
+
+    def batches(self, batch_size: int, count: int = None, rng: np.random.Generator = None,
+                refresh_every: int = 100):
+        """
+        Stream of minibatches for a training loop (`count` of them, or
+        endless), picking up new shards every refresh_every batches. The
+        arrays are reused from one batch to the next.
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        out = None
+        step = 0
+        while count is None or step < count:
+            if step and step % refresh_every == 0:
+                self.refresh()
+            out = self.sample(batch_size, rng, out)
+            yield out
+            step += 1
@@ -0,0 +1,317 @@
+# src/training/self_play.py
+"""
+Self-play training data for AzulNet: worker processes play full games with
+MCTS against the current network and write each finished game as a record
+file of (encoded observation, visit-count policy, outcome) rows, or appends
+them to a replay buffer (training/replay_buffer.py) with --replay.
+
+    python -m training.self_play models/best.pt data/selfplay --workers 4 --games 200
+
+(run from the zero/ directory).
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import random
+import time
+import traceback
+
+import numpy as np
+import torch
+
+from azul.env import AzulEnv
+from mcts.mcts import MCTS
+from net.azul_net import AzulNet, load_azul_net
+from net.export import load_inference_model
+from training.replay_buffer import ReplayWriter
+
+# Value targets: 'score' is the final score / 100 of the player to move, what
+# the single player mode search of DeepMCTSPlayer expects from the network;
+# 'result' is win (1) / shared win (0) / loss (-1), for the zero-sum search.
+VALUE_TARGETS = ('score', 'result')
+
+DEFAULT_SETTINGS = {
+    'num_players': 2,
+    'value_target': 'score',
+    'simulations': 200,
+    'cpuct': 1.0,
+    'batch_size': 8,
+    'max_nodes': 0,
+    'chance_outcomes': 8,         # refills searched per round boundary (0 = one random refill per move)
+    'temperature': 1.0,
+    'temperature_moves': 20,      # moves of the game played with `temperature`, greedy afterwards
+    'noise_alpha': 0.3,
+    'noise_epsilon': 0.25,
+    'resign_threshold': None,     # resign when the root value stays below this (None = never, 'result' only)
+    'resign_moves': 3,            # ... on that many consecutive own moves
+    'resign_check_fraction': 0.1,  # games played out anyway to count false resignations
+}
+
+
+def load_model(model_path: str, device='cpu'):
+    """
+    Network for the searches: a training checkpoint or an exported `.ts` model.
+    """
+    if model_path.endswith('.ts'):
+        return load_inference_model(model_path, device)
+    net = load_azul_net(model_path, device)
+    return net.session() if isinstance(net, AzulNet) else net
+
+
+def game_outcomes(scores, players: np.ndarray) -> np.ndarray:
+    """
+    Result of the game for the player to move at each position: 1 for the
+    only winner, 0 for a shared win, -1 otherwise.
+    """
+    scores = np.asarray(scores)
+    winners = np.flatnonzero(scores == scores.max())
+    values = np.full(len(scores), -1.0, dtype=np.float32)
+    values[winners] = 1.0 if len(winners) == 1 else 0.0
+    return values[players]
+
+
+def score_values(scores, players: np.ndarray) -> np.ndarray:
+    """
+    Final score / 100 (clipped to [-1, 1]) of the player to move at each position.
+    """
+    return np.clip(np.asarray(scores, dtype=np.float32) / 100.0, -1.0, 1.0)[players]
+
+
+def play_game(model, settings: dict, seed: int = None) -> dict:
+    """
+    Play one self-play game and return its rows: obs (T, obs_size), policy
+    (T, action_size) visit distributions of the root, player (T,) to move and
+    value (T,) target for that player, plus the final scores and the
+    resigning player (-1 if none).
+    The zero-sum search ('result' target) keeps its tree from move to move
+    within a round; the single player one values everything for the root
+    player, so it starts a new tree every move.
+    """
+    settings = {**DEFAULT_SETTINGS, **settings}
+    if settings['value_target'] not in VALUE_TARGETS:
+        raise ValueError(f"Unknown value target: {settings['value_target']}")
+    zero_sum = settings['value_target'] == 'result'
+    if settings['resign_threshold'] is not None and not zero_sum:
+        raise ValueError("Resignation needs the 'result' value target")
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
+    env = AzulEnv(num_players=settings['num_players'], seed=seed)
+    env.reset(initial=True)
+    search = {'simulations': settings['simulations'], 'cpuct': settings['cpuct'], 'single_player_mode': not zero_sum,
+              'batch_size': settings['batch_size'], 'max_nodes': settings['max_nodes'],
+              'chance_outcomes': settings['chance_outcomes']}
+    mcts = MCTS(env, model, **search)
+    threshold = settings['resign_threshold']
+    # Some games never resign so that false resignations can be counted
+    may_resign = threshold is not None and random.random() >= settings['resign_check_fraction']
+    low_value = [0] * env.num_players
+    would_resign = -1
+    resigned = -1
+
+    obs, policies, players = [], [], []
+    done = False
+    while not done:
+        if settings['noise_epsilon'] > 0:
+            mcts.add_root_noise(settings['noise_alpha'], settings['noise_epsilon'])
+        mcts.run()
+        t = mcts.tree
+        edges = t.edges(mcts.root_id)
+        children = t.edge_child[edges]
+        visits = np.where(children >= 0, t.visits[children], 0).astype(np.float32)
+        policy = np.zeros(env.action_size, dtype=np.float32)
+        policy[t.edge_action[edges]] = visits / max(visits.sum(), 1.0)
+        player = env.current_player
+        obs.append(env.encode_state())
+        policies.append(policy)
+        players.append(player)
+
+        if threshold is not None and resigned < 0:
+            low_value[player] = low_value[player] + 1 if mcts.root.value < threshold else 0
+            if low_value[player] >= settings['resign_moves']:
+                if not may_resign:
+                    would_resign = player if would_resign < 0 else would_resign
+                else:
+                    resigned = player
+                    break
+
+        temperature = settings['temperature'] if len(obs) <= settings['temperature_moves'] else 0.0
+        action = mcts.select_action(temperature=temperature)
+        after = env.clone()
+        done = after.fast_step(action)
+        if zero_sum and after.round_count == env.round_count:
+            mcts.advance(action, after)
+        elif not done:
+            # New root player, or the factories of the new round were drawn at random
+            mcts = MCTS(after, model, **search)
+        env = after
+
+    players = np.array(players, dtype=np.int64)
+    scores = np.array(env.get_final_scores(), dtype=np.int64)
+    if resigned >= 0:
+        values = np.where(players == resigned, -1.0, 1.0).astype(np.float32)
+    elif zero_sum:
+        values = game_outcomes(scores, players)
+    else:
+        values = score_values(scores, players)
+    return {
+        'obs': np.stack(obs).astype(np.float32),
+        'policy': np.stack(policies),
+        'player': players.astype(np.int8),
+        'value': values,
+        'scores': scores,
+        'resigned': resigned,
+        # A player that would have resigned in a checked game but did not lose
+        'false_resignation': would_resign >= 0 and game_outcomes(scores, np.array([would_resign]))[0] >= 0,
+    }
+
+
+def write_game(out_dir: str, name: str, game: dict) -> str:
+    """
+    Write a game as out_dir/name.npz. The file appears complete or not at
+    all, so readers can pick up games while the workers are still running.
+    """
+    path = os.path.join(out_dir, name + '.npz')
+    tmp = os.path.join(out_dir, '.' + name + '.tmp.npz')
+    np.savez(tmp, obs=game['obs'], policy=game['policy'], player=game['player'], value=game['value'],
+             scores=game['scores'], resigned=np.int64(game['resigned']))
+    os.replace(tmp, path)
+    return path
+
+
+def _worker(worker_id: int, model_path: str, out_dir: str, settings: dict, seed: int,
+            next_game, total_games: int, results, shard_size: int):
+    # Always end with the None sentinel, after the error if any, so the parent never waits forever
+    try:
+        torch.set_num_threads(1)  # one core per worker
+        model = load_model(model_path)
+        writer = ReplayWriter(out_dir, shard_size, name=f'{seed}-{worker_id}') if shard_size else None
+        while True:
+            with next_game.get_lock():
+                index = next_game.value
+                if index >= total_games:
+                    break
+                next_game.value += 1
+            start = time.perf_counter()
+            game = play_game(model, settings, seed=seed + index)
+            if writer is not None:
+                writer.append(game['obs'], game['policy'], game['value'], game['player'])
+            else:
+                write_game(out_dir, f'game-{seed}-{index:06d}', game)
+            results.put({
+                'worker': worker_id,
+                'game': index,
+                'positions': len(game['obs']),
+                'seconds': time.perf_counter() - start,
+                'scores': game['scores'].tolist(),
+                'resigned': game['resigned'],
+                'false_resignation': bool(game['false_resignation']),
+            })
+        if writer is not None:
+            writer.close()
+    except Exception:
+        results.put({'worker': worker_id, 'error': traceback.format_exc()})
+    finally:
+        results.put(None)
+
+
+def run_self_play(model_path: str, out_dir: str, games: int, workers: int = 1, seed: int = 0,
+                  settings: dict = None, verbose: bool = True, shard_size: int = 0) -> dict:
+    """
+    Play `games` self-play games on `workers` processes (each with its own copy
+    of the network, one thread) and write them to out_dir as they finish.
+    With shard_size > 0 out_dir is a replay buffer the workers append to in
+    shards of that many positions.
+    Returns the throughput: games per hour, positions per second, etc.
+    Raises RuntimeError with the worker's traceback if a worker fails.
+    """
+    settings = {**DEFAULT_SETTINGS, **(settings or {})}
+    os.makedirs(out_dir, exist_ok=True)
+    ctx = mp.get_context('spawn')
+    next_game = ctx.Value('i', 0)
+    results = ctx.Queue()
+    processes = [ctx.Process(target=_worker, name=f'azul-self-play-{i}', daemon=True,
+                             args=(i, model_path, out_dir, settings, seed, next_game, games, results, shard_size))
+                 for i in range(workers)]
+    start = time.perf_counter()
+    for p in processes:
+        p.start()
+
+    finished, positions, resignations, false_resignations = 0, 0, 0, 0
+    running = workers
+    while running:
+        result = results.get()
+        if result is None:
+            running -= 1
+            continue
+        if 'error' in result:
+            for p in processes:
+                p.terminate()
+            raise RuntimeError(f"Self-play worker {result['worker']} failed:\n{result['error']}")
+        finished += 1
+        positions += result['positions']
+        resignations += result['resigned'] >= 0
+        false_resignations += result['false_resignation']
+        if verbose:
+            elapsed = time.perf_counter() - start
+            print(f"[self-play] game {finished}/{games} (worker {result['worker']}): "
+                  f"{result['positions']} positions in {result['seconds']:.1f}s, scores {result['scores']} | "
+                  f"{3600.0 * finished / elapsed:.1f} games/h, {positions / elapsed:.1f} positions/s", flush=True)
+    for p in processes:
+        p.join()
+
+    elapsed = time.perf_counter() - start
+    return {
+        'games': finished,
+        'positions': positions,
+        'seconds': elapsed,
+        'games_per_hour': 3600.0 * finished / elapsed,
+        'positions_per_second': positions / elapsed,
+        'resignations': resignations,
+        'false_resignations': false_resignations,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate AzulNet training data by self-play")
+    parser.add_argument('model', help="checkpoint or exported model (e.g. models/best.pt)")
+    parser.add_argument('out_dir', help="directory receiving one .npz file per game (or the replay buffer)")
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--players', type=int, default=DEFAULT_SETTINGS['num_players'])
+    parser.add_argument('--value-target', choices=VALUE_TARGETS, default=DEFAULT_SETTINGS['value_target'])
+    parser.add_argument('--simulations', type=int, default=DEFAULT_SETTINGS['simulations'])
+    parser.add_argument('--cpuct', type=float, default=DEFAULT_SETTINGS['cpuct'])
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_SETTINGS['batch_size'])
+    parser.add_argument('--chance-outcomes', type=int, default=DEFAULT_SETTINGS['chance_outcomes'])
+    parser.add_argument('--temperature', type=float, default=DEFAULT_SETTINGS['temperature'])
+    parser.add_argument('--temperature-moves', type=int, default=DEFAULT_SETTINGS['temperature_moves'])
+    parser.add_argument('--resign-threshold', type=float, default=None)
+    parser.add_argument('--resign-moves', type=int, default=DEFAULT_SETTINGS['resign_moves'])
+    parser.add_argument('--replay', action='store_true', help="append to a replay buffer in out_dir")
+    parser.add_argument('--shard-size', type=int, default=4096, help="positions per replay buffer shard")
+    args = parser.parse_args()
+
+    settings = {
+        'num_players': args.players,
+        'value_target': args.value_target,
+        'simulations': args.simulations,
+        'cpuct': args.cpuct,
+        'batch_size': args.batch_size,
+        'chance_outcomes': args.chance_outcomes,
+        'temperature': args.temperature,
+        'temperature_moves': args.temperature_moves,
+        'resign_threshold': args.resign_threshold,
+        'resign_moves': args.resign_moves,
+    }
+    report = run_self_play(args.model, args.out_dir, args.games, args.workers, args.seed, settings,
+                           shard_size=args.shard_size if args.replay else 0)
+    print(f"[self-play] {report['games']} games, {report['positions']} positions in {report['seconds']:.1f}s: "
+          f"{report['games_per_hour']:.1f} games/h, {report['positions_per_second']:.1f} positions/s, "
+          f"{report['resignations']} resignations ({report['false_resignations']} false in checked games)")
+
+
+if __name__ == '__main__':
+    main()
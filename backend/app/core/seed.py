@@ -75,7 +75,7 @@ AI_PLAYER_CONFIG = {
     "azul": [
         {"name": "Azul Fácil (IA)", "description": "Estrategia MinMax (Profundidad 1)", "strategy": HeuristicMinMaxMctsAdapter(strategy='minmax', depth=1)},
         {"name": "Azul Medio (IA)", "description": "Estrategia MinMax (Profundidad 2)", "strategy": HeuristicMinMaxMctsAdapter(strategy='minmax', depth=2)},
-        {"name": "Azul Difícil (IA)", "description": "Estrategia MinMax (Profundidad 4)", "strategy": HeuristicMinMaxMctsAdapter(strategy='minmax', depth=4)}
+        {"name": "Azul Difícil (IA)", "description": "Estrategia MinMax (Profundidad 6, 4 mejores jugadas, final de ronda exacto)", "strategy": HeuristicMinMaxMctsAdapter(strategy='minmax', depth=6, beam_width=4, time_limit=2.0, solver_tiles=10)}
     ],
     "chess": [
          {"name": "Chess Fácil (IA)", "description": "IA Minimax (Profundidad 2)", "strategy": MinimaxChessAI(depth=2)},
@@ -3,6 +3,7 @@ from app.db.base import Base
 from enum import Enum, IntEnum
 from typing import List, Dict, Optional
 from pydantic import BaseModel, Field
+from app.core.azul.zero.azul.scoring import final_bonus, placement_points
 
 
 class AzulGame(Base):
@@ -80,61 +81,19 @@ def get_wall_column(row: int, color: Color) -> int:
     # Formula: (color + row) % 5
     return (color + row) % 5
 
+def wall_to_mask(wall: List[List[Optional[Color]]]) -> int:
+    # 25-bit occupancy mask of the wall (bit index = row * 5 + col)
+    mask = 0
+    for r in range(5):
+        for c in range(5):
+            if wall[r][c] is not None:
+                mask |= 1 << (5 * r + c)
+    return mask
+
 def calculate_scoring(wall: List[List[Optional[Color]]], row: int, col: int) -> int:
-    score = 0
-    
-    # Horizontal
-    h_score = 0
-    # Check left
-    for c in range(col - 1, -1, -1):
-        if wall[row][c] is not None:
-            h_score += 1
-        else:
-            break
-    # Check right
-    for c in range(col + 1, 5):
-        if wall[row][c] is not None:
-            h_score += 1
-        else:
-            break
-    if h_score > 0:
-        h_score += 1 # Count the placed tile itself
-    
-    # Vertical
-    v_score = 0
-    # Check up
-    for r in range(row - 1, -1, -1):
-        if wall[r][col] is not None:
-            v_score += 1
-        else:
-            break
-    # Check down
-    for r in range(row + 1, 5):
-        if wall[r][col] is not None:
-            v_score += 1
-        else:
-            break
-    if v_score > 0:
-        v_score += 1 # Count the placed tile itself
-
-    # If both horizontal and vertical formed lines, sum both. 
-    # If only one, it's just that score.
-    # If neither (isolated tile), score is 1.
-    if h_score == 0 and v_score == 0:
-        score = 1
-    else:
-        score = h_score + v_score
-        if h_score > 0 and v_score > 0:
-            # The tile is counted twice in the logic above (once for H, once for V), which is correct in Azul rules?
-            # Rules: "If there are tiles in both directions, count points for both lines (the placed tile is counted twice)."
-            # So yes, h_score + v_score is correct because both include the tile itself.
-            pass
-        elif h_score > 0:
-            score = h_score
-        else:
-            score = v_score
-            
-    return score
+    # Adjacent horizontal and vertical lines through the placed tile (it counts in both),
+    # 1 point if it is isolated. Looked up in the shared scoring tables.
+    return placement_points(wall_to_mask(wall), row, col)
 
 def move_tiles_to_wall(state: AzulGameState, jugador: JugadorAzul):
     # Floor penalty
@@ -189,26 +148,9 @@ def check_game_end(state: AzulGameState) -> bool:
     return False
 
 def final_scoring(state: AzulGameState):
+    # Horizontal lines: +2, vertical lines: +7, 5 of a color: +10
     for jugador in state.jugadores.values():
-        # Horizontal lines: +2
-        for r in range(5):
-            if all(c is not None for c in jugador.pared[r]):
-                jugador.puntos += 2
-        
-        # Vertical lines: +7
-        for c in range(5):
-            if all(jugador.pared[r][c] is not None for r in range(5)):
-                jugador.puntos += 7
-                
-        # 5 of a color: +10
-        for color in Color:
-            count = 0
-            for r in range(5):
-                for c in range(5):
-                    if jugador.pared[r][c] == color:
-                        count += 1
-            if count == 5:
-                jugador.puntos += 10
+        jugador.puntos += final_bonus(wall_to_mask(jugador.pared))
 
 def prepare_next_round(state: AzulGameState):
     state.ronda += 1
@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
 from sqlalchemy.orm import Session
 from app.db.deps import get_db
@@ -108,6 +109,10 @@ async def delete_azul_game(game_id: int, db: AsyncSession = Depends(get_db)):
     if game is None:
         raise HTTPException(status_code=404, detail="Partida Azul no encontrada")
     
+    try:
+        release_ai_trees(game.id, AzulGameState.parse_obj(game.state))
+    except Exception as e:
+        print(f"Error releasing AI trees of game {game_id}: {e}")
     await db.delete(game)
     await db.commit()
     
@@ -251,7 +256,12 @@ async def process_ai_turns(game_id: int, partida: AzulGame, state: AzulGameState
 
         from app.core.ai_base import get_ai  # Asegúrate de tener este helper
         ai = get_ai(jugador_info.name)
-        ai_move = ai.select_move(state)
+        if isinstance(ai, AIAzulDeepMCTS):
+            # Keeps its search tree between the moves of this game. Searched in a
+            # thread so AI turns of other games run meanwhile (sharing forward passes)
+            ai_move = await asyncio.to_thread(ai.select_move, state, game_id=partida.id)
+        else:
+            ai_move = ai.select_move(state)
 
         # Aplicar jugada IA
         old_round = state.ronda
@@ -287,4 +297,19 @@ async def process_ai_turns(game_id: int, partida: AzulGame, state: AzulGameState
         game_logger.log_move(game_id, ai_move.dict(), siguiente_jugador, state_before, state_after)
 
         await publish_azul_update(game_id, partida.state)
+    if state.terminado:
+        release_ai_trees(partida.id, state)
     print(f"Estado final después de todas las jugadas: {partida.state}")
+
+
+def release_ai_trees(azul_id: int, state: AzulGameState):
+    """
+    Frees the search trees the AIs of this game keep between moves.
+    """
+    for jugador in state.jugadores.values():
+        try:
+            ai = get_ai(jugador.name)
+        except KeyError:
+            continue
+        if isinstance(ai, AIAzulDeepMCTS):
+            ai.end_game(azul_id)
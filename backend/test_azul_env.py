@@ -0,0 +1,278 @@
+import sys
+import os
+import copy
+import random
+import numpy as np
+
+sys.path.append(os.getcwd())
+# azul_zero modules import each other as top-level packages (azul, mcts, net)
+sys.path.append(os.path.join(os.getcwd(), "app", "core", "azul", "zero"))
+
+from azul.env import AzulEnv
+from azul.rules import place_on_wall_mask, calculate_final_bonus_mask
+from app.models.azul.azul import Color, calculate_scoring, final_scoring, AzulGameState, JugadorAzul
+
+
+def count_tiles(env):
+    """Total tiles in the game: must always be 100 (20 per color)."""
+    obs = env._get_obs()
+    total = obs['bag'].sum() + obs['discard'].sum() + obs['factories'].sum() + obs['center'].sum()
+    for p in obs['players']:
+        total += sum(int((line != -1).sum()) for line in p['pattern_lines'])
+        total += int(((p['floor_line'] >= 0) & (p['floor_line'] < 5)).sum())
+        total += int((p['wall'] != -1).sum())
+    return total
+
+
+def play_random_game(env, rng):
+    while not env.done:
+        env.step(rng.choice(env.get_valid_actions()))
+
+
+def test_clone_is_independent():
+    print("Testing clone independence...")
+    env = AzulEnv(seed=1)
+    copy = env.clone()
+    before = env._get_obs()
+
+    play_random_game(copy, random.Random(1))
+
+    after = env._get_obs()
+    assert np.array_equal(before['factories'], after['factories']), "Clone mutated original factories"
+    assert env.get_final_scores() == [0, 0], "Clone mutated original scores"
+    assert env.wall_masks == [0, 0], "Clone mutated original walls"
+    print("Clone OK")
+
+
+def test_load_obs_round_trip():
+    print("Testing load_obs round trip...")
+    env = AzulEnv(seed=2)
+    rng = random.Random(2)
+    for _ in range(25):
+        if env.done:
+            break
+        env.step(rng.choice(env.get_valid_actions()))
+    obs = env._get_obs()
+
+    other = AzulEnv(seed=3)
+    other.load_obs(obs)
+    loaded = other._get_obs()
+
+    for key in ['bag', 'discard', 'factories', 'center']:
+        assert np.array_equal(obs[key], loaded[key]), f"{key} differs after load_obs"
+    for p, q in zip(obs['players'], loaded['players']):
+        assert p['score'] == q['score']
+        assert np.array_equal(p['wall'], q['wall'])
+        assert np.array_equal(p['floor_line'], q['floor_line'])
+        for a, b in zip(p['pattern_lines'], q['pattern_lines']):
+            assert np.array_equal(a, b)
+    assert other.get_valid_actions() == env.get_valid_actions()
+    print("load_obs OK")
+
+
+def test_tiles_are_conserved():
+    print("Testing tile conservation over full games...")
+    for seed in range(5):
+        env = AzulEnv(seed=seed)
+        rng = random.Random(seed)
+        assert count_tiles(env) == 100
+        while not env.done:
+            env.step(rng.choice(env.get_valid_actions()))
+            assert count_tiles(env) == 100, f"Tiles lost or created (seed {seed}, round {env.round_count})"
+    print("Conservation OK")
+
+
+def snapshot(env):
+    return (env._state.tobytes(), tuple(env.wall_masks), tuple(env.scores),
+            tuple(env.round_accumulated_score), env.first_player_token,
+            env.first_player_next_round, env.current_player, env.round_count, env.done)
+
+
+def test_push_pop_restores_state():
+    print("Testing push/pop...")
+    for seed in range(10):
+        env = AzulEnv(seed=seed)
+        rng = random.Random(seed)
+        while not env.done:
+            # Push a few moves (possibly across a round end) and undo them
+            history = []
+            for _ in range(rng.randint(1, 6)):
+                if env.done:
+                    break
+                history.append(snapshot(env))
+                env.push(rng.choice(env.get_valid_actions()))
+            while history:
+                env.pop()
+                assert snapshot(env) == history.pop(), f"pop did not restore state (seed {seed})"
+            env.step(rng.choice(env.get_valid_actions()))
+    print("push/pop OK")
+
+
+def test_fast_step_matches_step():
+    print("Testing fast_step...")
+    env = AzulEnv(seed=4)
+    rng = random.Random(4)
+    while not env.done:
+        action = rng.choice(env.get_valid_actions())
+        fast = env.clone()
+        # Same refill draws for both if the round ends
+        fast._np_random = copy.deepcopy(env.np_random)
+        done = fast.fast_step(action)
+        env.step(action)
+        assert done == env.done
+        assert snapshot(fast) == snapshot(env)
+    print("fast_step OK")
+
+
+def legal_actions_by_rules(env):
+    """Reference legality check straight from the observation."""
+    obs = env._get_obs()
+    player = obs['players'][env.current_player]
+    sources = list(obs['factories']) + [obs['center']]
+    actions = []
+    for source_idx, source in enumerate(sources):
+        for color in range(5):
+            if source[color] == 0:
+                continue
+            for dest in range(5):
+                line = player['pattern_lines'][dest]
+                if color in player['wall'][dest] or any(t != -1 and t != color for t in line):
+                    continue
+                actions.append((source_idx, color, dest))
+            actions.append((source_idx, color, 5))
+    return actions
+
+
+def test_action_mask_matches_rules():
+    print("Testing incremental action mask...")
+    for seed in range(10):
+        env = AzulEnv(seed=seed)
+        rng = random.Random(seed)
+        while not env.done:
+            expected = legal_actions_by_rules(env)
+            assert env.get_valid_actions() == expected, f"Valid actions differ (seed {seed})"
+            mask = env.get_action_mask()
+            assert [env.index_to_action(i) for i in np.flatnonzero(mask)] == expected
+            # Walk a few moves ahead and back so pop() is covered too
+            for _ in range(rng.randint(0, 3)):
+                if env.done:
+                    break
+                env.push(rng.choice(env.get_valid_actions()))
+                assert env.get_valid_actions() == legal_actions_by_rules(env)
+            while env._undo:
+                env.pop()
+            env.step(rng.choice(expected))
+    print("Action mask OK")
+
+
+def test_encode_state_matches_encoders():
+    print("Testing encoders...")
+    from azul.encoding import encode_envs
+    env = AzulEnv(seed=6)
+    rng = random.Random(6)
+    batch = np.zeros((2, 576), dtype=np.float32)
+    while not env.done:
+        flat = env.encode_state()
+        assert flat.dtype == np.float32 and flat.shape == (576,)
+        assert np.array_equal(flat, env.encode_observation(env._get_obs()))
+        # Writing into a row of a batch matrix
+        env.encode_state(out=batch[1])
+        assert np.array_equal(batch[1], flat)
+        assert np.array_equal(encode_envs([env.clone(), env])[1], flat)
+        env.step(rng.choice(env.get_valid_actions()))
+    print("Encoders OK")
+
+
+def test_seeded_games_are_reproducible():
+    print("Testing per-env random streams...")
+    def play(seed):
+        env = AzulEnv(seed=seed)
+        rng = random.Random(seed)
+        states = []
+        while not env.done:
+            env.step(rng.choice(env.get_valid_actions()))
+            states.append(env._state.tobytes())
+        return states
+
+    np.random.seed(0)
+    first = play(7)
+    np.random.seed(1)  # the global RNG must not matter
+    assert play(7) == first, "Seeded game is not reproducible"
+    assert play(8) != first
+
+    # Forked clones draw independent refills, shared clones advance the same stream
+    env = AzulEnv(seed=9)
+    fork_a, fork_b = env.clone(fork_rng=True), env.clone(fork_rng=True)
+    assert fork_a.np_random.integers(1 << 30) != fork_b.np_random.integers(1 << 30)
+    shared = env.clone()
+    assert shared.np_random is env.np_random
+    print("Random streams OK")
+
+
+def test_scoring_matches_server_rules():
+    print("Testing env wall scoring against the server rules...")
+    rng = random.Random(5)
+    for _ in range(2000):
+        mask = rng.getrandbits(25)
+        row, color = rng.randrange(5), rng.randrange(5)
+        col = (color + row) % 5
+        mask &= ~(1 << (5 * row + col))
+        wall = [[Color((c - r) % 5) if mask >> (5 * r + c) & 1 else None for c in range(5)] for r in range(5)]
+
+        new_mask, points = place_on_wall_mask(mask, row, color)
+        wall[row][col] = Color(color)
+        assert points == calculate_scoring(wall, row, col), f"Placement points differ for wall {mask:025b}"
+
+        player = JugadorAzul(id="1", name="Test", type="human")
+        player.pared = wall
+        final_scoring(AzulGameState(jugadores={"1": player}))
+        assert player.puntos == calculate_final_bonus_mask(new_mask)
+    print("Scoring OK")
+
+
+def test_state_hash_is_incremental():
+    print("Testing incremental state hash...")
+    for seed in range(5):
+        env = AzulEnv(seed=seed)
+        rng = random.Random(seed)
+        seen = {}
+        while not env.done:
+            h = env.state_hash()
+            assert h == env._compute_hash(), f"Stale hash (seed {seed})"
+            assert env.clone().state_hash() == h
+            # Same hash means same state
+            assert seen.setdefault(h, env._state.tobytes()) == env._state.tobytes()
+            for _ in range(rng.randint(0, 3)):
+                if env.done:
+                    break
+                env.push(rng.choice(env.get_valid_actions()))
+                assert env.state_hash() == env._compute_hash()
+            while env._undo:
+                env.pop()
+            assert env.state_hash() == h, "pop() did not restore the hash"
+            env.step(rng.choice(env.get_valid_actions()))
+
+    # Two move orders reaching the same position share the hash
+    env = AzulEnv(seed=3)
+    a, b = env.clone(), env.clone()
+    first, reply, second = (0, 0, 1), (2, 0, 5), (1, 1, 0)  # two lines of player 0, any reply
+    for action in (first, reply, second):
+        a.fast_step(action)
+    for action in (second, reply, first):
+        b.fast_step(action)
+    assert a.state_hash() == b.state_hash()
+    assert a.state_hash() != env.state_hash()
+    print("State hash OK")
+
+
+if __name__ == "__main__":
+    test_clone_is_independent()
+    test_load_obs_round_trip()
+    test_tiles_are_conserved()
+    test_push_pop_restores_state()
+    test_fast_step_matches_step()
+    test_action_mask_matches_rules()
+    test_encode_state_matches_encoders()
+    test_seeded_games_are_reproducible()
+    test_scoring_matches_server_rules()
+    test_state_hash_is_incremental()
@@ -0,0 +1,858 @@
+import sys
+import os
+import random
+import numpy as np
+
+sys.path.append(os.getcwd())
+# azul_zero modules import each other as top-level packages (azul, mcts, net)
+sys.path.append(os.path.join(os.getcwd(), "app", "core", "azul", "zero"))
+
+from azul.env import AzulEnv
+from mcts.mcts import MCTS, TranspositionTable, SearchTree
+
+
+class ConstantModel:
+    """Flat policy and the same value for every position."""
+    def __init__(self, value):
+        self.value = value
+
+    def predict(self, obs, mask):
+        return np.zeros(mask.shape, dtype=np.float32), np.full(len(obs), self.value, dtype=np.float32)
+
+
+class UniformModel:
+    """Stands in for AzulNet: flat policy and neutral value, counting evaluated states."""
+    def __init__(self):
+        self.calls = 0
+
+    def predict(self, obs, mask):
+        self.calls += len(obs)
+        return np.zeros(mask.shape, dtype=np.float32), np.zeros(len(obs), dtype=np.float32)
+
+
+def count_nodes(root):
+    seen = set()
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node in seen:
+            continue
+        seen.add(node)
+        stack.extend(node.children.values())
+    return len(seen)
+
+
+def test_transposition_table_lru():
+    print("Testing transposition table eviction...")
+    table = TranspositionTable(2)
+    table.put(1, "a")
+    table.put(2, "b")
+    assert table.get(1) == "a"  # 1 becomes the most recent
+    table.put(3, "c")
+    assert table.get(2) is None and table.get(1) == "a" and table.get(3) == "c"
+    assert len(table) == 2 and table.hits == 3
+    print("Transposition table OK")
+
+
+def test_mcts_shares_transpositions():
+    print("Testing MCTS with a transposition table...")
+    # Children are created lazily, a narrower late game position lets 300
+    # simulations go deep enough to meet transpositions
+    env = late_game_env(4)
+    random.seed(0)
+    np.random.seed(0)
+    plain = MCTS(env, UniformModel(), simulations=300, single_player_mode=False)
+    plain.run()
+    shared = MCTS(env, UniformModel(), simulations=300, single_player_mode=False, transposition_size=100000)
+    shared.run()
+
+    assert shared.table.hits > 0, "No transposition found"
+    # Some nodes are reached through several edges
+    t = shared.tree
+    assert np.count_nonzero(t.edge_child[:t.num_edges] >= 0) > t.num_nodes - 1
+    assert count_nodes(shared.root) <= count_nodes(plain.root)
+    assert shared.model.calls <= plain.model.calls
+    assert shared.root.visits == plain.root.visits == 300
+    # Every shared node holds the state its hash stands for
+    for key, node in shared.table._nodes.items():
+        assert shared.tree.envs[node].state_hash() == key
+    assert shared.select_action(temperature=0) in env.get_valid_actions()
+
+    small = MCTS(env, UniformModel(), simulations=200, single_player_mode=True, transposition_size=50)
+    small.run()
+    assert len(small.table) <= 50
+    assert small.select_action(temperature=0) in env.get_valid_actions()
+    print("MCTS transpositions OK")
+
+
+def test_shared_reply_values():
+    print("Testing opponent replies reached through transpositions...")
+    from azul.round_solver import remaining_tiles
+    # Single player mode: a reply child shared with another path, never backed
+    # up into, still counts with its network value. Before round 5 the game
+    # cannot end, so every simulation backs up exactly that value.
+    for seed in range(3):
+        env = AzulEnv(seed=seed)
+        rng = random.Random(seed)
+        while remaining_tiles(env) > 8:
+            env.step(rng.choice(env.get_valid_actions()))
+        random.seed(0)
+        np.random.seed(0)
+        mcts = MCTS(env, ConstantModel(0.5), simulations=1500, single_player_mode=True, transposition_size=100000)
+        values = []
+        backpropagate = mcts.backpropagate
+        mcts.backpropagate = lambda path, value: (values.append(value), backpropagate(path, value))
+        mcts.run()
+        assert mcts.table.hits > 0
+        assert values == [0.5] * len(values), sorted(set(values))
+    print("Shared reply values OK")
+
+
+def test_search_tree_arrays():
+    print("Testing array-backed search tree...")
+    env = AzulEnv(seed=6)
+    mcts = MCTS(env, UniformModel(), simulations=150, single_player_mode=False)
+    mcts.tree = SearchTree(node_capacity=4, edge_capacity=4)  # force the buffers to grow
+    mcts.run(env)
+    t = mcts.tree
+    assert 100 < t.num_nodes <= 150 and len(t.visits) >= t.num_nodes
+    root = mcts.root
+    assert root.visits == 150
+    assert sum(child.visits for child in root.children.values()) == 149
+    # Every legal move has an edge, children only exist once visited
+    assert sorted(root.priors) == sorted(env.get_valid_actions())
+    assert set(root.children) <= set(root.priors)
+    assert abs(sum(root.priors.values()) - 1.0) < 1e-5
+    for action, child in root.children.items():
+        assert child.parent == root
+        expected = env.clone()
+        expected.fast_step(action)
+        assert np.array_equal(child.env._state, expected._state)
+    # advance() keeps the subtree of the move played
+    action = mcts.select_action(temperature=0)
+    visits = root.children[action].visits
+    env.step(action)
+    mcts.advance(action, env)
+    assert mcts.root.visits == visits and mcts.root.parent is None
+    print("Search tree OK")
+
+
+def test_node_budget():
+    print("Testing MCTS node budget...")
+    env = AzulEnv(seed=7)
+    for single_player_mode, batch_size in ((False, 1), (True, 8)):
+        random.seed(0)
+        np.random.seed(0)
+        mcts = MCTS(env, UniformModel(), simulations=600, single_player_mode=single_player_mode,
+                    batch_size=batch_size, max_nodes=100, transposition_size=1000)
+        mcts.run()
+        t = mcts.tree
+        assert t.num_nodes <= 100 + 2 * batch_size, "Node budget ignored"
+        assert mcts.root.visits == 600 and mcts.root.parent is None
+        # The packed tree is still consistent
+        stack = [mcts.root]
+        seen = set()
+        while stack:
+            node = stack.pop()
+            seen.add(node)
+            for child in node.children.values():
+                assert child.parent == node and child.visits <= node.visits
+                stack.append(child)
+        assert len(seen) == t.num_nodes
+        for key, node in mcts.table._nodes.items():
+            assert t.envs[node].state_hash() == key
+        assert mcts.select_action(temperature=0) in env.get_valid_actions()
+    print("Node budget OK")
+
+
+def late_game_env(seed):
+    """A game a few moves away from its end, so searches reach terminal leaves."""
+    env = AzulEnv(seed=seed)
+    rng = random.Random(seed)
+    while not any(bin(w >> 5 * row & 31).count("1") == 4 for w in env.wall_masks for row in range(5)):
+        env.step(rng.choice(env.get_valid_actions()))
+    return env
+
+
+def test_batched_search():
+    print("Testing batched MCTS...")
+    for opening, env in ((True, AzulEnv(seed=5)), (False, late_game_env(5))):
+        for single_player_mode in (True, False):
+            for duplicate_leaves in ("reuse", "discard"):
+                random.seed(0)
+                np.random.seed(0)
+                model = UniformModel()
+                mcts = MCTS(env, model, simulations=120, single_player_mode=single_player_mode,
+                            batch_size=16, duplicate_leaves=duplicate_leaves)
+                mcts.run()
+                assert mcts.root.visits == 120
+                assert model.calls <= 2 * 120
+                if opening:
+                    # Only neutral evaluations: any leftover virtual loss would show up
+                    stack = [mcts.root]
+                    while stack:
+                        node = stack.pop()
+                        assert node.value_sum == 0, "Virtual loss not taken back"
+                        stack.extend(node.children.values())
+                assert mcts.select_action(temperature=0) in env.get_valid_actions()
+    try:
+        MCTS(AzulEnv(seed=5), UniformModel(), duplicate_leaves="retry")
+        assert False, "Unknown duplicate policy accepted"
+    except ValueError:
+        pass
+    print("Batched MCTS OK")
+
+
+def test_root_parallel_player():
+    print("Testing root-parallel DeepMCTSPlayer...")
+    from app.core.azul.zero.deep_mcts_player import DeepMCTSPlayer
+    model_path = os.path.join("app", "core", "azul", "zero", "models", "best.pt")
+    env = AzulEnv(seed=2)
+    obs = env._get_obs()
+    player = DeepMCTSPlayer(model_path, mcts_iters=40, num_workers=2, batch_size=8)
+    try:
+        visits = player._parallel_visits(obs)
+        assert sum(visits.values()) == 2 * (20 - 1), "Worker visit counts were not merged"
+        assert set(visits) <= set(env.get_valid_actions())
+        assert player.predict(obs) in env.get_valid_actions()
+    finally:
+        player.close()
+    # Same seed, same search
+    single = DeepMCTSPlayer(model_path, mcts_iters=20, batch_size=8)
+    assert single.search_visits(obs, seed=3) == single.search_visits(obs, seed=3)
+    # ...without touching the global random streams
+    random.seed(5)
+    np.random.seed(5)
+    single.search_visits(obs, seed=3)
+    assert (random.random(), np.random.random()) == (random.Random(5).random(), np.random.RandomState(5).random_sample())
+    print("Root-parallel player OK")
+
+
+def test_game_tree_reuse():
+    print("Testing per-game tree reuse...")
+    from app.core.azul.game import init_game_state
+    from app.models.azul.azul import aplicar_movimiento, get_legal_moves
+    from app.core.azul.deep_mcts_player_adapter import AIAzulDeepMCTS
+    model_path = os.path.join("app", "core", "azul", "zero", "models", "best.pt")
+    ai = AIAzulDeepMCTS(model_path, device="cpu", mcts_iters=30, cpuct=1.0)
+    games = ai.player._games
+    random.seed(1)
+    state = init_game_state([{"id": 1, "name": "human", "type": "human"},
+                             {"id": 2, "name": "ai", "type": "ai"}])
+    reused = 0
+    for _ in range(12):
+        pid = state.turno_actual
+        old_round = state.ronda
+        if pid == "2":
+            cached = games.get((7, 1))
+            move = ai.select_move(state, game_id=7)
+            reused += cached is not None and games.get((7, 1)) is cached
+            entry = games.get((7, 1), cached)
+        else:
+            move = random.choice(get_legal_moves(state))
+        aplicar_movimiento(state, pid, move)
+        if state.ronda == old_round and not state.terminado:
+            ids = list(state.jugadores)
+            state.turno_actual = ids[(ids.index(pid) + 1) % len(ids)]
+    assert reused > 0, "The tree was never carried over to the next move"
+
+    # Idle games are dropped, finished games at once
+    games[(8, 0)] = entry
+    ai.player.game_ttl = 0
+    ai.player._evict_idle()
+    assert not games
+    games[(7, 1)] = entry
+    ai.end_game(7)
+    assert not games
+    print("Per-game tree reuse OK")
+
+
+def test_pondering():
+    print("Testing pondering...")
+    from app.core.azul.game import init_game_state
+    from app.models.azul.azul import aplicar_movimiento, get_legal_moves
+    from app.core.azul.deep_mcts_player_adapter import AIAzulDeepMCTS
+    model_path = os.path.join("app", "core", "azul", "zero", "models", "best.pt")
+    ai = AIAzulDeepMCTS(model_path, device="cpu", mcts_iters=30, cpuct=1.0, ponder_simulations=100)
+    games = ai.player._games
+    random.seed(2)
+    state = init_game_state([{"id": 1, "name": "human", "type": "human"},
+                             {"id": 2, "name": "ai", "type": "ai"}])
+    if state.turno_actual == "1":
+        aplicar_movimiento(state, "1", random.choice(get_legal_moves(state)))
+        state.turno_actual = "2"
+    aplicar_movimiento(state, "2", ai.select_move(state, game_id=3))
+    entry = games[(3, 1)]
+    # The human is to move: the AI searches on in the background
+    entry.thread.join(timeout=60)
+    assert entry.pondered == 100, entry.pondered
+    assert entry.mcts.root.visits >= 100
+
+    # The pondered tree is followed through the human move and used for the next one
+    state.turno_actual = "1"
+    aplicar_movimiento(state, "1", random.choice(get_legal_moves(state)))
+    state.turno_actual = "2"
+    ai.player.ponder_simulations = 10 ** 9
+    ai.select_move(state, game_id=3)
+    assert games[(3, 1)] is entry
+    # A move asked for while pondering stops it first
+    thread = entry.thread
+    assert thread.is_alive()
+    state.turno_actual = "1"
+    aplicar_movimiento(state, "1", random.choice(get_legal_moves(state)))
+    state.turno_actual = "2"
+    ai.select_move(state, game_id=3)
+    assert not thread.is_alive()
+    ai.player.close()
+    assert entry.thread is None or not entry.thread.is_alive()
+    print("Pondering OK")
+
+
+def test_iterative_deepening_minmax():
+    print("Testing iterative deepening alpha-beta...")
+    import time
+    from app.core.azul.zero.heuristic_min_max_mcts_player import HeuristicMinMaxMCTSPlayer
+    player = HeuristicMinMaxMCTSPlayer(strategy="minmax", depth=3)
+
+    def minimax(env, depth, root_player):
+        actions = env.get_valid_actions()
+        if depth == 0 or env.done or not actions:
+            return player._evaluate_state(env, root_player)
+        values = []
+        for action in actions:
+            env.push(action)
+            values.append(minimax(env, depth - 1, root_player))
+            env.pop()
+        return max(values) if env.current_player == root_player else min(values)
+
+    # The pruned search finds a move of the exact minimax value
+    for seed in (2, 7):
+        env = late_game_env(seed)
+        obs = env._get_obs()
+        root_player = env.current_player
+        values = {}
+        for action in env.get_valid_actions():
+            env.push(action)
+            values[action] = minimax(env, 2, root_player)
+            env.pop()
+        action = env.index_to_action(player.predict(obs))
+        assert values[action] == max(values.values()), (values[action], max(values.values()))
+        assert player.nodes > 0
+
+    # Deepening stops at the deadline with the move of the last finished depth
+    deep = HeuristicMinMaxMCTSPlayer(strategy="minmax", depth=12, time_limit=0.2)
+    env = AzulEnv(seed=0)
+    obs = env.reset(initial=True)
+    start = time.perf_counter()
+    action = deep.predict(obs)
+    assert time.perf_counter() - start < 0.5
+    assert env.get_action_mask()[action]
+    print("Iterative deepening alpha-beta OK")
+
+
+def test_minmax_beam():
+    print("Testing beam limited minmax...")
+    from app.core.azul.zero.heuristic_min_max_mcts_player import HeuristicMinMaxMCTSPlayer, static_move_delta
+
+    # The static delta is the score change of the move, plus a fraction for an unfinished line
+    env = AzulEnv(seed=4)
+    for _ in range(7):
+        env.step(random.Random(len(env.get_valid_actions())).choice(env.get_valid_actions()))
+    player = env.current_player
+    for action in env.get_valid_actions():
+        delta = static_move_delta(env, action)
+        before = env.scores[player]
+        env.push(action)
+        gained = env.scores[player] - before
+        env.pop()
+        assert gained <= delta < gained + 1, (action, delta, gained)
+
+    # Below the root only beam_width moves are searched
+    full = HeuristicMinMaxMCTSPlayer(strategy="minmax", depth=3)
+    beam = HeuristicMinMaxMCTSPlayer(strategy="minmax", depth=3, beam_width=3)
+    env = AzulEnv(seed=0)
+    obs = env._get_obs()
+    random.seed(0)
+    full.predict(obs)
+    random.seed(0)
+    action = beam.predict(obs)
+    assert beam.nodes < full.nodes / 5
+    assert env.get_action_mask()[action]
+    print("Beam limited minmax OK")
+
+
+def test_round_solver():
+    print("Testing round solver...")
+    from azul.round_solver import RoundSolver, position_value, remaining_tiles
+    from app.core.azul.zero.heuristic_min_max_mcts_player import HeuristicMinMaxMCTSPlayer
+
+    def minimax(env, root_player):
+        # Plain minimax to the end of the round, no table nor pruning
+        best = None
+        round_count = env.round_count
+        for action in env.get_valid_actions():
+            env.push(action, refill=False)
+            if env.round_count != round_count or env.done:
+                value = position_value(env, root_player) - position_value(env, 1 - root_player)
+            else:
+                value = minimax(env, root_player)
+            env.pop()
+            if best is None or (value > best if env.current_player == root_player else value < best):
+                best = value
+        return best
+
+    from app.core.azul.zero.deep_mcts_player import DeepMCTSPlayer
+    model_path = os.path.join("app", "core", "azul", "zero", "models", "best.pt")
+    deep = DeepMCTSPlayer(model_path, device="cpu", mcts_iters=5, solver_tiles=10)
+
+    for seed in range(6):
+        env = AzulEnv(seed=seed)
+        rng = random.Random(seed)
+        while remaining_tiles(env) > 6:
+            env.step(rng.choice(env.get_valid_actions()))
+        key = env.state_hash()
+        assert RoundSolver(max_tiles=remaining_tiles(env) - 1).solve(env) is None
+        solver = RoundSolver(max_tiles=10)
+        action, value = solver.solve(env)
+        # Out of budget it gives up
+        assert RoundSolver(max_tiles=10, max_nodes=solver.nodes - 1).solve(env) is None
+        assert env.state_hash() == key
+        assert env.get_action_mask()[env.action_to_index(action)]
+        assert abs(value - minimax(env.clone(), env.current_player)) < 1e-9
+
+        # The chosen move is worth the solved value
+        after = env.clone()
+        round_over = after.fast_step(action) or after.round_count != env.round_count
+        if not round_over:
+            _, reply = RoundSolver(max_tiles=10).solve(after)
+            assert abs(-reply - value) < 1e-9
+
+        # The minmax player plays the solver's move
+        player = HeuristicMinMaxMCTSPlayer(strategy="minmax", depth=1, solver_tiles=10)
+        assert player.predict(env._get_obs()) == env.action_to_index(action)
+        # ... and so does the network player, with or without a game tree
+        assert tuple(deep.predict(env._get_obs())) == action
+        assert tuple(deep.predict(env._get_obs(), game_id=seed)) == action
+
+    # A round closed without refill is scored, leaves the factories empty and pops back
+    env = AzulEnv(seed=1)
+    while True:
+        before = env.state_hash()
+        env.push(env.get_valid_actions()[0], refill=False)
+        if env.round_count > 1:
+            break
+    assert remaining_tiles(env) == 0 and sum(env.round_accumulated_score) == 0
+    env.pop()
+    assert env.state_hash() == before and remaining_tiles(env) > 0
+    print("Round solver OK")
+
+
+def test_chance_nodes():
+    print("Testing chance nodes at round boundaries...")
+    from azul.round_solver import remaining_tiles
+
+    # A round closed without refill waits for refill_factories()
+    env = AzulEnv(seed=5)
+    while env.round_count == 1:
+        env.fast_step(env.get_valid_actions()[0], refill=False)
+    assert remaining_tiles(env) == 0 and not env.done
+    env.refill_factories(np.random.default_rng(0))
+    assert remaining_tiles(env) == 4 * env.N
+    assert env.state_hash() == env._compute_hash()
+
+    env = AzulEnv(seed=2)
+    rng = random.Random(2)
+    while remaining_tiles(env) > 5:
+        env.step(rng.choice(env.get_valid_actions()))
+
+    def search(seed):
+        random.seed(seed)
+        np.random.seed(seed)
+        mcts = MCTS(env, UniformModel(), simulations=300, single_player_mode=False, chance_outcomes=3)
+        mcts.run()
+        return mcts
+
+    mcts = search(0)
+    t = mcts.tree
+    chance = np.flatnonzero(t.chance[:t.num_nodes])
+    assert chance.size
+    for node in chance.tolist():
+        edges = t.edges(node)
+        assert np.allclose(t.edge_prior[edges], 1.0 / 3)
+        children = t.edge_child[edges]
+        visits = np.where(children >= 0, t.visits[children], 0)
+        # Outcomes are visited in turn
+        assert visits.max() - visits.min() <= 1
+        boundary = t.envs[node]
+        assert remaining_tiles(boundary) == 0
+        for k, child in enumerate(children.tolist()):
+            if child < 0:
+                continue
+            # Each outcome is a fixed refill of that boundary position
+            again = boundary.clone()
+            again.refill_factories(np.random.default_rng((boundary.state_hash(), k)))
+            assert t.envs[child].state_hash() == again.state_hash()
+            assert t.player[child] == t.player[node]
+        assert len(set(t.envs[c].state_hash() for c in children.tolist() if c >= 0)) > 1
+
+    # The refill was the only randomness of the zero-sum search
+    other = search(1)
+    assert np.array_equal(other.tree.visits[:other.tree.num_nodes], t.visits[:t.num_nodes])
+
+    # The real refill is not among the outcomes: advancing to a boundary starts a new tree
+    root_edges = t.edges(mcts.root_id)
+    crossing = [e for e in range(root_edges.start, root_edges.stop)
+                if t.edge_child[e] >= 0 and t.chance[t.edge_child[e]]]
+    assert crossing
+    action = env._layout.actions[t.edge_action[crossing[0]]]
+    after = env.clone()
+    after.fast_step(action)
+    mcts.advance(action, after)
+    assert mcts.tree.num_nodes == 1 and mcts.root.env.state_hash() == after.state_hash()
+    print("Chance nodes OK")
+
+
+def test_inference_server():
+    print("Testing inference server...")
+    import contextlib
+    import time
+    import threading
+    from net.inference_server import InferenceServer
+
+    class EchoModel:
+        """Logits = first observation value, value = row sum; records batch sizes."""
+        def __init__(self):
+            self.batches = []
+
+        def predict(self, obs, mask):
+            self.batches.append(len(obs))
+            if (obs < 0).any():
+                raise ValueError("bad observation")
+            return np.repeat(obs[:, :1], mask.shape[1], axis=1) * mask, obs.sum(axis=1)
+
+    model = EchoModel()
+    server = InferenceServer(model, max_batch_size=64, max_wait=0.5)
+    results = {}
+
+    def search(i):
+        with server.client():
+            start.wait()
+            for step in range(5):
+                obs = np.full((1 + i % 2, 3), i * 10 + step, dtype=np.float32)
+                results[i, step] = server.predict(obs, np.ones((len(obs), 4), dtype=np.float32))
+
+    start = threading.Event()
+    threads = [threading.Thread(target=search, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    start.set()
+    for t in threads:
+        t.join()
+    try:
+        for (i, step), (logits, values) in results.items():
+            assert logits.shape == (1 + i % 2, 4) and (logits == i * 10 + step).all()
+            assert (values == 3 * (i * 10 + step)).all()
+        stats = server.stats()
+        assert stats["requests"] == 40 and stats["batches"] == len(model.batches) < 40
+        assert stats["largest_batch"] > 2 and stats["queue_depth"] == 0
+        # A lone client is served right away, errors reach the caller
+        with server.client():
+            began = time.perf_counter()
+            server.predict(np.ones((1, 3), dtype=np.float32), np.ones((1, 4), dtype=np.float32))
+            assert time.perf_counter() - began < 0.25, "Lone client waited for a batch"
+            try:
+                server.predict(-np.ones((1, 3), dtype=np.float32), np.ones((1, 4), dtype=np.float32))
+                assert False, "Model error swallowed"
+            except ValueError:
+                pass
+    finally:
+        server.stop()
+
+    class SlowModel:
+        """Records how many calls run at the same time."""
+        def __init__(self):
+            self.active = 0
+            self.most_active = 0
+
+        def predict(self, obs, mask):
+            self.active += 1
+            self.most_active = max(self.most_active, self.active)
+            time.sleep(0.002)
+            self.active -= 1
+            return np.zeros(mask.shape, dtype=np.float32), np.zeros(len(obs), dtype=np.float32)
+
+    # A lone client and a caller that never registered both go straight to the
+    # model, one call at a time
+    model = SlowModel()
+    server = InferenceServer(model, max_batch_size=64, max_wait=0.5)
+
+    def call(register):
+        with server.client() if register else contextlib.nullcontext():
+            for _ in range(20):
+                server.predict(np.ones((1, 3), dtype=np.float32), np.ones((1, 4), dtype=np.float32))
+
+    threads = [threading.Thread(target=call, args=(register,)) for register in (True, False)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    server.stop()
+    assert model.most_active == 1, model.most_active
+    print("Inference server OK")
+
+
+def test_exported_model():
+    print("Testing exported inference model...")
+    import tempfile
+    import torch
+    from net.azul_net import load_azul_net
+    from net.export import fold_batchnorm, export_inference_model, load_inference_model, sample_positions
+    from app.core.azul.zero.deep_mcts_player import DeepMCTSPlayer
+    model_path = os.path.join("app", "core", "azul", "zero", "models", "best.pt")
+    net = load_azul_net(model_path)
+    obs, masks = sample_positions(64)
+    logits, values = net.predict(obs, masks)
+
+    # Folding is exact up to float rounding, also with non trivial statistics
+    net.bn_in.running_mean.add_(0.5)
+    net.bn_in.running_var.mul_(2.0)
+    folded = fold_batchnorm(net)
+    assert not any(isinstance(m, torch.nn.BatchNorm2d) for m in folded.modules())
+    expected = net.predict(obs, masks)
+    got = folded.predict(obs, masks)
+    assert np.allclose(got[0], expected[0], atol=1e-3) and np.allclose(got[1], expected[1], atol=1e-4)
+    net = load_azul_net(model_path)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "best.ts")
+        export_inference_model(net, path)
+        exported = load_inference_model(path)
+        for size in (1, 7, 64):  # traced with another batch size
+            got_logits, got_values = exported.predict(obs[:size], masks[:size])
+            assert np.allclose(got_logits, logits[:size], atol=1e-3)
+            assert np.allclose(got_values, values[:size], atol=1e-4)
+        unmasked = exported.predict(obs[:2])[0]
+        assert np.allclose(unmasked, net.predict(obs[:2])[0], atol=1e-3)
+
+        quantized_path = os.path.join(tmp, "best_int8.ts")
+        export_inference_model(net, quantized_path, quantize=True)
+        quantized = load_inference_model(quantized_path)
+        assert quantized.quantized
+        assert np.abs(quantized.predict(obs, masks)[1] - values).mean() < 0.2
+
+        player = DeepMCTSPlayer(path, mcts_iters=20)
+        env = AzulEnv(seed=3)
+        assert player.predict(env._get_obs()) in env.get_valid_actions()
+    print("Exported model OK")
+
+
+def test_prediction_cache():
+    print("Testing prediction cache...")
+    from net.prediction_cache import PredictionCache, CachedModel, shared_cache, weights_fingerprint
+    model = UniformModel()
+    cache = PredictionCache(max_entries=3)
+    cached = CachedModel(model, cache)
+    obs = np.arange(12, dtype=np.float32).reshape(4, 3)
+    masks = np.ones((4, 5), dtype=np.float32)
+    logits, values = cached.predict(obs[:2], masks[:2])
+    assert logits.shape == (2, 5) and values.shape == (2,) and model.calls == 2
+    cached.predict(obs[[1, 0, 2]], masks[:3])  # two hits, one new row
+    assert model.calls == 3 and cache.hits == 2 and cache.misses == 3
+    cached.predict(obs[3:], masks[3:])  # evicts the least recently used row (1)
+    assert len(cache) == 3
+    cached.predict(obs[1:2], masks[1:2])
+    assert model.calls == 5
+    # The mask is part of the key
+    cached.predict(obs[:1], np.zeros((1, 5), dtype=np.float32))
+    assert model.calls == 6
+
+    by_bytes = PredictionCache(max_entries=0, max_bytes=3 * (5 * 4 + 16))
+    CachedModel(model, by_bytes).predict(obs, masks)
+    assert len(by_bytes) == 3 and by_bytes.nbytes <= by_bytes.max_bytes
+
+    # Players loaded from the same file share one cache
+    from app.core.azul.zero.deep_mcts_player import DeepMCTSPlayer
+    model_path = os.path.join("app", "core", "azul", "zero", "models", "best.pt")
+    first = DeepMCTSPlayer(model_path, mcts_iters=20, cache_entries=1000)
+    second = DeepMCTSPlayer(model_path, mcts_iters=20, cache_entries=1000)
+    assert first.cache is second.cache is shared_cache(weights_fingerprint(model_path))
+    obs = AzulEnv(seed=9)._get_obs()
+    visits = first.search_visits(obs, seed=1)
+    misses = first.cache.misses
+    assert second.search_visits(obs, seed=1) == visits
+    assert first.cache.misses == misses, "Second search went to the network"
+    print("Prediction cache OK")
+
+
+def test_inference_session():
+    print("Testing inference session...")
+    from net.azul_net import load_azul_net
+    from net.export import sample_positions
+    net = load_azul_net(os.path.join("app", "core", "azul", "zero", "models", "best.pt"))
+    obs, masks = sample_positions(16)
+    session = net.session()
+    logits, values = net.predict(obs, masks)
+    for size in (1, 16):
+        got_logits, got_values = session.predict(obs[:size], masks[:size])
+        assert np.allclose(got_logits, logits[:size], atol=1e-5) and np.allclose(got_values, values[:size], atol=1e-6)
+    spatial_size = net.in_channels * 25
+    factories_end = spatial_size + (net.factories_count + 1) * 5
+    got_logits, got_values = session.predict_split(
+        np.ascontiguousarray(obs[:, :spatial_size]).reshape(16, net.in_channels, 5, 5),
+        np.ascontiguousarray(obs[:, factories_end:]),
+        np.ascontiguousarray(obs[:, spatial_size:factories_end]).reshape(16, net.factories_count + 1, 5),
+        masks)
+    assert np.allclose(got_logits, logits, atol=1e-5) and np.allclose(got_values, values, atol=1e-6)
+    # Unmasked and non float32 input
+    assert np.allclose(session.predict(obs[:2].astype(np.float64))[0], net.predict(obs[:2])[0], atol=1e-5)
+
+    # Staging tensors (the path off CPU) are per thread: concurrent batch-1
+    # calls from several threads do not overwrite each other's input
+    import threading
+    session = net.session()
+    session.on_cpu = False
+    errors = []
+
+    def search(rows):
+        for _ in range(100):
+            for i in rows:
+                got_logits, got_values = session.predict(obs[i:i + 1], masks[i:i + 1])
+                if not np.allclose(got_values, values[i:i + 1], atol=1e-6):
+                    errors.append(i)
+
+    threads = [threading.Thread(target=search, args=(range(k, 16, 4),)) for k in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors, errors[:10]
+    print("Inference session OK")
+
+
+def test_self_play():
+    print("Testing self-play data generation...")
+    import glob
+    import tempfile
+    from training.self_play import load_model, play_game, run_self_play
+    model_path = os.path.join("app", "core", "azul", "zero", "models", "best.pt")
+    env = AzulEnv()
+    for target in ("score", "result"):
+        game = play_game(load_model(model_path), {"simulations": 4, "batch_size": 1, "value_target": target}, seed=3)
+        moves = len(game["obs"])
+        assert game["obs"].shape == (moves, env.encode_state().shape[0])
+        assert game["policy"].shape == (moves, env.action_size)
+        assert np.allclose(game["policy"].sum(axis=1), 1.0)
+        assert game["resigned"] == -1
+        assert np.all(game["value"][game["player"] == 0] == game["value"][0])
+    assert set(np.unique(game["value"])) <= {-1.0, 0.0, 1.0}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report = run_self_play(model_path, tmp, games=3, workers=2, settings={"simulations": 2}, verbose=False)
+        files = sorted(glob.glob(os.path.join(tmp, "*.npz")))
+        assert report["games"] == 3 and len(files) == 3
+        assert report["positions"] == sum(len(np.load(f)["value"]) for f in files)
+        assert report["positions_per_second"] > 0
+        # A failing worker is reported instead of leaving the parent waiting
+        try:
+            run_self_play(os.path.join(tmp, "missing.pt"), tmp, games=1, workers=1, verbose=False)
+        except RuntimeError as e:
+            assert "missing.pt" in str(e)
+        else:
+            assert False, "Worker failure was not raised"
+    print("Self-play OK")
+
+
+def test_replay_buffer():
+    print("Testing replay buffer...")
+    import tempfile
+    import threading
+    from training.replay_buffer import ReplayBuffer, ReplayWriter
+
+    def rows(first, count):
+        ids = np.arange(first, first + count, dtype=np.float32)
+        return np.repeat(ids[:, None], 6, axis=1), np.repeat(ids[:, None], 4, axis=1), ids, ids % 2
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Concurrent writers, shards of 10 rows (the last one of each writer partial)
+        def write(w):
+            with ReplayWriter(tmp, shard_size=10, name=str(w)) as writer:
+                for game in range(5):
+                    writer.append(*rows(1000 * w + 7 * game, 7))
+        threads = [threading.Thread(target=write, args=(w,)) for w in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        buffer = ReplayBuffer(tmp, window=0)
+        assert len(buffer) == 105 and buffer.num_shards == 12
+
+        batch = buffer.sample(64, np.random.default_rng(0))
+        assert batch["obs"].shape == (64, 6) and batch["player"].dtype == np.uint8
+        # Every sampled row is a consistent example
+        assert np.all(batch["obs"][:, 0] == batch["value"]) and np.all(batch["policy"][:, 3] == batch["value"])
+        assert np.all(batch["player"] == batch["value"] % 2)
+        seen = set()
+        for batch in buffer.batches(32, count=50, rng=np.random.default_rng(1)):
+            seen.update(batch["value"].tolist())
+        assert len(seen) > 90  # uniform over the whole buffer
+
+        # Old shards age out of the window
+        with ReplayWriter(tmp, shard_size=10, name="new") as writer:
+            writer.append(*rows(5000, 40))
+        buffer.window = 40
+        assert buffer.refresh() == 40 and buffer.num_shards == 4
+        assert len(ReplayBuffer(tmp, window=0)) == 40
+        assert set(buffer.sample(100)["value"].tolist()) <= set(range(5000, 5040))
+    print("Replay buffer OK")
+
+
+def test_arena():
+    print("Testing arena...")
+    from training.arena import elo_ratings, run_arena, schedule, summarize
+
+    matches = schedule(["a", "b", "c"], 4, seed=10)
+    assert len(matches) == 12
+    assert matches[:4] == [(["a", "b"], 10), (["b", "a"], 10), (["a", "b"], 11), (["b", "a"], 11)]
+
+    # a beats b 3 times out of 4, b beats c the same: a > b > c, evenly spaced
+    games = [{"players": ["a", "b"], "scores": [10, 5]}] * 3 + [{"players": ["a", "b"], "scores": [5, 10]}]
+    games += [{"players": ["b", "c"], "scores": [10, 5]}] * 3 + [{"players": ["b", "c"], "scores": [5, 10]}]
+    ratings = elo_ratings(["a", "b", "c"], games * 10)
+    assert ratings["a"] > ratings["b"] > ratings["c"]
+    assert abs((ratings["a"] - ratings["b"]) - (ratings["b"] - ratings["c"])) < 5
+    assert abs(np.mean(list(ratings.values())) - 1500) < 1e-6
+    # 3:1 is about 190 Elo points
+    assert 170 < ratings["a"] - ratings["b"] < 200
+
+    results = run_arena(["random", "minmax_d2"], games_per_pair=2, workers=2, verbose=False)
+    assert len(results) == 2 and {tuple(r["players"]) for r in results} == {("random", "minmax_d2"), ("minmax_d2", "random")}
+    rows = summarize(["random", "minmax_d2"], results, bootstrap=20)
+    assert [row["player"] for row in rows] == ["minmax_d2", "random"]
+    minmax = rows[0]
+    assert minmax["games"] == 2 and minmax["mean_effort"] > 1 and minmax["p95_ms"] >= minmax["p50_ms"] > 0
+    assert rows[1]["mean_effort"] is None
+    assert rows[1]["elo_low"] <= rows[1]["elo"] <= rows[1]["elo_high"]
+    print("Arena OK")
+
+
+if __name__ == "__main__":
+    test_transposition_table_lru()
+    test_mcts_shares_transpositions()
+    test_shared_reply_values()
+    test_search_tree_arrays()
+    test_node_budget()
+    test_batched_search()
+    test_root_parallel_player()
+    test_game_tree_reuse()
+    test_pondering()
+    test_iterative_deepening_minmax()
+    test_minmax_beam()
+    test_round_solver()
+    test_chance_nodes()
+    test_inference_server()
+    test_exported_model()
+    test_prediction_cache()
+    test_inference_session()
+    test_self_play()
+    test_replay_buffer()
+    test_arena()
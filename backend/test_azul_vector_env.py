@@ -0,0 +1,81 @@
+import sys
+import os
+import numpy as np
+
+sys.path.append(os.getcwd())
+# azul_zero modules import each other as top-level packages (azul, mcts, net)
+sys.path.append(os.path.join(os.getcwd(), "app", "core", "azul", "zero"))
+
+from azul.vector_env import VectorAzulEnv
+
+TILES = slice(0, 40)  # bag, discard, factories and center for 2 players / 5 factories
+
+
+def random_actions(vec, rng):
+    mask = vec.valid_action_mask()
+    noise = rng.random(mask.shape) * mask
+    return noise.argmax(axis=1)
+
+
+def test_vector_matches_single_env():
+    print("Testing VectorAzulEnv against AzulEnv...")
+    vec = VectorAzulEnv(num_envs=16, seed=0)
+    rng = np.random.default_rng(0)
+    envs = [vec.get_env(i) for i in range(vec.num_envs)]
+    finished = 0
+    for _ in range(400):
+        for i, env in enumerate(envs):
+            if env.done:
+                continue
+            expected = np.zeros(env.action_size, dtype=np.float32)
+            expected[[env.action_to_index(a) for a in env.get_valid_actions()]] = 1
+            assert np.array_equal(vec.valid_action_mask()[i], expected), f"Mask differs in game {i}"
+            assert np.array_equal(
+                vec.encode_observation()[i], env.encode_observation(env._get_obs()).astype(np.float32)
+            ), f"Encoding differs in game {i}"
+
+        actions = random_actions(vec, rng)
+        _, rewards, terminations, _, _ = vec.step(actions)
+
+        for i, env in enumerate(envs):
+            if env.done:
+                # Autoreset: start tracking the new game
+                envs[i] = vec.get_env(i)
+                continue
+            round_before = env.round_count
+            _, reward, done, _ = env.step(env.index_to_action(int(actions[i])))
+            if env.round_count != round_before and not done:
+                # Refill draws come from different RNGs: copy the vector env tiles
+                env._state[TILES] = vec._state[i, TILES]
+            assert done == terminations[i]
+            assert reward == rewards[i]
+            assert np.array_equal(env._state, vec._state[i]), f"State differs in game {i}"
+            assert env.wall_masks == vec.wall_masks[i].tolist()
+            assert env.scores == vec.scores[i].tolist()
+            assert env.current_player == vec.current_player[i]
+            finished += int(done)
+    assert finished > 0, "No game finished"
+    print(f"Vector env OK ({finished} games finished)")
+
+
+def test_vector_tiles_are_conserved():
+    print("Testing tile conservation in VectorAzulEnv...")
+    vec = VectorAzulEnv(num_envs=64, seed=1)
+    rng = np.random.default_rng(1)
+    L = vec._layout
+    for _ in range(300):
+        vec.step(random_actions(vec, rng))
+        s = vec._state.astype(np.int64)
+        floors = s[:, L.floor:L.floor_count]
+        walls = np.array([[bin(w).count("1") for w in row] for row in vec.wall_masks.tolist()])
+        total = (s[:, L.bag:L.tiles_end].sum(axis=1)
+                 + s[:, L.line_count:L.floor].sum(axis=1)
+                 + ((floors >= 1) & (floors <= 5)).sum(axis=1)
+                 + walls.sum(axis=1))
+        assert (total == 100).all(), "Tiles lost or created"
+    print("Vector conservation OK")
+
+
+if __name__ == "__main__":
+    test_vector_matches_single_env()
+    test_vector_tiles_are_conserved()